@@ -1,121 +1,115 @@
 """Dash application for querying Microsoft SQL Server flight data and visualizing it."""
 
+import base64
 import os
+import time
+import uuid
+
+from utils.startup import register_startup_route, startup  # first: its clock times the imports below
 from urllib.parse import urlencode, parse_qs
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 
+import numpy as np
 import pandas as pd
 import dash
 from dash import Dash, dcc, html, Input, Output, State, dash_table, ctx
+from dash.exceptions import PreventUpdate
 import dash_bootstrap_components as dbc
 import plotly.graph_objects as go
 
-from utils.db import sql_query
+from utils.cube import CUBE_ENABLED, get_cube, start_filler
+from utils.conflicts import CONFLICT_H_NM, CONFLICT_V_FT, detect_conflicts
+from utils.cache import CACHE_ENABLED, CACHE_TTL_S, make_key, shared_cache
+from utils.dataset import MISSING, TrajectoryDataset, epoch_ms, iso_strings
+from utils.flows import flow_matrix
+from utils.demand import BIN, bin_index, bin_starts
+from utils.datasource import LIVE_HWM_COLUMN, get_datasource
+from utils.db import QueryCancelled, superseding
+from utils.live import LIVE_REFRESH_S, LiveWindow, Segments, load_window, save_window
+from utils.memory import (
+    MEMORY_ROUTE_ENABLED, MEMORY_TRACEMALLOC, estimate_bytes, fit_to_budget, ledger, register_memory_route, start_tracing,
+)
+from utils.metrics import SESSION_COARSENED, instrument_app, instrument_callbacks
+from utils.places import (
+    AIRPORT_RADIUS_NM, PLACE_KINDS, WAYPOINT_RADIUS_NM, area_trajectories, place_area, place_catalog,
+)
+from utils.prefetch import PREFETCH_ENABLED, PREFETCH_MAX_SECTORS, PREFETCH_STEP_H, adjacent_sectors, prefetcher
+from utils.selection import flight_index, region_outline, selection_region
+from utils.snapshot import export_snapshot, list_snapshots, open_snapshot
 from utils.geometry import (
     line_wkt_to_segments,
     wkt_to_points,
-    decimate_points,
     polygon_wkt_to_geojson_feature,
+    simplify_path,
+    simplify_paths,
 )
 from utils.time import floor_to_20
 from utils.theme import THEME
 
+startup.mark("imports")
+
 # Performance knobs
 MAX_TRAJ = int(os.getenv("MAX_TRAJ", "2000"))  # hard cap trajectories
 SIMPLIFY_BASE_M = float(os.getenv("SIMPLIFY_BASE_M", "400"))  # meters per decimation unit
 SIMPLIFY_TOL_DEG = float(os.getenv("SIMPLIFY_TOL_DEG", "0.0005"))
 HOVER_MAX_FLIGHTS = int(os.getenv("HOVER_MAX_FLIGHTS", "30"))
+# Streamed downloads offered in Settings (kind, format, label); see utils/export.py
+EXPORT_LINKS = [
+    ("trajectories", "geojsonl", "Trajectories (GeoJSON lines)"),
+    ("trajectories", "csv", "Trajectories (CSV)"),
+    ("flights", "csv", "Flight list (CSV)"),
+    ("flights", "parquet", "Flight list (Parquet)"),
+    ("demand", "csv", "Demand (CSV)"),
+    ("demand", "parquet", "Demand (Parquet)"),
+]
+MAP_VERTEX_BUDGET = int(os.getenv("MAP_VERTEX_BUDGET", "200000"))  # map vertices at detail 1/1
+INPUT_DEBOUNCE_S = float(os.getenv("INPUT_DEBOUNCE_S", "0.75"))  # start/end typing pause before a query (0 = off)
 
 # --- Layout height constants (in viewport height) ---
 RIGHT_BAR_VH = 40
 RIGHT_TABLE_VH = 45
 MAP_VH = 79  # map height will match right column total
 
-SQL_SECTORS = """
-SELECT [Id], [Name], [LowerLimitFt], [UpperLimitFt], [Geography].STAsText() AS WKT
-FROM [StaticAirspace]
-ORDER BY [Name]
-"""
-
-# Fetch a single sector by Id (fresh geometry from DB)
-SQL_SECTOR_BY_ID = """
-SELECT TOP 1 [Id], [Name], [LowerLimitFt], [UpperLimitFt], [Geography].STAsText() AS WKT
-FROM [StaticAirspace]
-WHERE [Id] = ?
-"""
-
-SQL_TRAJ_BY_SECTOR = """
-DECLARE @sectorId INT = ?;
-DECLARE @startUtc DATETIME2 = ?;
-DECLARE @endUtc   DATETIME2 = ?;
-DECLARE @applyFL BIT = ?;        -- 0 = off, 1 = on
-DECLARE @minFt   INT = ?;        -- lower flight level in feet
-DECLARE @maxFt   INT = ?;        -- upper flight level in feet
-DECLARE @maxRows INT = ?;        -- hard cap to protect UI
-DECLARE @tolDeg  FLOAT = ?;      -- geometry simplification tolerance in degrees
-
-WITH sector AS (
-  SELECT [Geography] AS g
-  FROM [StaticAirspace]
-  WHERE [Id] = @sectorId
-)
-SELECT TOP (@maxRows)
-  ft.[Id]               AS TrajectoryId,
-  ft.[FlightId],
-  ft.[FlightSourceId],
-  ft.[StartTime],
-  ft.[EndTime],
-  ft.[AltitudeFt],
-  ft.[Heading],
-  ft.[SpeedKn],
-  ft.[PositionLine].Reduce(@tolDeg).STAsText() AS WKT,
-  -- Flight table details for rich hover
-  f.[Callsign], f.[AirportDeparture], f.[AirportArrival],
-  f.[FlightRule], f.[FlightType], f.[AircraftType], f.[WakeTurbulanceCategory],
-  f.[REG], f.[LevelInitial], f.[SpeedInitial], f.[SID], f.[STAR],
-  f.[RunwayDeparture], f.[RunwayArrival], f.[AirportAlternate], f.[Number],
-  f.[SOBT], f.[EOBT], f.[STOT], f.[SLDT], f.[TimeFiling],
-  f.[ETOT], f.[ELDT], f.[CTOT], f.[CLDT], f.[ATOT], f.[ALDT]
-FROM [FlightTrajectory] ft
-JOIN [Flight] f ON f.[Id] = ft.[FlightId]
-CROSS JOIN sector s
-WHERE ft.[IsActive] = 1
-  AND ft.[StartTime] <  @endUtc
-  AND ft.[EndTime]   >= @startUtc
-  AND (f.[IsCancelled] = 0 OR f.[IsCancelled] IS NULL)
-  AND ft.[PositionLine].STIntersects(s.g) = 1
-  AND (
-        @applyFL = 0 OR EXISTS (
-            SELECT 1
-            FROM STRING_SPLIT(ft.[AltitudeFt], ',') AS ss
-            CROSS APPLY (SELECT TRY_CAST(ss.value AS INT) AS AltFt) AS a
-            WHERE a.AltFt BETWEEN @minFt AND @maxFt
-        )
-  )
-ORDER BY ft.[StartTime] ASC;
-"""
-
 # 4) APP & LAYOUT (Dark theme + Navbar + Offcanvas)
 # =============================
-app: Dash = dash.Dash(__name__, external_stylesheets=[THEME], suppress_callback_exceptions=True)
-app.title = "ATFAS Trajectory & Demand"
-
-# Fetch sectors once for dropdown options
-sectors_df = sql_query(SQL_SECTORS)
-sector_options = [
-    {"label": f"{row['Name']} (FL{int(row['LowerLimitFt']/100)}–FL{int(row['UpperLimitFt']/100)})",
-     "value": int(row['Id'])}
-    for _, row in sectors_df.iterrows()
-]
+# Callbacks register with dash.callback and attach to the app built by
+# create_app(); nothing below touches the database until a page is served.
+callback = instrument_callbacks(dash.callback)
+
+
+def sector_options():
+    """Dropdown options for every sector (the data source caches the list)."""
+    sectors_df = get_datasource().list_sectors()
+    return [
+        {"label": f"{row['Name']} (FL{int(row['LowerLimitFt']/100)}–FL{int(row['UpperLimitFt']/100)})",
+         "value": int(row['Id'])}
+        for _, row in sectors_df.iterrows()
+    ]
+
+
+def snapshot_options():
+    """Dropdown options: the configured database followed by saved snapshots."""
+    opts = [{"label": f"Database ({get_datasource().name})", "value": ""}]
+    for snap in list_snapshots():
+        when = (snap.get("start") or "")[:16].replace("T", " ")
+        opts.append({
+            "label": f"{snap['key']} — {snap.get('sector_name', '?')} {when}Z ({snap.get('n_trajectories', 0)} traj)",
+            "value": snap["key"],
+        })
+    return opts
+
+
+def default_window():
+    """``(start, end)`` ISO strings of the initial window: now ± 6 h."""
+    now = datetime.utcnow().replace(second=0, microsecond=0)
+    return (now - timedelta(hours=6)).isoformat() + "Z", (now + timedelta(hours=6)).isoformat() + "Z"
 
-now = datetime.utcnow().replace(second=0, microsecond=0)
-DEFAULT_START = (now - timedelta(hours=6)).isoformat() + "Z"
-DEFAULT_END   = (now + timedelta(hours=6)).isoformat() + "Z"
 
 navbar = dbc.Navbar(
     dbc.Container([
         dbc.NavbarBrand("ATFAS Trajectory & Demand", className="ms-2"),
         dbc.Nav([
+            dbc.Switch(id="live-mode", label="Live", value=False, className="me-3 mt-2 text-light"),
             dbc.Button("Settings", id="open-settings", color="secondary", size="sm", className="me-2"),
             html.Span(id="status-text", className="text-muted"),
         ], className="ms-auto"),
@@ -123,82 +117,129 @@ navbar = dbc.Navbar(
     color="primary", dark=True, sticky="top"
 )
 
-controls_bar = dbc.Card(
-    dbc.Row([
-        dbc.Col([
-            html.Small("Area Type", className="text-muted"),
-            dcc.Dropdown(
-                id="area-type",
-                options=[
-                    {"label": "Sector", "value": "sector"},
-                    {"label": "Airport (TODO)", "value": "airport"},
-                    {"label": "Waypoint (TODO)", "value": "waypoint"},
-                ], value="sector", clearable=False
-            ),
-        ], md=2),
-        dbc.Col([
-            html.Small("Sector", className="text-muted"),
-            dcc.Dropdown(id="sector-id", options=sector_options, value=sector_options[0]["value"] if sector_options else None),
-        ], md=4),
-        dbc.Col([
-            html.Small("Start (UTC)", className="text-muted"),
-            dcc.Input(id="start-utc", type="text", value=DEFAULT_START, style={"width": "100%"})
-        ], md=3),
-        dbc.Col([
-            html.Small("End (UTC)", className="text-muted"),
-            dcc.Input(id="end-utc", type="text", value=DEFAULT_END, style={"width": "100%"})
-        ], md=3),
-    ], className="g-2"), body=True, className="mt-3"
-)
+def controls_bar(options, start, end):
+    """Area/sector pickers and the window inputs."""
+    return dbc.Card(
+        dbc.Row([
+            dbc.Col([
+                html.Small("Area Type", className="text-muted"),
+                dcc.Dropdown(
+                    id="area-type",
+                    options=[
+                        {"label": "Sector", "value": "sector"},
+                        {"label": "Airport", "value": "airport"},
+                        {"label": "Waypoint", "value": "waypoint"},
+                    ], value="sector", clearable=False
+                ),
+            ], md=2),
+            dbc.Col([
+                html.Div([
+                    html.Small("Sector", className="text-muted"),
+                    dcc.Dropdown(id="sector-id", options=options, value=options[0]["value"] if options else None),
+                ], id="sector-picker"),
+                html.Div([
+                    html.Small("Airport", id="place-label", className="text-muted"),
+                    dcc.Dropdown(id="place-id", options=[], value=None),
+                ], id="place-picker", style={"display": "none"}),
+            ], md=4),
+            dbc.Col([
+                html.Small("Start (UTC)", className="text-muted"),
+                dcc.Input(id="start-utc", type="text", value=start, debounce=INPUT_DEBOUNCE_S or False,
+                          style={"width": "100%"})
+            ], md=3),
+            dbc.Col([
+                html.Small("End (UTC)", className="text-muted"),
+                dcc.Input(id="end-utc", type="text", value=end, debounce=INPUT_DEBOUNCE_S or False,
+                          style={"width": "100%"})
+            ], md=3),
+        ], className="g-2"), body=True, className="mt-3"
+    )
 
-settings_offcanvas = dbc.Offcanvas(
-    [
-        html.H5("Display Settings", className="mb-3"),
-        html.Label("Trace Mode"),
-        dcc.RadioItems(
-            id="trace-mode", inline=True,
-            options=[{"label": "Lines", "value": "lines"}, {"label": "Markers", "value": "markers"}], value="lines"
-        ),
-        html.Br(),
-        html.Label("Trace Decimation (keep 1 of N points)"),
-        dcc.Slider(id="trace-decimation", min=1, max=50, step=1, value=8, marks={1:"1", 10:"10", 25:"25", 50:"50"}),
-        html.Br(),
-        html.Hr(),
-        html.H5("Filters", className="mt-2"),
-        dbc.Checklist(
-            id="apply-fl",
-            options=[{"label": "Apply Flight Level Filter", "value": "apply"}],
-            value=[], switch=True
-        ),
-        html.Div([
-            html.Label("Flight Level Range (FL)"),
-            dcc.RangeSlider(id="fl-range", min=0, max=500, step=10, value=[290, 410],
-                            marks={0:"FL0",100:"FL100",200:"FL200",300:"FL300",400:"FL400",500:"FL500"}),
-        ], id="fl-controls"),
-        html.Br(),
-        html.Label("Columns (right panel)"),
-        dcc.Slider(id="columns", min=1, max=3, step=1, value=2, marks={1:"1",2:"2",3:"3"}),
-        html.Br(),
-        html.Label("Interval (minutes) — fixed at 20"),
-        dcc.Slider(id="interval-min", min=20, max=20, step=20, value=20, marks={20:"20"}, disabled=True),
-        html.Br(),
-        html.Label("Map Style"),
-        dcc.Dropdown(id="map-style", value="carto-darkmatter", clearable=False,
-                     options=[
-                         {"label":"OpenStreetMap","value":"open-street-map"},
-                         {"label":"Carto Positron","value":"carto-positron"},
-                         {"label":"Carto Dark","value":"carto-darkmatter"},
-                         {"label":"Stamen Terrain","value":"stamen-terrain"},
-                     ]),
-        ], id="settings", title="Settings", is_open=False, placement="end", scrollable=True
-        )
+def settings_offcanvas(sources):
+    """Settings panel; ``sources`` are the data-source dropdown options."""
+    return dbc.Offcanvas(
+        [
+            html.H5("Display Settings", className="mb-3"),
+            html.Label("Trace Mode"),
+            dcc.RadioItems(
+                id="trace-mode", inline=True,
+                options=[{"label": "Lines", "value": "lines"}, {"label": "Markers", "value": "markers"}], value="lines"
+            ),
+            html.Br(),
+            html.Label("Trace Detail (vertex budget ÷ N)"),
+            dcc.Slider(id="trace-decimation", min=1, max=50, step=1, value=8, marks={1:"1", 10:"10", 25:"25", 50:"50"}),
+            html.Br(),
+            html.Hr(),
+            html.H5("Filters", className="mt-2"),
+            dbc.Checklist(
+                id="apply-fl",
+                options=[{"label": "Apply Flight Level Filter", "value": "apply"}],
+                value=[], switch=True
+            ),
+            html.Div([
+                html.Label("Flight Level Range (FL)"),
+                dcc.RangeSlider(id="fl-range", min=0, max=500, step=10, value=[290, 410],
+                                marks={0:"FL0",100:"FL100",200:"FL200",300:"FL300",400:"FL400",500:"FL500"}),
+            ], id="fl-controls"),
+            html.Br(),
+            html.Label("Airport / Waypoint Radius (NM)"),
+            dcc.Slider(id="area-radius", min=5, max=100, step=5, value=AIRPORT_RADIUS_NM,
+                       marks={5:"5", 25:"25", 50:"50", 75:"75", 100:"100"}),
+            html.Br(),
+            html.Label("Columns (right panel)"),
+            dcc.Slider(id="columns", min=1, max=3, step=1, value=2, marks={1:"1",2:"2",3:"3"}),
+            html.Br(),
+            html.Label("Interval (minutes) — fixed at 20"),
+            dcc.Slider(id="interval-min", min=20, max=20, step=20, value=20, marks={20:"20"}, disabled=True),
+            html.Br(),
+            html.Label("Map Style"),
+            dcc.Dropdown(id="map-style", value="carto-darkmatter", clearable=False,
+                         options=[
+                             {"label":"OpenStreetMap","value":"open-street-map"},
+                             {"label":"Carto Positron","value":"carto-positron"},
+                             {"label":"Carto Dark","value":"carto-darkmatter"},
+                             {"label":"Stamen Terrain","value":"stamen-terrain"},
+                         ]),
+            html.Hr(),
+            html.H5("Snapshots", className="mt-2"),
+            html.Label("Data Source"),
+            dcc.Dropdown(id="data-source", value="", clearable=False, options=sources),
+            html.Br(),
+            dcc.Input(id="snapshot-name", type="text", placeholder="Snapshot name (optional)", style={"width": "100%"}),
+            dbc.Button("Export snapshot", id="btn-export-snapshot", color="secondary", size="sm", className="mt-2"),
+            html.Div(id="snapshot-status", className="text-muted mt-1"),
+            html.Hr(),
+            html.H5("Export", className="mt-2"),
+            html.Div([
+                html.Small("Selected sector and window, streamed from the database", className="text-muted d-block"),
+                *[html.A(label, id=f"export-{kind}-{fmt}", href="", download="", className="d-block")
+                  for kind, fmt, label in EXPORT_LINKS],
+            ], id="export-links"),
+            html.Div(id="export-note", className="text-muted"),
+            dbc.Button("Download flight table (CSV)", id="btn-download-table", color="secondary", size="sm",
+                       className="mt-2"),
+            dcc.Download(id="download-table"),
+            html.Hr(),
+            html.H5("Separation", className="mt-2"),
+            html.Label("Horizontal minimum (NM)"),
+            dcc.Input(id="sep-nm", type="number", min=0.5, step=0.5, value=CONFLICT_H_NM, style={"width": "100%"}),
+            html.Label("Vertical minimum (ft)", className="mt-2"),
+            dcc.Input(id="sep-ft", type="number", min=100, step=100, value=CONFLICT_V_FT, style={"width": "100%"}),
+            dbc.Button("Detect conflicts", id="btn-conflicts", color="secondary", size="sm", className="mt-2"),
+            html.Div(id="conflict-status", className="text-muted mt-1"),
+            ], id="settings", title="Settings", is_open=False, placement="end", scrollable=True
+            )
 
 # Map equals (bar + table)
 map_graph = dcc.Graph(
     id="map-fig",
     style={"height": f"{MAP_VH}vh"},  # e.g., 84vh
-    config={"displaylogo": False}
+    # Box/lasso select flights crossing a region (see select_region)
+    config={"displaylogo": False, "modeBarButtonsToAdd": ["select2d", "lasso2d"]},
+    clear_on_unhover=True,
 )
+# Flights hover labels are looked up client-side from the trace's flight table
+map_tooltip = dcc.Tooltip(id="map-tooltip", direction="bottom", style={"whiteSpace": "pre-line"})
 
 # Timeline controls (under the map)
 play_button = dbc.Button("▶ Play", id="btn-play", color="info", size="sm", className="me-2")
@@ -311,59 +352,116 @@ flight_table = dash_table.DataTable(
     tooltip_duration=None,
 )
 
+# Loss-of-separation pairs (filled by the Detect conflicts button)
+conflict_table = dash_table.DataTable(
+    id="conflict-table",
+    columns=[
+        {"name": "#", "id": "rownum"},
+        {"name": "Flight A", "id": "CallsignA"},
+        {"name": "Flight B", "id": "CallsignB"},
+        {"name": "Closest (UTC)", "id": "ClosestTime"},
+        {"name": "NM", "id": "MinDistNm"},
+        {"name": "ft", "id": "VertFt"},
+        {"name": "Duration (s)", "id": "DurationS"},
+    ],
+    page_action="none",
+    fixed_rows={"headers": True},
+    virtualization=True,
+    data=[],
+    style_table=flight_table.style_table,
+    style_header=flight_table.style_header,
+    style_cell=flight_table.style_cell,
+    style_data=flight_table.style_data,
+    style_data_conditional=flight_table.style_data_conditional,
+    css=flight_table.css,
+)
+
+# Sector-to-sector flows of the loaded flights (computed when the tab opens)
+flow_panel = html.Div([
+    html.Div([
+        dbc.RadioItems(id="flow-view", value="sankey", inline=True,
+                       options=[{"label": "Sankey", "value": "sankey"}, {"label": "Heatmap", "value": "heatmap"}]),
+        dcc.Dropdown(id="flow-interval", placeholder="Whole window", clearable=True, style={"minWidth": "180px"}),
+        dbc.Checklist(id="flow-focus", value=["on"], switch=True, inline=True,
+                      options=[{"label": "Via selected sector", "value": "on"}]),
+    ], className="d-flex align-items-center gap-3 mt-2"),
+    dcc.Graph(id="flow-fig", style={"height": f"{RIGHT_TABLE_VH - 5}vh"}, config={"displaylogo": False}),
+    html.Small(id="flow-status", className="text-muted"),
+])
+
 # Stores
 store_flights = dcc.Store(id="store-flights")
 store_sector = dcc.Store(id="store-sector-geojson")
 store_bins = dcc.Store(id="store-interval-bins")
 store_selected = dcc.Store(id="store-selected-flight")
 store_sampled = dcc.Store(id="store-sampled")
+store_flights_rev = dcc.Store(id="store-flights-rev")
+store_live = dcc.Store(id="store-live")
+store_map_traces = dcc.Store(id="store-map-traces")
+store_flows = dcc.Store(id="store-flows")
+store_flows_rev = dcc.Store(id="store-flows-rev")
+live_timer = dcc.Interval(id="live-timer", interval=int(LIVE_REFRESH_S * 1000), disabled=True)
 
 # URL for query-state
 url_loc = dcc.Location(id="url", refresh=False)
 
-app.layout = dbc.Container([
-    url_loc,
-    navbar,
-    controls_bar,
-    settings_offcanvas,
-    dbc.Row(
-    [
-        # Left column: map
-        dbc.Col(
+
+def serve_layout():
+    """Page layout, built per page load so the options and the default window are current."""
+    with startup.phase("first layout", once=True):
+        options = sector_options()
+        start, end = default_window()
+        return dbc.Container([
+            url_loc,
+            navbar,
+            controls_bar(options, start, end),
+            settings_offcanvas(snapshot_options()),
+            dbc.Row(
             [
-                dcc.Loading(map_graph, type="dot", style={"height": "100%"}),
-                timeline,  # <--- add this line
-            ],
-            md=7,
-            style={"display": "flex", "flexDirection": "column"}
-        ),
+                # Left column: map
+                dbc.Col(
+                    [
+                        dcc.Loading(map_graph, type="dot", style={"height": "100%"}),
+                        map_tooltip,
+                        timeline,  # <--- add this line
+                    ],
+                    md=7,
+                    style={"display": "flex", "flexDirection": "column"}
+                ),
 
 
-        # Right column: bar + table stacked to match MAP_VH
-        dbc.Col(
-            [
-                dcc.Loading(bar_graph, type="dot", style={"height": f"{RIGHT_BAR_VH}vh"}),
-                dcc.Loading(flight_table, type="dot")  # DataTable has its own height in style_table
+                # Right column: bar + table stacked to match MAP_VH
+                dbc.Col(
+                    [
+                        dcc.Loading(bar_graph, type="dot", style={"height": f"{RIGHT_BAR_VH}vh"}),
+                        dbc.Tabs([
+                            dbc.Tab(dcc.Loading(flight_table, type="dot"), label="Flights"),  # DataTable has its own height in style_table
+                            dbc.Tab(dcc.Loading(conflict_table, type="dot"), label="Conflicts", tab_id="conflicts"),
+                            dbc.Tab(dcc.Loading(flow_panel, type="dot"), label="Flows", tab_id="flows"),
+                        ], id="right-tabs"),
+                    ],
+                    md=5,
+                    id="right-col",
+                    style={
+                        "display": "flex",
+                        "flexDirection": "column",
+                        "gap": "8px",               # small gap between bar and table
+                        "height": f"{MAP_VH}vh"     # right column total height == map height
+                    },
+                ),
             ],
-            md=5,
-            id="right-col",
-            style={
-                "display": "flex",
-                "flexDirection": "column",
-                "gap": "8px",               # small gap between bar and table
-                "height": f"{MAP_VH}vh"     # right column total height == map height
-            },
-        ),
-    ],
-    className="mt-3 g-2",
-    align="start",),
-    store_flights, store_sector, store_bins, store_selected, store_sampled,
-], fluid=True)
+            className="mt-3 g-2",
+            align="start",),
+            store_flights, store_sector, store_bins, store_selected, store_sampled,
+            store_flights_rev, store_live, store_map_traces, store_flows, store_flows_rev, live_timer,
+            dcc.Store(id="store-session", data=uuid.uuid4().hex),  # one per page load (browser tab)
+        ], fluid=True)
+
 
 # =============================
 # 5) URL <-> UI Sync
 # =============================
-@app.callback(
+@callback(
     Output("url", "search", allow_duplicate=True),
     Input("area-type", "value"),
     Input("sector-id", "value"),
@@ -372,9 +470,10 @@ app.layout = dbc.Container([
     Input("trace-mode", "value"),
     Input("trace-decimation", "value"),
     Input("columns", "value"),
+    Input("place-id", "value"),
     prevent_initial_call=True,
 )
-def write_url(area, sector, start, end, mode, decim, cols):
+def write_url(area, sector, start, end, mode, decim, cols, place=None):
     def is_valid(v):
         if v is None:
             return False
@@ -389,46 +488,236 @@ def write_url(area, sector, start, end, mode, decim, cols):
         "trace_decimation": int(decim or 8),
         "columns": int(cols or 2),
     }
-    if is_valid(sector):
+    if area in PLACE_KINDS:
+        if is_valid(place):
+            params["place"] = str(place)
+    elif is_valid(sector):
         try:
             params["sector"] = int(sector)
         except Exception:
             pass
     return "?" + urlencode(params)
 
-@app.callback(
+def fl_filter(apply_fl, fl_range):
+    """``(min_ft, max_ft)`` from the FL controls, or ``None`` when the filter is off."""
+    if not (apply_fl and ("apply" in apply_fl)):
+        return None
+    if fl_range and len(fl_range) == 2:
+        return int(fl_range[0]) * 100, int(fl_range[1]) * 100
+    return 0, 99999
+
+
+def flight_records(df):
+    """Trajectory frame -> list of JSON-ready dicts for ``store-flights``."""
+    return TrajectoryDataset.from_frame(df).records()
+
+
+def group_flights(flights, points=True):
+    """Rows -> ``{FlightId: {...}}`` with concatenated points and the fields shown per flight.
+
+    ``points=False`` skips parsing the geometry (for callers needing the fields only).
+    """
+    by_fid: dict[int, dict] = {}
+    for r in (flights or []):
+        fid = r.get("FlightId")
+        if fid is None:
+            continue
+
+        d = by_fid.setdefault(fid, {
+            "points": [],
+            "Callsign": r.get("Callsign"),
+            "ETOT": r.get("ETOT"), "ELDT": r.get("ELDT"),
+            "CTOT": r.get("CTOT"), "CLDT": r.get("CLDT"),
+            "ATOT": r.get("ATOT"), "ALDT": r.get("ALDT"),
+            "StartTime": r.get("StartTime"),
+            # NEW: keep airport codes (not coords)
+            "AirportDeparture": None,
+            "AirportArrival": None,
+        })
+
+        # Prefer first non-empty value we see
+        if not d["AirportDeparture"] and r.get("AirportDeparture"):
+            d["AirportDeparture"] = r.get("AirportDeparture")
+        if not d["AirportArrival"] and r.get("AirportArrival"):
+            d["AirportArrival"] = r.get("AirportArrival")
+
+        if points:
+            d["points"].extend(wkt_to_points(r.get("WKT")))
+
+        # keep earliest StartTime
+        if r.get("StartTime") and (not d["StartTime"] or r["StartTime"] < d["StartTime"]):
+            d["StartTime"] = r["StartTime"]
+    return by_fid
+
+
+def vertex_budget(decim):
+    """Map-wide vertex budget for the trace-decimation slider value."""
+    return max(2, MAP_VERTEX_BUDGET // max(1, int(decim or 1)))
+
+
+def simplified_paths(by_fid, decim):
+    """Kept point indices per flight under the vertex budget, and the cutoff for simplify_path."""
+    kept, cutoff = simplify_paths([d["points"] for d in by_fid.values()], vertex_budget(decim))
+    return dict(zip(by_fid, kept)), cutoff
+
+
+def flight_path(fid, d, keep):
+    """Lat/lon/hover lists of one flight in the Flights trace, ``None``-terminated ([] if too short)."""
+    pts = [d["points"][i] for i in keep]
+    if len(pts) < 2:
+        return [], [], []
+    name = d.get("Callsign") or f"FID {fid}"
+    lats = [p[0] for p in pts]
+    lons = [p[1] for p in pts]
+    # separator
+    return lats + [None], lons + [None], [f"{name}"] * len(lats) + [None]
+
+
+TYPED_ARRAY_CODES = {"int8": "i1", "uint8": "u1", "int16": "i2", "uint16": "u2",
+                     "int32": "i4", "uint32": "u4", "float32": "f4", "float64": "f8"}
+
+
+def typed(values, dtype=None):
+    """Array -> plotly.js typed-array spec (``{"dtype", "bdata"}``, base64) instead of a JSON number list.
+
+    Dtypes plotly.js has no typed array for (int64, object, ...) and empty
+    arrays stay plain lists.
+    """
+    arr = np.asarray(values, dtype=dtype)
+    code = TYPED_ARRAY_CODES.get(arr.dtype.name)
+    if code is None or not arr.size:
+        return arr.tolist()
+    spec = {"dtype": code, "bdata": base64.b64encode(arr.astype("<" + code).tobytes()).decode("ascii")}
+    if arr.ndim > 1:
+        spec["shape"] = ", ".join(map(str, arr.shape))
+    return spec
+
+
+def vertex_profile(r, keep):
+    """Flight level and speed of row ``r`` at the kept vertex indices (NaN where the profile is short)."""
+    alts, spds = _parse_csv_ints(r.get("AltitudeFt")), _parse_csv_ints(r.get("SpeedKn"))
+    fl = [alts[i] // 100 if i < len(alts) and isinstance(alts[i], int) else np.nan for i in keep]
+    kt = [spds[i] if i < len(spds) and isinstance(spds[i], int) else np.nan for i in keep]
+    return fl, kt
+
+
+def flights_trace(paths, labels, profiles=None, **kwargs):
+    """Compact Flights trace over ``paths`` (``[(lats, lons), ...]``, one per entry of ``labels``).
+
+    Coordinates are float32 typed arrays with NaN breaks; ``customdata`` holds
+    each vertex's index into the ``meta["flights"]`` table, which the map
+    tooltip resolves (-1 on breaks). With ``profiles`` (``[(fl, kt), ...]``
+    per path) the rows are ``[index, FL, kt]`` instead.
+    """
+    sizes = np.array([len(lats) for lats, _lons in paths], dtype=np.int64)
+    n = int(sizes.sum()) + len(paths)
+    on = np.ones(n, dtype=bool)
+    on[np.cumsum(sizes + 1) - 1] = False  # one break after every path
+    lat, lon = np.full(n, np.nan, dtype=np.float32), np.full(n, np.nan, dtype=np.float32)
+    index = np.full(n, -1, dtype=np.int32)
+    if n:
+        lat[on] = np.concatenate([p[0] for p in paths])
+        lon[on] = np.concatenate([p[1] for p in paths])
+        index[on] = np.repeat(np.arange(len(paths)), sizes)
+    customdata = index
+    if profiles is not None:
+        customdata = np.full((n, 3), np.nan, dtype=np.float32)
+        customdata[:, 0] = index
+        if n:
+            customdata[on, 1] = np.concatenate([p[0] for p in profiles])
+            customdata[on, 2] = np.concatenate([p[1] for p in profiles])
+    return go.Scattermapbox(
+        lat=typed(lat), lon=typed(lon), customdata=typed(customdata), meta={"flights": list(labels)},
+        line=dict(width=1.5, color="#00D1FF"), name="Flights", hoverinfo="none", showlegend=False, **kwargs,
+    )
+
+
+def bin_entry(fid, d, aligned_start):
+    """Demand-bin row of one flight, binned by its earliest StartTime (``None`` before the window)."""
+    st = datetime.fromisoformat(d["StartTime"]) if d.get("StartTime") else None
+    if not (st and st >= aligned_start):
+        return None
+    idx = bin_index(st, aligned_start)
+    return {
+        "FlightId": fid,
+        "Callsign": d.get("Callsign"),
+        "bin": idx,
+        # USE airport codes from Flight table
+        "AirportDeparture": d.get("AirportDeparture"),
+        "AirportArrival":  d.get("AirportArrival"),
+        "ETOT": d.get("ETOT"), "ELDT": d.get("ELDT"),
+        "CTOT": d.get("CTOT"), "CLDT": d.get("CLDT"),
+        "ATOT": d.get("ATOT"), "ALDT": d.get("ALDT"),
+    }
+
+
+def source_for(data_source):
+    """Data source for the ``data-source`` dropdown value ("" = configured database)."""
+    return open_snapshot(data_source) if data_source else get_datasource()
+
+
+@callback(
     Output("store-flights", "data"),
     Output("store-sector-geojson", "data"),
     Output("status-text", "children"),
+    Output("store-flights-rev", "data"),
+    Output("store-live", "data"),
+    Output("store-interval-bins", "data"),
     Input("sector-id", "value"),
     Input("start-utc", "value"),
     Input("end-utc", "value"),
     Input("apply-fl", "value"),
     Input("fl-range", "value"),
+    Input("data-source", "value"),
+    Input("live-mode", "value"),
+    State("store-live", "data"),
+    Input("area-type", "value"),
+    Input("place-id", "value"),
+    Input("area-radius", "value"),
+    State("store-session", "data"),
 )
-def fetch_data(sector_id, start_utc, end_utc, apply_fl, fl_range):
+def fetch_data(sector_id, start_utc, end_utc, apply_fl, fl_range, data_source="", live_on=False, live=None,
+               area_type="sector", place_code=None, radius_nm=None, session=None):
+    if live and not live_on and ctx.triggered_id == "live-mode":
+        # Leaving live mode keeps what is on screen
+        return dash.no_update, dash.no_update, dash.no_update, dash.no_update, None, dash.no_update
+    # A live tick moved the window itself; it has already merged the delta
+    if (live and live.get("key") and (live.get("start"), live.get("end")) == (start_utc, end_utc)
+            and set(ctx.triggered_prop_ids) <= {"start-utc.value", "end-utc.value"}):
+        raise PreventUpdate
+    # A newer request from this browser tab cancels the statement still
+    # running for this one; Dash would drop its response anyway
+    try:
+        with superseding(session and f"{session}:fetch_data"), prefetcher().foreground():
+            if area_type in PLACE_KINDS:
+                return fetch_area(area_type, place_code, radius_nm, start_utc, end_utc, apply_fl, fl_range, data_source,
+                                  session)
+            return fetch_sector(sector_id, start_utc, end_utc, apply_fl, fl_range, data_source, live_on, session)
+    except QueryCancelled:
+        raise PreventUpdate
+
+
+def fetch_sector(sector_id, start_utc, end_utc, apply_fl, fl_range, data_source="", live_on=False, session=None):
+    """``fetch_data`` for a sector: the trajectories of the window, optionally seeding live mode."""
     if not sector_id:
-        return [], None, "No sector selected"
+        return [], None, "No sector selected", time.time(), None, []
     start_dt = datetime.fromisoformat(start_utc.replace("Z", ""))
     end_dt = datetime.fromisoformat(end_utc.replace("Z", ""))
+    source = source_for(data_source)
 
     # Build sector overlay feature
-    # Fresh sector geometry from DB (ensures latest + correct rings)
-    secdf = sql_query(SQL_SECTOR_BY_ID, (int(sector_id),))
-    if secdf.empty:
-        return [], None, "Sector not found"
-    sector_row = secdf.iloc[0]
+    # Fresh sector geometry from the data source (ensures latest + correct rings)
+    sector_row = source.get_sector(int(sector_id))
+    if sector_row is None:
+        return [], None, "Sector not found", time.time(), None, []
     feature = polygon_wkt_to_geojson_feature(
         name=str(sector_row["Name"]), wkt=str(sector_row["WKT"]), props={"id": int(sector_row["Id"])},
     )
 
     # FL filter settings
-    apply = 1 if (apply_fl and ("apply" in apply_fl)) else 0
-    if fl_range and len(fl_range) == 2:
-        min_ft = int(fl_range[0]) * 100
-        max_ft = int(fl_range[1]) * 100
-    else:
-        min_ft, max_ft = 0, 99999
+    fl = fl_filter(apply_fl, fl_range)
+    apply = 1 if fl else 0
+    min_ft, max_ft = fl or (0, 99999)
 
     # Geometry simplification tolerance: meters -> degrees (~111km per deg)
     # We read the current decimation from a Store via workaround (set in URL sync) or use default 8 if not available.
@@ -437,66 +726,197 @@ def fetch_data(sector_id, start_utc, end_utc, apply_fl, fl_range):
     tol_m = max(50.0, SIMPLIFY_BASE_M * max(1, int(decim)))
     tol_deg = tol_m / 111_000.0
 
-    # Query with optional FL EXISTS filter + server-side Reduce + TOP cap
-    df = sql_query(SQL_TRAJ_BY_SECTOR, (int(sector_id), start_dt, end_dt, apply, min_ft, max_ft, MAX_TRAJ, SIMPLIFY_TOL_DEG))
+    # Query with optional FL filter + geometry simplification + row cap.
+    # The converted records are shared with the other workers via the cache.
+    load = sector_loader(source, sector_id, start_dt, end_dt, fl)
+    key = sector_dataset_key(data_source or source.name, sector_id, start_dt, end_dt, fl)
+    if CACHE_ENABLED:
+        ds = shared_cache().get_or_compute(key, load, CACHE_TTL_S)
+        prefetcher().hit(key)
+        if PREFETCH_ENABLED and not data_source and not live_on:
+            prefetch_neighbours(source, sector_id, start_dt, end_dt, fl)
+    else:
+        ds = load()
+    flights, note = budgeted_records(ds, session)
+    bins = shared_bins(key, ds, start_utc)
+
+    status = f"Loaded {len(flights)} trajectories (cap {MAX_TRAJ})" + (f" | FL filter: FL{min_ft//100}–FL{max_ft//100}" if apply else "") + note
+    if data_source:
+        status += f" | snapshot {data_source}"
+
+    live_state = None
+    if live_on:
+        # StartTime doubles as the high-water mark unless the DB tracks modifications
+        marks = None if LIVE_HWM_COLUMN == "StartTime" else [datetime.utcnow().isoformat()]
+        window = LiveWindow.seed(sector_id, data_source, fl, start_dt, end_dt, flights, marks)
+        save_window(window)
+        live_state = {"key": window.key, "start": start_utc, "end": end_utc}
+        status += " | live"
+    return flights, {"type": "FeatureCollection", "features": [feature]}, status, time.time(), live_state, bins
+
+
+def sector_dataset_key(name, sector_id, start_dt, end_dt, fl):
+    return make_key("dataset", name, int(sector_id), start_dt, end_dt, fl, MAX_TRAJ, SIMPLIFY_TOL_DEG)
+
+
+def sector_loader(source, sector_id, start_dt, end_dt, fl):
+    """Loader of the :class:`TrajectoryDataset` ``fetch_sector`` shows for a sector and window."""
+    source = getattr(source, "inner", source)  # the dataset itself is what gets cached
+
+    def load():
+        df = source.trajectories(
+            int(sector_id), start_dt, end_dt, fl_range=fl, max_rows=MAX_TRAJ, tol_deg=SIMPLIFY_TOL_DEG,
+        )
+        return TrajectoryDataset.from_frame(df)
+    return load
+
+
+def prefetch_neighbours(source, sector_id, start_dt, end_dt, fl):
+    """Warm the next/previous window of this sector, then its neighbours over this window."""
+    step = timedelta(hours=PREFETCH_STEP_H)
+    plans = [("window", int(sector_id), start_dt + step, end_dt + step),
+             ("window", int(sector_id), start_dt - step, end_dt - step)]
+    neighbours = adjacent_sectors(source.list_sectors()).get(int(sector_id), [])
+    plans += [("sector", sid, start_dt, end_dt) for sid in neighbours[:PREFETCH_MAX_SECTORS]]
+
+    def warm(kind, sid, s, e):
+        load = sector_loader(source, sid, s, e, fl)
+        if kind == "window":
+            return load
+
+        def load_sector():
+            source.get_sector(sid)  # switching sector also reads its overlay geometry first
+            return load()
+        return load_sector
+
+    prefetcher().schedule([(kind, sector_dataset_key(source.name, sid, s, e, fl), warm(kind, sid, s, e))
+                           for kind, sid, s, e in plans])
+
+
+def fetch_area(kind, code, radius_nm, start_utc, end_utc, apply_fl, fl_range, data_source="", session=None):
+    """``fetch_data`` for an airport/waypoint cylinder, answered from the window's track index."""
+    place = place_catalog().get(kind, code)
+    if place is None:
+        return [], None, f"No {kind} selected", time.time(), None, []
+    start_dt = datetime.fromisoformat(start_utc.replace("Z", ""))
+    end_dt = datetime.fromisoformat(end_utc.replace("Z", ""))
+    source = source_for(data_source)
+    area = place_area(place, radius_nm, fl_filter(apply_fl, fl_range))
+    name = data_source or source.name
+
+    def load():
+        df = area_trajectories(source, area, start_dt, end_dt, max_rows=MAX_TRAJ, tol_deg=SIMPLIFY_TOL_DEG, name=name)
+        return TrajectoryDataset.from_frame(df)
+
+    key = make_key("dataset", name, area, start_dt, end_dt, MAX_TRAJ, SIMPLIFY_TOL_DEG)
+    if CACHE_ENABLED:
+        ds = shared_cache().get_or_compute(key, load, CACHE_TTL_S)
+    else:
+        ds = load()
+    flights, note = budgeted_records(ds, session)
+    bins = shared_bins(key, ds, start_utc)
+
+    status = f"Loaded {len(flights)} trajectories (cap {MAX_TRAJ}) | {area.label}" + note
+    if data_source:
+        status += f" | snapshot {data_source}"
+    # Live mode follows sectors only; an area view stays a static window
+    return flights, {"type": "FeatureCollection", "features": [area.feature()]}, status, time.time(), None, bins
 
-    flights = []
-    for _, r in df.iterrows():
-        flights.append({
-            "TrajectoryId": int(r["TrajectoryId"]),
-            "FlightId": int(r["FlightId"]),
-            "FlightSourceId": int(r["FlightSourceId"]) if pd.notna(r["FlightSourceId"]) else None,
-            "Callsign": r.get("Callsign"),
-            "AirportDeparture": r.get("AirportDeparture"),
-            "AirportArrival": r.get("AirportArrival"),
-            "FlightRule": r.get("FlightRule"),
-            "FlightType": r.get("FlightType"),
-            "AircraftType": r.get("AircraftType"),
-            "WakeTurbulanceCategory": r.get("WakeTurbulanceCategory"),
-            "REG": r.get("REG"),
-            "LevelInitial": r.get("LevelInitial"),
-            "SpeedInitial": r.get("SpeedInitial"),
-            "SID": r.get("SID"),
-            "STAR": r.get("STAR"),
-            "RunwayDeparture": r.get("RunwayDeparture"),
-            "RunwayArrival": r.get("RunwayArrival"),
-            "AirportAlternate": r.get("AirportAlternate"),
-            "Number": r.get("Number"),
-            "SOBT": r["SOBT"].isoformat() if pd.notna(r.get("SOBT")) else None,
-            "EOBT": r["EOBT"].isoformat() if pd.notna(r.get("EOBT")) else None,
-            "STOT": r["STOT"].isoformat() if pd.notna(r.get("STOT")) else None,
-            "SLDT": r["SLDT"].isoformat() if pd.notna(r.get("SLDT")) else None,
-            "TimeFiling": r["TimeFiling"].isoformat() if pd.notna(r.get("TimeFiling")) else None,
-            "ETOT": r["ETOT"].isoformat() if pd.notna(r.get("ETOT")) else None,
-            "ELDT": r["ELDT"].isoformat() if pd.notna(r.get("ELDT")) else None,
-            "CTOT": r["CTOT"].isoformat() if pd.notna(r.get("CTOT")) else None,
-            "CLDT": r["CLDT"].isoformat() if pd.notna(r.get("CLDT")) else None,
-            "ATOT": r["ATOT"].isoformat() if pd.notna(r.get("ATOT")) else None,
-            "ALDT": r["ALDT"].isoformat() if pd.notna(r.get("ALDT")) else None,
-            "StartTime": r["StartTime"].isoformat() if pd.notna(r["StartTime"]) else None,
-            "EndTime": r["EndTime"].isoformat() if pd.notna(r["EndTime"]) else None,
-            "WKT": r["WKT"],
-            "AltitudeFt": r.get("AltitudeFt"),
-            "SpeedKn": r.get("SpeedKn"),
-            "Heading": r.get("Heading"),
-            "RoutePortion": r.get("RoutePortion"),
-        })
 
-    status = f"Loaded {len(flights)} trajectories (cap {MAX_TRAJ})" + (f" | FL filter: FL{min_ft//100}–FL{max_ft//100}" if apply else "")
-    return flights, {"type": "FeatureCollection", "features": [feature]}, status
+def budgeted_records(ds, session=None):
+    """``store-flights`` records of ``ds`` and a status note, coarsened if the tab's memory budget requires it.
 
-@app.callback(
+    The dataset is columnar on the server (cache, budget) only; the store
+    keeps one record per row, the layout every reader of ``store-flights``
+    and the live-mode Patch operations index into.
+    """
+    ds, tol = fit_to_budget(ds, session, SIMPLIFY_TOL_DEG)
+    ledger.record(session, "flights", ds.nbytes)
+    if tol is None:
+        return ds.records(), ""
+    SESSION_COARSENED.inc("fetch_data")
+    return ds.records(), f" | geometry coarsened to {tol:g}° (memory budget)"
+
+
+BIN_TIME_FIELDS = ["ETOT", "ELDT", "CTOT", "CLDT", "ATOT", "ALDT"]
+BIN_FIELDS = ["FlightId", "Callsign", "bin", "AirportDeparture", "AirportArrival", *BIN_TIME_FIELDS]
+
+
+def interval_bins(ds, start_utc):
+    """:func:`bin_entry` of every flight in ``ds``, from its columns (no per-flight parsing).
+
+    Like :func:`group_flights`, a flight takes its fields from its first
+    row, the first non-empty airports and the earliest ``StartTime``.
+    """
+    fids = ds.columns["FlightId"]
+    rows = np.flatnonzero(fids != MISSING)
+    if not len(rows):
+        return []
+    # Flights in order of their first row
+    uniq, first, owner = np.unique(fids[rows], return_index=True, return_inverse=True)
+    order = np.argsort(first, kind="stable")
+    rank = np.empty(len(uniq), dtype=np.int64)
+    rank[order] = np.arange(len(uniq))
+    owner = rank[owner]
+    head = rows[first[order]]
+
+    start = ds.columns["StartTime"][rows]
+    earliest = np.full(len(uniq), np.iinfo(np.int64).max)
+    np.minimum.at(earliest, owner, np.where(start == MISSING, np.iinfo(np.int64).max, start))
+    aligned_start = floor_to_20(datetime.fromisoformat(start_utc.replace("Z", "")))
+    aligned_ms = int(np.datetime64(aligned_start, "ms").astype(np.int64))
+    keep = (earliest != np.iinfo(np.int64).max) & (earliest >= aligned_ms)
+    bins = (earliest - aligned_ms) // int(BIN.total_seconds() * 1000)
+
+    kept = np.flatnonzero(keep)
+    head = head[kept]
+
+    def decode(name, codes):
+        return np.append(ds.tables[name], None)[codes]  # code -1 -> None
+
+    def first_present(name):
+        codes = ds.codes[name][rows]
+        present = np.flatnonzero((codes >= 0) & np.array([bool(v) for v in ds.tables[name]] + [False])[codes])
+        out = np.full(len(uniq), -1, dtype=np.int64)
+        seen, at = np.unique(owner[present], return_index=True)
+        out[seen] = codes[present][at]
+        return decode(name, out[kept]).tolist()
+
+    columns = [
+        uniq[order[kept]].tolist(),
+        decode("Callsign", ds.codes["Callsign"][head]).tolist(),
+        bins[kept].tolist(),
+        first_present("AirportDeparture"),
+        first_present("AirportArrival"),
+        *(iso_strings(ds.columns[name][head]) for name in BIN_TIME_FIELDS),
+    ]
+    return [dict(zip(BIN_FIELDS, row)) for row in zip(*columns)]
+
+
+def shared_bins(dataset_key, ds, start_utc):
+    """:func:`interval_bins` of a dataset, computed once and shared by the workers next to it."""
+    if not CACHE_ENABLED:
+        return interval_bins(ds, start_utc)
+    return shared_cache().get_or_compute(make_key("bins", dataset_key, start_utc),
+                                         lambda: interval_bins(ds, start_utc), CACHE_TTL_S)
+
+
+@callback(
     Output("map-fig", "figure"),
-    Output("store-interval-bins", "data"),
-    Input("store-flights", "data"),
+    State("store-flights", "data"),
     Input("store-sector-geojson", "data"),
     Input("trace-mode", "value"),
     Input("trace-decimation", "value"),
     Input("map-style", "value"),
     State("interval-min", "value"),
     State("start-utc", "value"),
+    # Full redraws follow fetch_data only; live ticks patch store-flights in place
+    Input("store-flights-rev", "data"),
+    State("store-live", "data"),
+    State("store-session", "data"),
 )
-def update_map(flights, sector_fc, mode, decim, map_style, interval_min, start_utc):
+def update_map(flights, sector_fc, mode, decim, map_style, interval_min, start_utc, _rev=None, live=None,
+               session=None):
     fig = go.Figure()
     fig.update_layout(mapbox_style=map_style, margin=dict(l=0, r=0, t=0, b=0), legend_orientation="h", uirevision="map")
 
@@ -505,151 +925,115 @@ def update_map(flights, sector_fc, mode, decim, map_style, interval_min, start_u
         fig.add_trace(go.Choroplethmapbox(
             geojson=sector_fc, locations=[0], z=[1], showscale=False,
             marker_opacity=0.18, marker_line_width=1, marker_line_color="#888",
-            hovertemplate="Sector: %{properties.name}<extra></extra>", name="Sector"
+            hovertemplate=sector_fc["features"][0]["properties"].get("kind", "Sector") + ": %{properties.name}<extra></extra>",
+            name="Sector"
         ))
 
     # 1) Build per-flight paths from all rows (handles Point or Line WKT)
-    by_fid: dict[int, dict] = {}
-    for r in (flights or []):
-        fid = r.get("FlightId")
-        if fid is None:
-            continue
-
-        d = by_fid.setdefault(fid, {
-            "points": [],
-            "Callsign": r.get("Callsign"),
-            "ETOT": r.get("ETOT"), "ELDT": r.get("ELDT"),
-            "CTOT": r.get("CTOT"), "CLDT": r.get("CLDT"),
-            "ATOT": r.get("ATOT"), "ALDT": r.get("ALDT"),
-            "StartTime": r.get("StartTime"),
-            # NEW: keep airport codes (not coords)
-            "AirportDeparture": None,
-            "AirportArrival": None,
-        })
-
-        # Prefer first non-empty value we see
-        if not d["AirportDeparture"] and r.get("AirportDeparture"):
-            d["AirportDeparture"] = r.get("AirportDeparture")
-        if not d["AirportArrival"] and r.get("AirportArrival"):
-            d["AirportArrival"] = r.get("AirportArrival")
-
-        pts = wkt_to_points(r.get("WKT"))
-        d["points"].extend(pts)
-
-        # keep earliest StartTime
-        if r.get("StartTime") and (not d["StartTime"] or r["StartTime"] < d["StartTime"]):
-            d["StartTime"] = r["StartTime"]
+    by_fid = group_flights(flights)
 
-    # 2) Aggregate into a single trace
-    lat_all, lon_all, text_all = [], [], []
+    # 2) Aggregate into a single trace, simplified to the map-wide vertex budget
+    keep, _cutoff = simplified_paths(by_fid, decim)
+    paths, labels = [], []
     for fid, d in by_fid.items():
-        pts = decimate_points(d["points"], int(decim or 1))
-        if len(pts) < 2:
-            continue
-        name = d.get("Callsign") or f"FID {fid}"
-        lats = [p[0] for p in pts]
-        lons = [p[1] for p in pts]
-        lat_all.extend(lats); lon_all.extend(lons)
-        text_all.extend([f"{name}" ] * len(lats))
-        # separator
-        lat_all.append(None); lon_all.append(None); text_all.append(None)
-
-    if lat_all:
-        fig.add_trace(go.Scattermapbox(
-            lat=lat_all, lon=lon_all, mode="lines",
-            line=dict(width=1.5, color="#00D1FF"),
-            name="Flights", hovertext=text_all, hoverinfo="text", showlegend=False,
-        ))
-        # Add persistent empty "Now" layer for smooth patch updates
+        lats, lons, texts = flight_path(fid, d, keep[fid])
+        if lats:
+            paths.append((lats[:-1], lons[:-1]))
+            labels.append(texts[0])
+
+    # Flights and "Now" are always present (possibly empty) so live mode and
+    # the moving heads can patch them in place. Live ticks edit the Flights
+    # lists by index, so in live mode they stay plain lists with the label
+    # per vertex; otherwise the trace is typed arrays plus a flight table.
+    if live and live.get("key"):
+        lat_all, lon_all, text_all = [], [], []
+        for (lats, lons), label in zip(paths, labels):
+            lat_all += lats + [None]; lon_all += lons + [None]; text_all += [label] * len(lats) + [None]
         fig.add_trace(go.Scattermapbox(
-            lat=[], lon=[], mode="markers",
-            marker=dict(size=8, color="#FFD166"), name="Now", hoverinfo="text", showlegend=False,
+            lat=lat_all, lon=lon_all, customdata=text_all, mode="lines",
+            line=dict(width=1.5, color="#00D1FF"), name="Flights", hoverinfo="none", showlegend=False,
         ))
-        lat_num = [x for x in lat_all if isinstance(x, float)]
-        lon_num = [x for x in lon_all if isinstance(x, float)]
-        if lat_num and lon_num:
-            fig.update_mapboxes(center=dict(lat=sum(lat_num)/len(lat_num), lon=sum(lon_num)/len(lon_num)), zoom=6)
+    else:
+        fig.add_trace(flights_trace(paths, labels, mode="lines"))
+    fig.add_trace(go.Scattermapbox(
+        lat=[], lon=[], mode="markers",
+        marker=dict(size=8, color="#FFD166"), name="Now", hoverinfo="text", showlegend=False,
+    ))
+    if paths:
+        lat_num = np.concatenate([p[0] for p in paths])
+        lon_num = np.concatenate([p[1] for p in paths])
+        fig.update_mapboxes(center=dict(lat=float(lat_num.mean()), lon=float(lon_num.mean())), zoom=6)
     else:
         fig.update_mapboxes(center=dict(lat=13.75, lon=100.50), zoom=5)
 
-    # 3) Build 20‑minute bins aligned to 00/20/40 based on earliest flight StartTime
-    bins = []
-    if by_fid:
-        aligned_start = floor_to_20(datetime.fromisoformat(start_utc.replace("Z", "")))
-        delta = timedelta(minutes=20)
-        for fid, d in by_fid.items():
-            st = datetime.fromisoformat(d["StartTime"]) if d.get("StartTime") else None
-            if st and st >= aligned_start:
-                idx = int(((st - aligned_start).total_seconds()) // delta.total_seconds())
-                bins.append({
-                    "FlightId": fid,
-                    "Callsign": d.get("Callsign"),
-                    "bin": idx,
-                    # USE airport codes from Flight table
-                    "AirportDeparture": d.get("AirportDeparture"),
-                    "AirportArrival":  d.get("AirportArrival"),
-                    "ETOT": d.get("ETOT"), "ELDT": d.get("ELDT"),
-                    "CTOT": d.get("CTOT"), "CLDT": d.get("CLDT"),
-                    "ATOT": d.get("ATOT"), "ALDT": d.get("ALDT"),
-                })
-
-    return fig, bins
+    ledger.record(session, "figure", estimate_bytes(fig))
+    return fig
 
 
 # Build per-vertex samples with timestamps for animation
 from bisect import bisect_right
 
-@app.callback(
+@callback(
     Output("store-sampled", "data"),
-    Input("store-flights", "data"),
+    State("store-flights", "data"),
     State("start-utc", "value"),
     State("end-utc", "value"),
+    Input("store-flights-rev", "data"),
+    State("store-session", "data"),
 )
-def sample_points(flights, start_utc, end_utc):
+def sample_points(flights, start_utc, end_utc, _rev=None, session=None):
     if not flights:
+        ledger.record(session, "sampled", 0)
         return {"t0": start_utc, "t1": end_utc, "series": []}
-    series = []
-    by_fid: dict[int, dict] = {}
-    # group rows by flight
-    for r in flights:
+    # group rows by flight; times are parsed once for all rows
+    st, en = row_times(flights)
+    rows_by_fid: dict[int, list] = {}
+    for i, r in enumerate(flights):
         fid = r.get("FlightId")
         if fid is None:
             continue
-        d = by_fid.setdefault(fid, {"name": r.get("Callsign") or f"FID {fid}", "pts": [], "ts": []})
+        rows_by_fid.setdefault(fid, []).append(i)
+    series = [sample_series(fid, [flights[i] for i in idx], st[idx], en[idx]) for fid, idx in rows_by_fid.items()]
+    ledger.record(session, "sampled", estimate_bytes(series))
+    return {"t0": start_utc, "t1": end_utc, "series": series}
+
+
+def row_times(rows):
+    """StartTime/EndTime of each row as UTC epoch seconds (NaN when missing)."""
+    out = []
+    for name in ("StartTime", "EndTime"):
+        ms = epoch_ms([r.get(name) for r in rows])
+        out.append(np.where(ms == MISSING, np.nan, ms / 1e3))
+    return out
+
+
+def sample_series(fid, rows, st=None, en=None):
+    """Time-stamped vertices of one flight for the moving heads."""
+    if st is None:
+        st, en = row_times(rows)
+    lat, lon, ts = [], [], []
+    for r, t0, t1 in zip(rows, st, en):
         pts = wkt_to_points(r.get("WKT"))
-        st = datetime.fromisoformat(r["StartTime"]) if r.get("StartTime") else None
-        en = datetime.fromisoformat(r["EndTime"]) if r.get("EndTime") else None
         if not pts:
             continue
-        if st and en and en > st:
-            if len(pts) == 1:
-                d["pts"].append(pts[0]); d["ts"].append(st.timestamp())
-            else:
-                step = (en - st) / (len(pts) - 1)
-                for i, p in enumerate(pts):
-                    d["pts"].append(p)
-                    d["ts"].append((st + i*step).timestamp())
+        lat.extend(p[0] for p in pts)
+        lon.extend(p[1] for p in pts)
+        if t1 > t0:  # False for NaN: no times -> skip anim for this row
+            ts.append(np.linspace(t0, t1, len(pts)) if len(pts) > 1 else np.array([t0]))
         else:
-            # fallback: no times -> skip anim for this row
-            for p in pts:
-                d["pts"].append(p)
-                d["ts"].append(None)
+            ts.append(np.full(len(pts), np.nan))
+    ts = np.concatenate(ts) if ts else np.empty(0)
 
-    for fid, d in by_fid.items():
-        # sort by time (where available)
-        order = list(range(len(d["pts"])))
-        if any(t is not None for t in d["ts"]):
-            order.sort(key=lambda i: (float('inf') if d["ts"][i] is None else d["ts"][i]))
-        lat = [d["pts"][i][0] for i in order]
-        lon = [d["pts"][i][1] for i in order]
-        ts  = [d["ts"][i] for i in order]
-        series.append({"fid": fid, "name": d["name"], "lat": lat, "lon": lon, "ts": ts})
-
-    return {"t0": start_utc, "t1": end_utc, "series": series}
+    # sort by time (where available)
+    order = np.argsort(np.where(np.isnan(ts), np.inf, ts), kind="stable")
+    ts = ts[order].astype(object)
+    ts[pd.isna(ts)] = None
+    return {"fid": fid, "name": rows[0].get("Callsign") or f"FID {fid}",
+            "lat": [lat[i] for i in order], "lon": [lon[i] for i in order], "ts": ts.tolist()}
 
 
 # Set slider bounds & marks from start/end
-@app.callback(
+@callback(
     Output("time-slider", "min"),
     Output("time-slider", "max"),
     Output("time-slider", "value"),
@@ -663,20 +1047,20 @@ def init_slider(start_utc, end_utc):
         return 0, 0, 0, {}, ""
     st = datetime.fromisoformat(start_utc.replace("Z", ""))
     en = datetime.fromisoformat(end_utc.replace("Z", ""))
-    vmin = int(st.timestamp())
-    vmax = int(en.timestamp())
+    vmin = int(st.replace(tzinfo=timezone.utc).timestamp())
+    vmax = int(en.replace(tzinfo=timezone.utc).timestamp())
     # hourly marks
     marks = {}
     cur = st.replace(minute=0, second=0, microsecond=0)
     while cur <= en:
-        marks[int(cur.timestamp())] = cur.strftime("%H:%M")
+        marks[int(cur.replace(tzinfo=timezone.utc).timestamp())] = cur.strftime("%H:%M")
         cur += timedelta(hours=1)
     label = st.strftime("%Y-%m-%d %H:%M") + "Z"
     return vmin, vmax, vmin, marks, label
 
 
 # Toggle play/pause
-@app.callback(
+@callback(
     Output("timer", "disabled"),
     Output("btn-play", "children"),
     Input("btn-play", "n_clicks"),
@@ -689,7 +1073,7 @@ def toggle_play(n, disabled):
 
 
 # Advance slider while playing (bounded)
-@app.callback(
+@callback(
     Output("timeline-slider", "value"),
     Input("timer", "n_intervals"),
     State("timeline-slider", "value"),
@@ -706,7 +1090,7 @@ def tick(_, val, mx):
 # Update label and moving heads on the map (smooth via Patch)
 from dash import Patch
 
-@app.callback(
+@callback(
     Output("map-fig", "figure", allow_duplicate=True),
     Output("time-label", "children", allow_duplicate=True),
     Input("time-slider", "value"),
@@ -755,37 +1139,67 @@ def move_heads(tval, fig, sampled):
     return fig, label
 
 
-@app.callback(
+@callback(
     Output("demand-bar", "figure"),
     Input("store-interval-bins", "data"),
     State("interval-min", "value"),
     State("start-utc", "value"),
     State("end-utc", "value"),
+    State("area-type", "value"),
+    State("place-id", "value"),
+    State("sector-id", "value"),
+    State("apply-fl", "value"),
+    State("fl-range", "value"),
 )
-def update_bar(bins, interval_min, start_utc, end_utc):
+def update_bar(bins, interval_min, start_utc, end_utc, area_type="sector", place_code=None,
+               sector_id=None, apply_fl=None, fl_range=None):
     # 20-minute aligned bins (UTC)
-    start_dt = floor_to_20(datetime.fromisoformat(start_utc.replace("Z", "")))
-    end_dt_raw = datetime.fromisoformat(end_utc.replace("Z", ""))
-    bin_size = timedelta(minutes=20)
-    rem = (end_dt_raw - start_dt).total_seconds() % bin_size.total_seconds()
-    end_dt = end_dt_raw if rem == 0 else (end_dt_raw + timedelta(seconds=(bin_size.total_seconds() - rem)))
-
-    n_bins = max(1, int((end_dt - start_dt) / bin_size))
-    labels = [(start_dt + i*bin_size).strftime("%Y-%m-%d %H:%M") for i in range(n_bins)]
-
-    counts = [0] * n_bins
+    starts = bin_starts(datetime.fromisoformat(start_utc.replace("Z", "")),
+                        datetime.fromisoformat(end_utc.replace("Z", "")))
+    n_bins = len(starts)
+    labels = [t.strftime("%Y-%m-%d %H:%M") for t in starts]
+
+    # Airports split demand into departures, arrivals and everything else
+    split = area_type == "airport" and place_code
+    roles = ("Departures", "Arrivals", "Other") if split else ("Demand",)
+    counts = {role: [0] * n_bins for role in roles}
     if bins:
         for b in bins:
             idx = b.get("bin", -1)
             if 0 <= idx < n_bins:
-                counts[idx] += 1
-
-    fig = go.Figure(go.Bar(
-        x=labels, y=counts,
+                if not split:
+                    role = "Demand"
+                elif b.get("AirportDeparture") == place_code:
+                    role = "Departures"
+                elif b.get("AirportArrival") == place_code:
+                    role = "Arrivals"
+                else:
+                    role = "Other"
+                counts[role][idx] += 1
+
+    fig = go.Figure([go.Bar(
+        x=labels, y=counts[role],
         marker_line_width=0,
-        hovertemplate="<b>%{x}Z</b><br>Flights: %{y}<extra></extra>",
-        name="Demand"
-    ))
+        hovertemplate=f"<b>%{{x}}Z</b><br>{'Flights' if role == 'Demand' else role}: %{{y}}<extra></extra>",
+        name=role
+    ) for role in roles])
+
+    # Same weekday over past weeks from the demand cube: p10-p90 band and median
+    base = None
+    if CUBE_ENABLED and area_type == "sector" and sector_id:
+        base = get_cube().baseline(int(sector_id), starts, fl_range=fl_filter(apply_fl, fl_range))
+    if base:
+        band = f"p10–p90 ({base['weeks']} wk)"
+        fig.add_trace(go.Scatter(x=labels, y=base["p90"], mode="lines", line_width=0, showlegend=False,
+                                 hoverinfo="skip", legendgroup="base"))
+        fig.add_trace(go.Scatter(x=labels, y=base["p10"], mode="lines", line_width=0, fill="tonexty",
+                                 fillcolor="rgba(148,163,184,0.25)", name=band, legendgroup="base",
+                                 hovertemplate=f"{band}: %{{y:.0f}}–%{{customdata:.0f}}<extra></extra>",
+                                 customdata=base["p90"]))
+        fig.add_trace(go.Scatter(x=labels, y=base["p50"], mode="lines", name="Median",
+                                 line=dict(color="#e5e7eb", width=1.5, dash="dot"),
+                                 hovertemplate="Median: %{y:.0f}<extra></extra>"))
+    fig.update_layout(barmode="stack", showlegend=bool(split or base), legend_orientation="h")
     fig.update_layout(
         margin=dict(l=0, r=0, t=10, b=0),
         xaxis_title="Interval (UTC)",
@@ -797,25 +1211,15 @@ def update_bar(bins, interval_min, start_utc, end_utc):
     return fig
 
 
-@app.callback(
-    Output("flight-table", "data"),
-    Output("flight-table", "style_data_conditional"),
-    Input("demand-bar", "clickData"),
-    State("store-interval-bins", "data"),
-    prevent_initial_call=True,
-)
-def table_from_bar_click(clickData, bins):
-    base_styles = [
-        {"if": {"state": "active"},   "backgroundColor": "#111827", "border": "1px solid #374151"},
-        {"if": {"state": "selected"}, "backgroundColor": "#0f172a"},
-        {"if": {"column_id": "Callsign"}, "fontWeight": "600"},
-    ]
-    if not clickData or not bins:
-        return [], base_styles
+TABLE_BASE_STYLES = [
+    {"if": {"state": "active"},   "backgroundColor": "#111827", "border": "1px solid #374151"},
+    {"if": {"state": "selected"}, "backgroundColor": "#0f172a"},
+    {"if": {"column_id": "Callsign"}, "fontWeight": "600"},
+]
 
-    idx = clickData["points"][0]["pointIndex"]
-    rows_raw = [b for b in bins if b.get("bin") == idx]
 
+def table_rows(rows_raw):
+    """Flight table rows and styles for demand-bin entries, every row highlighted."""
     def pick(obj, *alts):
         for k in alts:
             v = obj.get(k)
@@ -840,14 +1244,29 @@ def table_from_bar_click(clickData, bins):
             "ALDT": b.get("ALDT"),
         })
 
-    # Highlight all rows (they're all part of the clicked bin)
-    highlight = base_styles + [
+    # Highlight all rows (they're all part of the selection)
+    highlight = TABLE_BASE_STYLES + [
         {"if": {"row_index": i}, "backgroundColor": "#162036"} for i in range(len(rows))
     ]
     return rows, highlight
 
 
-@app.callback(
+@callback(
+    Output("flight-table", "data"),
+    Output("flight-table", "style_data_conditional"),
+    Input("demand-bar", "clickData"),
+    State("store-interval-bins", "data"),
+    prevent_initial_call=True,
+)
+def table_from_bar_click(clickData, bins):
+    if not clickData or not bins:
+        return [], TABLE_BASE_STYLES
+
+    idx = clickData["points"][0]["pointIndex"]
+    return table_rows([b for b in bins if b.get("bin") == idx])
+
+
+@callback(
     Output("store-selected-flight", "data"),
     Input("flight-table", "active_cell"),
     State("flight-table", "data"),
@@ -860,6 +1279,19 @@ def select_flight(active_cell, rows):
     return r.get("FlightId")  # still present in row data
 
 
+@callback(
+    Output("store-selected-flight", "data", allow_duplicate=True),
+    Input("conflict-table", "active_cell"),
+    State("conflict-table", "data"),
+    prevent_initial_call=True,
+)
+def select_conflict(active_cell, rows):
+    if not active_cell or not rows:
+        return no_update
+    r = rows[active_cell["row"]]
+    return r.get("FlightB") if active_cell.get("column_id") == "CallsignB" else r.get("FlightA")
+
+
 
 def _parse_csv_ints(s):
     if s is None or pd.isna(s):
@@ -873,7 +1305,7 @@ def _parse_csv_ints(s):
             out.append(None)
     return out
 
-@app.callback(
+@callback(
     Output("map-fig", "figure", allow_duplicate=True),
     Input("store-selected-flight", "data"),
     State("map-fig", "figure"),
@@ -890,7 +1322,7 @@ def highlight_on_map(selected_fid, fig, flights, mode, decim):
     data = [tr for tr in fig.get("data", []) if tr.get("name") != "Highlight"]
 
     # Gather all segments for the selected flight
-    lat_h, lon_h, hov = [], [], []
+    lat_h, lon_h, fl_h, kt_h = [], [], [], []
     routeportion = None
 
     for r in (flights or []):
@@ -911,42 +1343,35 @@ def highlight_on_map(selected_fid, fig, flights, mode, decim):
             continue
 
         pts   = pts[:m]
-        alts  = (alts[:m] if alts else [None]*m)
-        spds  = (spds[:m] if spds else [None]*m)
         routeportion = routeportion or (r.get("RoutePortion") or "")
 
-        # Optional decimation (keep hover aligned)
-        step = max(1, int(decim or 1))
-        pts   = pts[::step]
-        alts  = alts[::step]
-        spds  = spds[::step]
-
-        lat_h.extend([p[0] for p in pts])
-        lon_h.extend([p[1] for p in pts])
+        # Shape-preserving simplification under the same budget (keep hover aligned)
+        keep  = simplify_paths([pts], vertex_budget(decim))[0][0]
+        fl, kt = vertex_profile(r, keep)
 
-        # Per-point hover text: FL + speed + route
-        for a, s in zip(alts, spds):
-            fl_txt = f"FL{a//100}" if isinstance(a, int) else "FL?"
-            sp_txt = f"{s} kt" if isinstance(s, int) else "?"
-            hov.append(f"<b>{fl_txt}</b> — {sp_txt}<br>Route: {routeportion}")
+        lat_h.extend([pts[i][0] for i in keep])
+        lon_h.extend([pts[i][1] for i in keep])
+        fl_h.extend(fl)
+        kt_h.extend(kt)
 
         # separator between multi-rows
-        lat_h.append(None); lon_h.append(None); hov.append(None)
+        lat_h.append(np.nan); lon_h.append(np.nan); fl_h.append(np.nan); kt_h.append(np.nan)
 
-    if not any(isinstance(x, float) for x in lat_h):
+    if not lat_h:
         # nothing to draw; just return the original
         fig["data"] = data
         return fig
 
+    # Per-point FL + speed come from customdata; the route is the same for every point
     data.append(go.Scattermapbox(
-        lat=lat_h,
-        lon=lon_h,
+        lat=typed(lat_h, np.float32),
+        lon=typed(lon_h, np.float32),
+        customdata=typed(np.column_stack([fl_h, kt_h]), np.float32),
         mode="lines+markers",
         line=dict(width=3, color="#FF3B30"),        # <- RED line
         marker=dict(size=5, color="#FF3B30"),
         name="Highlight",
-        hoverinfo="text",
-        hovertext=hov,
+        hovertemplate=f"<b>FL%{{customdata[0]}}</b> — %{{customdata[1]}} kt<br>Route: {routeportion or ''}<extra></extra>",
         showlegend=False,
     ))
     fig["data"] = data
@@ -954,7 +1379,7 @@ def highlight_on_map(selected_fid, fig, flights, mode, decim):
 
 from dash import no_update
 
-@app.callback(
+@callback(
     Output("map-fig", "figure", allow_duplicate=True),
     Input("demand-bar", "clickData"),
     State("store-interval-bins", "data"),
@@ -983,42 +1408,517 @@ def filter_map_by_bar_click(clickData, bins, flights, mode, decim, fig):
                        if tr.get("name") not in ("Flights", "Highlight")]
         return fig
 
-    # Rebuild the blue "Flights" layer for just the selected flights
-    lat_all, lon_all, text_all = [], [], []
-    dec = max(1, int(decim or 1))
-    for r in (flights or []):
-        fid = r.get("FlightId")
-        if fid not in sel_ids:
-            continue
-        name = r.get("Callsign") or f"FID {fid}"
-        pts = wkt_to_points(r.get("WKT"))
-        pts = decimate_points(pts, dec)
-        if len(pts) >= 2:
-            lats = [p[0] for p in pts]
-            lons = [p[1] for p in pts]
-            lat_all.extend(lats + [None])   # None -> segment break
-            lon_all.extend(lons + [None])
-            text_all.extend([name] * len(lats) + [None])
-
     # Keep everything except previous Flights/Highlight, then add filtered Flights
     data_kept = [tr for tr in (fig.get("data") or [])
                  if tr.get("name") not in ("Flights", "Highlight")]
-
-    if lat_all:
-        data_kept.append(go.Scattermapbox(
-            lat=lat_all, lon=lon_all,
-            mode="lines" if (mode != "markers") else "lines+markers",
-            line=dict(width=1.5, color="#00D1FF"),
-            name="Flights",
-            hovertext=text_all, hoverinfo="text",
-            showlegend=False,
-        ))
+    layer = flights_layer([r for r in flights if r.get("FlightId") in sel_ids], mode, decim,
+                          hover=len(sel_ids) <= HOVER_MAX_FLIGHTS)
+    if layer is not None:
+        data_kept.append(layer)
 
     fig["data"] = data_kept
     return fig
 
 
-@app.callback(
+def flights_layer(rows, mode, decim, hover=False):
+    """Blue "Flights" trace for just ``rows`` (``None`` when none has a line).
+
+    ``hover`` adds FL/speed per vertex to the tooltip, for small selections.
+    """
+    paths, labels, profiles = [], [], []
+    row_pts = [wkt_to_points(r.get("WKT")) for r in rows]
+    kept, _cutoff = simplify_paths(row_pts, vertex_budget(decim))
+    for r, all_pts, keep in zip(rows, row_pts, kept):
+        fid = r.get("FlightId")
+        if len(keep) >= 2:
+            paths.append(([all_pts[i][0] for i in keep], [all_pts[i][1] for i in keep]))
+            labels.append(r.get("Callsign") or f"FID {fid}")
+            if hover:
+                profiles.append(vertex_profile(r, keep))
+    if not paths:
+        return None
+    return flights_trace(paths, labels, profiles if hover else None,
+                         mode="lines" if (mode != "markers") else "lines+markers")
+
+
+@callback(
+    Output("map-fig", "figure", allow_duplicate=True),
+    Output("flight-table", "data", allow_duplicate=True),
+    Output("flight-table", "style_data_conditional", allow_duplicate=True),
+    Output("demand-bar", "figure", allow_duplicate=True),
+    Input("map-fig", "selectedData"),
+    State("store-flights", "data"),
+    State("store-interval-bins", "data"),
+    State("trace-mode", "value"),
+    State("trace-decimation", "value"),
+    State("map-fig", "figure"),
+    State("demand-bar", "figure"),
+    State("store-session", "data"),
+    prevent_initial_call=True,
+)
+def select_region(selectedData, flights, bins, mode, decim, fig, bar, session=None):
+    """Box/lasso on the map: the flights crossing it, from an in-memory STRtree (no query)."""
+    if not flights or not fig:
+        raise PreventUpdate
+    region = selection_region(selectedData)
+    data = [tr for tr in (fig.get("data") or []) if tr.get("name") not in ("Flights", "Highlight", "Region")]
+    bar_data = [tr for tr in ((bar or {}).get("data") or []) if tr.get("name") != "Selection"]
+
+    if region is None:
+        # Selection cleared: every loaded flight again
+        layer = flights_layer(flights, mode, decim)
+        fig["data"] = data + ([layer] if layer is not None else [])
+        if bar:
+            bar["data"] = bar_data
+        return fig, [], TABLE_BASE_STYLES, bar if bar else no_update
+
+    sel_ids = flight_index(session, flights).flights_in(region)
+    sel = set(sel_ids)
+    rows = [r for r in flights if r.get("FlightId") in sel]
+    layer = flights_layer(rows, mode, decim, hover=len(sel_ids) <= HOVER_MAX_FLIGHTS)
+    lats, lons = region_outline(region)
+    fig["data"] = data + ([layer] if layer is not None else []) + [go.Scattermapbox(
+        lat=lats, lon=lons, mode="lines", fill="toself", fillcolor="rgba(255,209,102,0.08)",
+        line=dict(width=1.5, color="#FFD166"), name="Region", hoverinfo="skip", showlegend=False,
+    )]
+
+    # Demand bins hold one entry per flight; flights that started before the
+    # window have none and are listed from their first trajectory instead
+    by_fid = {b.get("FlightId"): b for b in (bins or [])}
+    first = {}
+    for r in rows:
+        first.setdefault(r.get("FlightId"), r)
+    entries = [by_fid.get(fid) or first[fid] for fid in sel_ids]
+    labels = next((tr.get("x") for tr in bar_data if tr.get("type") == "bar"), None)
+    if bar and labels:
+        counts = np.bincount([b["bin"] for b in entries if 0 <= b.get("bin", -1) < len(labels)],
+                             minlength=len(labels))
+        bar["data"] = bar_data + [go.Scatter(
+            x=labels, y=counts.tolist(), mode="lines+markers", line_shape="hvh", name="Selection",
+            line=dict(color="#FFD166", width=2), marker=dict(size=5),
+            hovertemplate="Selection: %{y}<extra></extra>",
+        )]
+    return fig, *table_rows(entries), bar if bar else no_update
+
+
+@callback(
+    Output("snapshot-status", "children"),
+    Output("data-source", "options"),
+    Input("btn-export-snapshot", "n_clicks"),
+    State("sector-id", "value"),
+    State("start-utc", "value"),
+    State("end-utc", "value"),
+    State("apply-fl", "value"),
+    State("fl-range", "value"),
+    State("snapshot-name", "value"),
+    State("data-source", "value"),
+    prevent_initial_call=True,
+)
+def export_snapshot_click(n, sector_id, start_utc, end_utc, apply_fl, fl_range, name, data_source):
+    if not sector_id:
+        return "Select a sector first", no_update
+    start_dt = datetime.fromisoformat(start_utc.replace("Z", ""))
+    end_dt = datetime.fromisoformat(end_utc.replace("Z", ""))
+    try:
+        key = export_snapshot(source_for(data_source), int(sector_id), start_dt, end_dt,
+                              fl_range=fl_filter(apply_fl, fl_range), max_rows=MAX_TRAJ, name=name)
+    except Exception as exc:
+        return f"Export failed: {exc}", no_update
+    return f"Saved snapshot {key}", snapshot_options()
+
+
+@callback(
+    *[Output(f"export-{kind}-{fmt}", "href") for kind, fmt, _label in EXPORT_LINKS],
+    Output("export-links", "style"),
+    Output("export-note", "children"),
+    Input("sector-id", "value"),
+    Input("start-utc", "value"),
+    Input("end-utc", "value"),
+    Input("apply-fl", "value"),
+    Input("fl-range", "value"),
+    Input("area-type", "value"),
+    Input("data-source", "value"),
+)
+def export_links(sector_id, start_utc, end_utc, apply_fl, fl_range, area_type="sector", data_source=""):
+    """Download URLs of the current sector/window; the browser streams them straight from the API."""
+    from utils.api import API_ENABLED, API_PREFIX
+
+    hidden = [""] * len(EXPORT_LINKS) + [{"display": "none"}]
+    if not API_ENABLED:
+        return *hidden, "Exports need the REST API (API_ENABLED)"
+    if area_type != "sector" or not sector_id or data_source:
+        return *hidden, "Exports cover sectors of the configured database"
+    params = {"start": start_utc, "end": end_utc}
+    fl = fl_filter(apply_fl, fl_range)
+    if fl:
+        params.update(fl_min=fl[0], fl_max=fl[1])
+    query = urlencode(params)
+    hrefs = [f"{API_PREFIX}/sectors/{int(sector_id)}/export/{kind}.{fmt}?{query}" for kind, fmt, _label in EXPORT_LINKS]
+    return *hrefs, {}, ""
+
+
+@callback(
+    Output("download-table", "data"),
+    Input("btn-download-table", "n_clicks"),
+    State("flight-table", "data"),
+    prevent_initial_call=True,
+)
+def download_table(n, rows):
+    if not rows:
+        raise PreventUpdate
+    df = pd.DataFrame(rows).drop(columns=["rownum"], errors="ignore")
+    return dcc.send_data_frame(df.to_csv, "flight_table.csv", index=False)
+
+
+@callback(
+    Output("conflict-table", "data"),
+    Output("map-fig", "figure", allow_duplicate=True),
+    Output("conflict-status", "children"),
+    Output("right-tabs", "active_tab"),
+    Input("btn-conflicts", "n_clicks"),
+    State("store-flights", "data"),
+    State("sep-nm", "value"),
+    State("sep-ft", "value"),
+    State("store-map-traces", "data"),
+    prevent_initial_call=True,
+)
+def find_conflicts(n, flights, sep_nm, sep_ft, traces):
+    if not flights:
+        return [], no_update, "Load trajectories first", no_update
+    t0 = time.perf_counter()
+    df = detect_conflicts(flights, float(sep_nm or CONFLICT_H_NM), float(sep_ft or CONFLICT_V_FT))
+    rows = [{
+        "rownum": i,
+        "FlightA": int(r.FlightA), "FlightB": int(r.FlightB),
+        "CallsignA": r.CallsignA or f"FID {r.FlightA}", "CallsignB": r.CallsignB or f"FID {r.FlightB}",
+        "ClosestTime": f"{r.ClosestTime:%Y-%m-%d %H:%M:%S}",
+        "MinDistNm": float(r.MinDistNm), "VertFt": int(r.VertFt), "DurationS": int(r.DurationS),
+    } for i, r in enumerate(df.itertuples(index=False), start=1)]
+
+    # Closest-approach markers, replacing an earlier Conflicts layer in place
+    lat, lon = df["Lat"].tolist(), df["Lon"].tolist()
+    text = [f"<b>{a['CallsignA']} / {a['CallsignB']}</b><br>{a['MinDistNm']} NM, {a['VertFt']} ft<br>{a['ClosestTime']}Z"
+            for a in rows]
+    fig = Patch()
+    idx = next((i for i, (name, _n) in enumerate(traces or []) if name == "Conflicts"), None)
+    if idx is None:
+        fig["data"].append(go.Scattermapbox(
+            lat=lat, lon=lon, mode="markers", name="Conflicts",
+            marker=dict(size=11, color="#FF9F0A"), hoverinfo="text", hovertext=text, showlegend=False,
+        ).to_plotly_json())
+    else:
+        fig["data"][idx]["lat"], fig["data"][idx]["lon"], fig["data"][idx]["hovertext"] = lat, lon, text
+    status = (f"{len(rows)} pairs within {sep_nm} NM / {sep_ft} ft "
+              f"({time.perf_counter() - t0:.2f}s over {len(flights)} trajectories)")
+    return rows, fig, status, "conflicts"
+
+
+@callback(
+    Output("conflict-table", "data", allow_duplicate=True),
+    Output("conflict-status", "children", allow_duplicate=True),
+    Input("store-flights-rev", "data"),
+    prevent_initial_call=True,
+)
+def clear_conflicts(_rev):
+    # New data: earlier results no longer apply (update_map drops the layer)
+    return [], ""
+
+
+@callback(
+    Output("store-flows-rev", "data"),
+    Input("right-tabs", "active_tab"),
+    Input("store-flights-rev", "data"),
+    State("store-flows-rev", "data"),
+    prevent_initial_call=True,
+)
+def request_flows(tab, rev, requested):
+    # Only while the Flows tab is open, once per fetched result; store-flights
+    # is uploaded by compute_flows alone, once this has decided to run it
+    if tab != "flows" or (requested and requested.get("rev") == rev):
+        raise PreventUpdate
+    return {"rev": rev}
+
+
+@callback(
+    Output("store-flows", "data"),
+    Output("flow-interval", "options"),
+    Output("flow-status", "children"),
+    Input("store-flows-rev", "data"),
+    State("store-flights", "data"),
+    State("start-utc", "value"),
+    State("end-utc", "value"),
+    State("data-source", "value"),
+    State("area-type", "value"),
+    State("sector-id", "value"),
+    prevent_initial_call=True,
+)
+def compute_flows(requested, flights, start_utc, end_utc, data_source="", area_type="sector", sector_id=None):
+    rev = (requested or {}).get("rev")
+    if not flights:
+        return {"rev": rev, "rows": []}, [], "Load trajectories first"
+    t0 = time.perf_counter()
+    start = datetime.fromisoformat(start_utc.replace("Z", ""))
+    end = datetime.fromisoformat(end_utc.replace("Z", ""))
+    df = flow_matrix(flights, source_for(data_source).list_sectors(), start, end)
+    rows = [{
+        "IntervalStart": f"{r.IntervalStart:%Y-%m-%d %H:%M}", "FromId": int(r.FromId), "From": r.From,
+        "ToId": int(r.ToId), "To": r.To, "Flights": int(r.Flights),
+    } for r in df.itertuples(index=False)]
+    intervals = sorted({r["IntervalStart"] for r in rows})
+    sectors = {r["FromId"] for r in rows} | {r["ToId"] for r in rows}
+    status = (f"{sum(r['Flights'] for r in rows)} handovers across {len(sectors)} sectors "
+              f"({time.perf_counter() - t0:.2f}s over {len(flights)} trajectories)")
+    sector = int(sector_id) if area_type == "sector" and sector_id else None
+    return {"rev": rev, "sector": sector, "rows": rows}, intervals, status
+
+
+@callback(
+    Output("flow-fig", "figure"),
+    Input("store-flows", "data"),
+    Input("flow-view", "value"),
+    Input("flow-interval", "value"),
+    Input("flow-focus", "value"),
+)
+def render_flows(flows, view, interval, focus):
+    """Sankey (origins left, destinations right) or From x To heatmap of the stored flows."""
+    fig = go.Figure()
+    fig.update_layout(margin=dict(l=0, r=0, t=10, b=0), template="plotly_dark",
+                      hoverlabel=dict(bgcolor="#0b0f17", font_color="#e5e7eb"))
+    rows = (flows or {}).get("rows") or []
+    sector = (flows or {}).get("sector")
+    if interval:
+        rows = [r for r in rows if r["IntervalStart"] == interval]
+    if focus and sector is not None:
+        rows = [r for r in rows if sector in (r["FromId"], r["ToId"])]
+    if not rows:
+        return fig
+    # Over several intervals a flight counts once per interval it hands over in
+    pairs = pd.DataFrame(rows).groupby(["From", "To"], sort=False)["Flights"].sum().sort_values(ascending=False)
+    if view == "heatmap":
+        z = pairs.unstack(fill_value=0)
+        fig.add_trace(go.Heatmap(
+            z=z.to_numpy(), x=list(z.columns), y=list(z.index), colorscale="Blues",
+            hovertemplate="%{y} → %{x}: %{z} flights<extra></extra>", colorbar=dict(thickness=10),
+        ))
+        fig.update_layout(xaxis_title="To", yaxis_title="From", yaxis_autorange="reversed")
+        return fig
+    origins = list(dict.fromkeys(pairs.index.get_level_values(0)))
+    targets = list(dict.fromkeys(pairs.index.get_level_values(1)))
+    fig.add_trace(go.Sankey(
+        node=dict(label=origins + targets, pad=8, thickness=12, color="#00D1FF", line=dict(width=0)),
+        link=dict(source=[origins.index(a) for a, _b in pairs.index],
+                  target=[len(origins) + targets.index(b) for _a, b in pairs.index],
+                  value=pairs.tolist(), color="rgba(0,209,255,0.25)",
+                  hovertemplate="%{source.label} → %{target.label}: %{value} flights<extra></extra>"),
+    ))
+    return fig
+
+
+# Opening a snapshot restores the sector and window it was exported with
+@callback(
+    Output("sector-id", "value"),
+    Output("start-utc", "value"),
+    Output("end-utc", "value"),
+    Input("data-source", "value"),
+    prevent_initial_call=True,
+)
+def open_snapshot_window(key):
+    if not key:
+        return no_update, no_update, no_update
+    meta = open_snapshot(key).manifest.get("meta", {})
+    return meta.get("sector_id", no_update), meta["start"] + "Z", meta["end"] + "Z"
+
+
+# =============================
+# Live mode: slide the window to "now" and merge deltas
+# =============================
+# Trace names and lengths stay in the browser so live_refresh can patch the
+# Flights layer by index without uploading the whole figure. Typed arrays
+# ({dtype, bdata}) are measured from their base64 size.
+dash.clientside_callback(
+    """
+    function(fig) {
+        var size = {i1: 1, u1: 1, u1c: 1, i2: 2, u2: 2, i4: 4, u4: 4, f4: 4, f8: 8};
+        return ((fig && fig.data) || []).map(function(t) {
+            var a = t.lat || [];
+            if (a.bdata === undefined) { return [t.name || null, a.length]; }
+            var b = a.bdata, pad = b.endsWith("==") ? 2 : b.endsWith("=") ? 1 : 0;
+            return [t.name || null, (b.length * 3 / 4 - pad) / size[a.dtype]];
+        });
+    }
+    """,
+    Output("store-map-traces", "data"),
+    Input("map-fig", "figure"),
+)
+
+# Flights tooltip: customdata is the vertex's index into meta.flights (plus
+# FL and speed for small selections), or the label itself in live mode.
+dash.clientside_callback(
+    """
+    function(hover, fig) {
+        var hide = [false, window.dash_clientside.no_update, window.dash_clientside.no_update];
+        var p = hover && hover.points && hover.points[0];
+        var t = p && fig && fig.data && fig.data[p.curveNumber];
+        if (!t || t.name !== "Flights" || !t.customdata || !p.bbox) { return hide; }
+        var cd = t.customdata, row = [cd[p.pointNumber]];
+        if (cd.bdata !== undefined) {
+            var cache = window.atfasTyped = window.atfasTyped || new WeakMap();
+            if (!cache.has(cd)) {
+                var types = {i1: Int8Array, u1: Uint8Array, i2: Int16Array, u2: Uint16Array,
+                             i4: Int32Array, u4: Uint32Array, f4: Float32Array, f8: Float64Array};
+                var raw = Uint8Array.from(atob(cd.bdata), function(c) { return c.charCodeAt(0); });
+                cache.set(cd, new types[cd.dtype](raw.buffer));
+            }
+            var cols = cd.shape ? +String(cd.shape).split(",")[1] : 1;
+            row = Array.from(cache.get(cd).subarray(p.pointNumber * cols, (p.pointNumber + 1) * cols));
+        }
+        var flights = (t.meta && t.meta.flights) || null;
+        var label = flights ? flights[row[0]] : row[0];
+        if (label === undefined || label === null || label === -1) { return hide; }
+        var lines = [label];
+        if (row.length > 2 && !isNaN(row[1])) { lines.push("FL" + row[1] + (isNaN(row[2]) ? "" : " — " + row[2] + " kt")); }
+        return [true, p.bbox, lines.join("\\n")];
+    }
+    """,
+    Output("map-tooltip", "show"),
+    Output("map-tooltip", "bbox"),
+    Output("map-tooltip", "children"),
+    Input("map-fig", "hoverData"),
+    State("map-fig", "figure"),
+)
+
+
+@callback(
+    Output("live-timer", "disabled"),
+    Input("live-mode", "value"),
+)
+def toggle_live(live_on):
+    return not live_on
+
+
+def _layers(window, decim):
+    """Fill in the client-side layout of the Flights trace and samples on first use."""
+    if window.paths is None or window.paths_decim != int(decim or 1):
+        # Same rows and budget as update_map's last draw, hence the same cutoff
+        groups = group_flights(list(window.rows.values()))
+        keep, window.paths_cutoff = simplified_paths(groups, decim)
+        sizes = ((fid, len(flight_path(fid, d, keep[fid])[0])) for fid, d in groups.items())
+        window.paths = Segments((fid, n) for fid, n in sizes if n)
+        window.paths_decim = int(decim or 1)
+    if window.series is None:
+        window.series = Segments((fid, 1) for fid in group_flights(list(window.rows.values()), points=False))
+
+
+@callback(
+    Output("store-flights", "data", allow_duplicate=True),
+    Output("store-live", "data", allow_duplicate=True),
+    Output("start-utc", "value", allow_duplicate=True),
+    Output("end-utc", "value", allow_duplicate=True),
+    Output("map-fig", "figure", allow_duplicate=True),
+    Output("store-interval-bins", "data", allow_duplicate=True),
+    Output("store-sampled", "data", allow_duplicate=True),
+    Output("status-text", "children", allow_duplicate=True),
+    Input("live-timer", "n_intervals"),
+    State("store-live", "data"),
+    State("trace-decimation", "value"),
+    State("store-map-traces", "data"),
+    prevent_initial_call=True,
+)
+def live_refresh(_, live, decim, traces):
+    if not live or not live.get("key"):
+        raise PreventUpdate
+    now = datetime.utcnow().replace(microsecond=0)
+    window = load_window(live["key"])
+    half = (window.width if window else timedelta(hours=12)) / 2
+    start, end = now - half, now + half
+    start_utc, end_utc = start.isoformat() + "Z", end.isoformat() + "Z"
+    if window is None or not (window.start <= start < window.end):
+        # State expired or the window jumped (e.g. a historical window): reload in full
+        return (no_update, {"key": None, "start": start_utc, "end": end_utc}, start_utc, end_utc,
+                no_update, no_update, no_update, no_update)
+
+    _layers(window, decim)
+    evicted = window.expired(start)
+    since = datetime.fromisoformat(window.hwm) if window.hwm else start
+    delta = source_for(window.data_source).trajectories_since(
+        window.sector_id, start, end, since, fl_range=window.fl_range, max_rows=MAX_TRAJ, tol_deg=SIMPLIFY_TOL_DEG,
+    )
+    records = flight_records(delta)
+    marks = [pd.Timestamp(m).isoformat() for m in delta["LiveMark"] if pd.notna(m)]
+    changed = window.fids(evicted)
+
+    flights_patch = Patch()
+    added, updated = window.apply(flights_patch, evicted, records, marks)
+    changed |= window.fids(added + updated)
+    window.start, window.end = start, end
+    groups = group_flights([r for rows in window.by_fid(changed).values() for r in rows])
+
+    # Map: only when the Flights trace still matches what we last drew
+    map_patch = no_update
+    idx = next((i for i, (name, _n) in enumerate(traces or []) if name == "Flights"), None)
+    drawn = idx is not None and traces[idx][1] == window.paths.total
+    if drawn:
+        map_patch = Patch()
+        trace = map_patch["data"][idx]
+    window.paths.remove(changed, *((trace["lat"], trace["lon"], trace["customdata"]) if drawn else ()))
+    for fid, d in groups.items():
+        lats, lons, texts = flight_path(fid, d, simplify_path(d["points"], window.paths_cutoff))
+        if lats:
+            window.paths.add(fid, len(lats))
+            if drawn:
+                trace["lat"].extend(lats); trace["lon"].extend(lons); trace["customdata"].extend(texts)
+    if not changed:
+        map_patch = no_update
+
+    # Demand bins: patch in place unless the 20-minute anchor moved
+    anchor = floor_to_20(start)
+    if window.bins is not None and window.bins_anchor == anchor:
+        bins_out = Patch() if changed else no_update
+        window.bins.remove(changed, *((bins_out,) if changed else ()))
+        entries = [(fid, bin_entry(fid, d, anchor)) for fid, d in groups.items()]
+    else:
+        window.bins, window.bins_anchor, bins_out = Segments(), anchor, []
+        entries = [(fid, bin_entry(fid, d, anchor))
+                   for fid, d in group_flights(list(window.rows.values()), points=False).items()]
+    for fid, entry in entries:
+        if entry:
+            window.bins.add(fid)
+            bins_out.append(entry)
+
+    # Animation samples
+    sampled = Patch()
+    sampled["t0"], sampled["t1"] = start_utc, end_utc
+    window.series.remove(changed, sampled["series"])
+    for fid, rows in window.by_fid(groups).items():
+        window.series.add(fid)
+        sampled["series"].append(sample_series(fid, rows))
+
+    save_window(window)
+    status = (f"Live {now:%H:%M:%S}Z: +{len(added)} new, {len(updated)} updated, -{len(evicted)} expired"
+              f" | {len(window.rows)} trajectories")
+    return (flights_patch if changed else no_update, {"key": window.key, "start": start_utc, "end": end_utc}, start_utc, end_utc,
+            map_patch, bins_out, sampled, status)
+
+
+@callback(
+    Output("sector-picker", "style"),
+    Output("place-picker", "style"),
+    Output("place-label", "children"),
+    Output("place-id", "options"),
+    Output("place-id", "value"),
+    Output("area-radius", "value"),
+    Input("area-type", "value"),
+)
+def select_area_type(area_type):
+    if area_type not in PLACE_KINDS:
+        return {}, {"display": "none"}, no_update, no_update, no_update, no_update
+    options = place_catalog().options(area_type)
+    radius = AIRPORT_RADIUS_NM if area_type == "airport" else WAYPOINT_RADIUS_NM
+    return ({"display": "none"}, {}, area_type.capitalize(), options,
+            options[0]["value"] if options else None, radius)
+
+
+@callback(
     Output("settings", "is_open"),
     Input("open-settings", "n_clicks"),
     State("settings", "is_open"),
@@ -1028,7 +1928,7 @@ def toggle_settings(n, is_open):
         return not is_open
     return is_open
 
-@app.callback(
+@callback(
     Output("fl-controls", "style"),
     Input("apply-fl", "value"),
 )
@@ -1038,10 +1938,51 @@ def toggle_fl_controls(val):
     return {"opacity": 0.5}
 
 # =============================
-# 7) MAIN
+# 7) APP FACTORY
+# =============================
+def create_app() -> Dash:
+    """Build the Dash app: server hooks, REST API and the lazily served layout.
+
+    The callbacks above are module-level and attach to the first app set up
+    in the process, so build one app per process; ``app.app`` is that app.
+    """
+    since = time.perf_counter()
+    app = dash.Dash(__name__, external_stylesheets=[THEME], suppress_callback_exceptions=True)
+    app.title = "ATFAS Trajectory & Demand"
+    instrument_app(app)
+    register_startup_route(app.server)
+    if MEMORY_ROUTE_ENABLED:
+        register_memory_route(app.server)
+    if MEMORY_TRACEMALLOC:
+        start_tracing()
+
+    from utils.api import API_ENABLED, register_api
+    if API_ENABLED:
+        register_api(app)
+    # Historical demand cube: started in the serving process, never here (with
+    # preload_app this runs in the gunicorn master, whose threads do not fork)
+    app.server.before_request(start_filler)
+    app.layout = serve_layout
+    startup.mark("create_app", since)
+    startup.mark("ready")
+    startup.log()
+    return app
+
+
+def __getattr__(name):
+    # ``from app import app`` builds the app on first use
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# =============================
+# 8) MAIN
 # =============================
 if __name__ == "__main__":
     host = os.getenv("DASH_HOST", "0.0.0.0")
     port = int(os.getenv("DASH_PORT", "8050"))
     debug = os.getenv("DASH_DEBUG", "True").lower() == "true"
+    app = create_app()
     app.run(host=host, port=port, debug=debug)
@@ -0,0 +1,7 @@
+"""Reproducible performance benchmarks for the Dash application.
+
+The package builds a synthetic airspace (``StaticAirspace`` sectors plus
+``Flight``/``FlightTrajectory`` rows), serves it through a local stand-in
+installed behind :func:`utils.db.sql_query` and times the app callbacks at
+configurable scales. Run it with ``python -m bench --help``.
+"""
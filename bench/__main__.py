@@ -0,0 +1,54 @@
+"""Command-line entry point: ``python -m bench``."""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+from datetime import datetime
+from pathlib import Path
+
+from bench.run import compare, format_table, run
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench", description=__doc__)
+    parser.add_argument("--scales", type=int, nargs="+", default=[1_000, 10_000, 100_000],
+                        help="number of trajectories in the synthetic database")
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per callback")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-traj", type=int, default=None,
+                        help="override MAX_TRAJ (defaults to the largest scale)")
+    parser.add_argument("--backend", choices=["mssql", "columnar"], default="mssql",
+                        help="serve data through the SQL stand-in or the columnar file backend")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--out", type=Path, default=None,
+                        help="result file (default: bench/results/<timestamp>.json)")
+    parser.add_argument("--baseline", type=Path, default=None,
+                        help="earlier result file to compare median latencies against")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="flag callbacks slower than baseline by this factor")
+    args = parser.parse_args(argv)
+
+    report = run(args.scales, repeat=args.repeat, trace_memory=not args.no_memory,
+                 seed=args.seed, max_traj=args.max_traj, backend=args.backend)
+    out = args.out or RESULTS_DIR / f"{datetime.now().strftime('%Y%m%dT%H%M%S')}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2))
+    print(format_table(report))
+    print(f"\nResults written to {out}")
+
+    if args.baseline:
+        problems = compare(report, json.loads(args.baseline.read_text()), args.threshold)
+        if problems:
+            print(f"\nRegressions vs {args.baseline} (>{args.threshold:.2f}x):")
+            print("\n".join(problems))
+            return 1
+        print(f"\nNo regressions vs {args.baseline}.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
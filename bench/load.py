@@ -0,0 +1,457 @@
+"""Concurrent-user load test of the Dash callbacks: ``python -m bench.load``.
+
+Every virtual user loads the layout and then replays a browser session over
+``/_dash-update-component``: choose a sector and window, widen the window,
+play the timeline, click the busiest demand bar and select a flight from the
+table. A small renderer follows the dependency graph from
+``/_dash-dependencies`` like the browser does: a changed property fires every
+server-side callback listening to it (each round in parallel), responses
+(including ``Patch`` updates) are merged into the session's component state,
+and the chain continues until it settles. Clientside callbacks are skipped.
+
+``--local N`` serves the app in-process (threaded werkzeug server) over a
+synthetic database of ``N`` trajectories answered by
+:class:`bench.standin.LocalDatabase`, optionally with ``--db-latency-ms`` per
+statement; without it ``--url`` points at a running server. The report has
+throughput and p50/p95/p99 latency per callback; ``--scenario fetch`` only
+replays ``fetch_data`` (the previous behaviour of this tool).
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from bench.synthetic import REFERENCE_END, REFERENCE_START
+
+SESSION_ROUND_WORKERS = 4  # requests a browser tab has in flight at once
+
+
+def percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+# =============================
+# Dash protocol
+# =============================
+def _split_outputs(output: str) -> list[tuple[str, str]]:
+    """``"..a.b...c.d@h.."`` / ``"a.b"`` -> ``[("a", "b"), ("c", "d@h")]``."""
+    parts = output[2:-2].split("...") if output.startswith("..") else [output]
+    return [tuple(p.split(".", 1)) for p in parts]
+
+
+def _clean(prop: str) -> str:
+    return prop.split("@")[0]
+
+
+def apply_patch(doc, operations: list[dict]):
+    """Apply ``dash.Patch`` operations to ``doc`` the way the renderer does."""
+    for op in operations:
+        location, name, params = op["location"], op["operation"], op.get("params", {})
+        if not location:
+            parent, key = None, None
+            target = doc
+        else:
+            parent = doc
+            for k in location[:-1]:
+                parent = parent[k]
+            key = location[-1]
+            target = parent[key] if isinstance(parent, dict) and key in parent or isinstance(parent, list) else None
+        value = params.get("value")
+        if name == "Assign":
+            if parent is None:
+                doc = value
+            else:
+                parent[key] = value
+        elif name == "Delete":
+            del parent[key]
+        elif name == "Merge":
+            target.update(value)
+        elif name == "Extend":
+            target.extend(value)
+        elif name == "Append":
+            target.append(value)
+        elif name == "Prepend":
+            target.insert(0, value)
+        elif name == "Insert":
+            target.insert(params["index"], value)
+        elif name == "Remove":
+            target[:] = [v for v in target if v != value]
+        elif name == "Clear":
+            target.clear()
+        elif name == "Reverse":
+            target.reverse()
+        elif name in ("Add", "Sub", "Mul", "Div"):
+            fn = {"Add": lambda a, b: a + b, "Sub": lambda a, b: a - b,
+                  "Mul": lambda a, b: a * b, "Div": lambda a, b: a / b}[name]
+            parent[key] = fn(target, value)
+        else:
+            raise ValueError(f"unsupported patch operation {name}")
+    return doc
+
+
+def layout_props(node, out: dict | None = None) -> dict:
+    """``{(id, prop): value}`` for every component with a string id in a layout tree."""
+    out = {} if out is None else out
+    if isinstance(node, list):
+        for child in node:
+            layout_props(child, out)
+    elif isinstance(node, dict):
+        props = node.get("props") if "namespace" in node else None
+        if props is not None:
+            cid = props.get("id")
+            if isinstance(cid, str):
+                for prop, value in props.items():
+                    out[(cid, prop)] = value
+            for value in props.values():
+                layout_props(value, out)
+    return out
+
+
+class Client:
+    """JSON over HTTP with per-callback timings."""
+
+    def __init__(self, url: str, stats: "Stats"):
+        self.url = url.rstrip("/")
+        self.stats = stats
+
+    def get(self, path: str):
+        with urllib.request.urlopen(self.url + path, timeout=300) as resp:
+            return json.loads(resp.read())
+
+    def post(self, name: str, body: dict) -> dict | None:
+        data = json.dumps(body).encode("utf-8")
+        req = urllib.request.Request(self.url + "/_dash-update-component", data=data,
+                                     headers={"Content-Type": "application/json"})
+        t0 = time.perf_counter()
+        try:
+            with urllib.request.urlopen(req, timeout=300) as resp:
+                raw = resp.read()
+                status = resp.status
+        except Exception:
+            self.stats.record(name, time.perf_counter() - t0, 0, ok=False)
+            return None
+        self.stats.record(name, time.perf_counter() - t0, len(data) + len(raw))
+        return json.loads(raw) if status == 200 and raw else {}  # 204: PreventUpdate
+
+
+class Stats:
+    """Latencies, errors and bytes per callback, shared by all users."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latency: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self.bytes: dict[str, int] = {}
+
+    def record(self, name: str, seconds: float, n_bytes: int, ok: bool = True) -> None:
+        with self._lock:
+            if ok:
+                self.latency.setdefault(name, []).append(seconds)
+                self.bytes[name] = self.bytes.get(name, 0) + n_bytes
+            else:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self, wall: float) -> dict:
+        out = {}
+        for name in sorted(set(self.latency) | set(self.errors)):
+            lat = self.latency.get(name, [])
+            out[name] = {
+                "requests": len(lat),
+                "errors": self.errors.get(name, 0),
+                "rps": round(len(lat) / wall, 2) if wall else 0.0,
+                "p50_ms": round(percentile(lat, 50) * 1000, 1) if lat else None,
+                "p95_ms": round(percentile(lat, 95) * 1000, 1) if lat else None,
+                "p99_ms": round(percentile(lat, 99) * 1000, 1) if lat else None,
+                "mean_ms": round(statistics.fmean(lat) * 1000, 1) if lat else None,
+                "kib_per_request": round(self.bytes.get(name, 0) / len(lat) / 1024, 1) if lat else None,
+            }
+        return out
+
+
+class Session:
+    """One browser tab: component state plus the callback chain that follows a change."""
+
+    def __init__(self, client: Client, deps: list[dict], names: dict[str, str], props: dict):
+        self.client = client
+        self.props = props
+        self.names = names
+        self.callbacks = [d for d in deps if not d.get("clientside_function")]
+        self._lock = threading.Lock()
+
+    def _body(self, dep: dict, changed: set) -> dict:
+        outputs = [{"id": i, "property": p} for i, p in _split_outputs(dep["output"])]
+        with self._lock:
+            def spec(items):
+                return [{"id": x["id"], "property": x["property"],
+                         "value": self.props.get((x["id"], x["property"]))} for x in items]
+            inputs, state = spec(dep["inputs"]), spec(dep["state"])
+        return {
+            "output": dep["output"],
+            "outputs": outputs if dep["output"].startswith("..") else outputs[0],
+            "inputs": inputs,
+            "state": state,
+            "changedPropIds": [f"{i}.{p}" for i, p in changed],
+        }
+
+    def _call(self, dep: dict, changed: set) -> set:
+        name = self.names.get(dep["output"], dep["output"])
+        out = self.client.post(name, self._body(dep, changed))
+        updated = set()
+        for cid, props in ((out or {}).get("response") or {}).items():
+            for prop, value in props.items():
+                with self._lock:
+                    if isinstance(value, dict) and "__dash_patch_update" in value:
+                        value = apply_patch(copy.deepcopy(self.props.get((cid, prop))), value["operations"])
+                    self.props[(cid, prop)] = value
+                updated.add((cid, prop))
+        return updated
+
+    def set(self, pool: ThreadPoolExecutor, values: dict) -> None:
+        """Set ``{(id, prop): value}`` as user input and run the chain until it settles."""
+        self.props.update(values)
+        changed = set(values)
+        while changed:
+            fired = []
+            for dep in self.callbacks:
+                hit = {(x["id"], x["property"]) for x in dep["inputs"]} & changed
+                if hit:
+                    fired.append((dep, hit))
+            changed = set()
+            for updated in pool.map(lambda a: self._call(*a), fired):
+                changed |= updated
+
+
+# =============================
+# Scenarios
+# =============================
+def _options(props: dict, cid: str) -> list:
+    return [o["value"] if isinstance(o, dict) else o for o in props.get((cid, "options")) or []]
+
+
+def session_scenario(client: Client, deps: list[dict], names: dict, rng: random.Random, windows: list,
+                     sectors: list[int] | None, play_steps: int, think_s: float) -> None:
+    """Choose sector -> adjust window -> play timeline -> box-select map -> flows -> click bar -> select flight."""
+    s = Session(client, deps, names, layout_props(client.get("/_dash-layout")))
+    with ThreadPoolExecutor(SESSION_ROUND_WORKERS) as pool:
+        start, end = rng.choice(windows)
+        sector = rng.choice(sectors or _options(s.props, "sector-id"))
+        s.set(pool, {("sector-id", "value"): sector, ("start-utc", "value"): start, ("end-utc", "value"): end})
+        time.sleep(think_s)
+
+        wider = (datetime.fromisoformat(end.rstrip("Z")) + timedelta(hours=1)).isoformat() + "Z"
+        s.set(pool, {("end-utc", "value"): wider})
+        time.sleep(think_s)
+
+        lo, hi = s.props.get(("time-slider", "min")), s.props.get(("time-slider", "max"))
+        if lo is not None and hi is not None:
+            for k in range(play_steps):
+                s.set(pool, {("time-slider", "value"): lo + (hi - lo) * (k + 1) // (play_steps + 1)})
+        time.sleep(think_s)
+
+        center = (((s.props.get(("map-fig", "figure")) or {}).get("layout") or {}).get("mapbox") or {}).get("center")
+        if center:
+            lon, lat = center["lon"], center["lat"]
+            box = {"points": [], "range": {"mapbox": [[lon - 0.5, lat + 0.5], [lon + 0.5, lat - 0.5]]}}
+            s.set(pool, {("map-fig", "selectedData"): box})
+            time.sleep(think_s)
+
+        s.set(pool, {("right-tabs", "active_tab"): "flows"})
+        time.sleep(think_s)
+
+        counts: dict[int, int] = {}
+        for b in s.props.get(("store-interval-bins", "data")) or []:
+            counts[b["bin"]] = counts.get(b["bin"], 0) + 1
+        if counts:
+            busiest = max(counts, key=counts.get)
+            click = {"points": [{"curveNumber": 0, "pointIndex": busiest, "pointNumber": busiest}]}
+            s.set(pool, {("demand-bar", "clickData"): click})
+            time.sleep(think_s)
+            rows = s.props.get(("flight-table", "data")) or []
+            if rows:
+                row = rng.randrange(len(rows))
+                cell = {"row": row, "column": 1, "column_id": "Callsign"}
+                s.set(pool, {("flight-table", "active_cell"): cell})
+
+
+def fetch_scenario(client: Client, deps: list[dict], names: dict, rng: random.Random, windows: list,
+                   sectors: list[int] | None, play_steps: int, think_s: float) -> None:
+    """``fetch_data`` alone, without the callbacks that follow it."""
+    dep = next(d for d in deps if d["output"].startswith("..store-flights.data..."))
+    s = Session(client, [dep], names, layout_props(client.get("/_dash-layout")))
+    start, end = rng.choice(windows)
+    sector = rng.choice(sectors or _options(s.props, "sector-id"))
+    with ThreadPoolExecutor(1) as pool:
+        s.set(pool, {("sector-id", "value"): sector, ("start-utc", "value"): start, ("end-utc", "value"): end})
+
+
+SCENARIOS = {"session": session_scenario, "fetch": fetch_scenario}
+
+
+def callback_names(app=None) -> dict[str, str]:
+    """Dependency output key -> callback function name (from the app's registry)."""
+    import dash._callback as registry
+
+    import app as app_module
+
+    cmap = dict(registry.GLOBAL_CALLBACK_MAP)
+    app = app or app_module.__dict__.get("app")
+    if app is not None:
+        cmap.update(app.callback_map)
+    return {key: cb["callback"].__name__ for key, cb in cmap.items() if "callback" in cb}
+
+
+def run(url: str, users: int, sessions: int, scenario: str = "session", sectors: list[int] | None = None,
+        windows: int = 4, hours: int = 2, play_steps: int = 5, think_s: float = 0.0, seed: int = 0,
+        names: dict[str, str] | None = None) -> dict:
+    """Replay ``sessions`` sessions from ``users`` concurrent users; returns the report."""
+    pool = []
+    for k in range(windows):
+        start = REFERENCE_START + timedelta(hours=k)
+        pool.append((start.isoformat() + "Z", (start + timedelta(hours=hours)).isoformat() + "Z"))
+    stats = Stats()
+    client = Client(url, stats)
+    deps = client.get("/_dash-dependencies")
+    names = names if names is not None else callback_names()
+    todo = list(range(sessions))
+    failed = 0
+    lock = threading.Lock()
+
+    def user(i):
+        nonlocal failed
+        rng = random.Random(seed * 1000 + i)
+        while True:
+            with lock:
+                if not todo:
+                    return
+                todo.pop()
+            try:
+                SCENARIOS[scenario](client, deps, names, rng, pool, sectors, play_steps, think_s)
+            except Exception:
+                with lock:
+                    failed += 1
+
+    t0 = time.perf_counter()
+    threads = [threading.Thread(target=user, args=(i,)) for i in range(users)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall = time.perf_counter() - t0
+    callbacks = stats.report(wall)
+    total = sum(c["requests"] for c in callbacks.values())
+    return {
+        "url": url,
+        "scenario": scenario,
+        "users": users,
+        "sessions": sessions,
+        "failed_sessions": failed,
+        "wall_s": round(wall, 3),
+        "requests": total,
+        "errors": sum(c["errors"] for c in callbacks.values()),
+        "rps": round(total / wall, 2) if wall else 0.0,
+        "sessions_per_min": round(sessions / wall * 60, 1) if wall else 0.0,
+        "callbacks": callbacks,
+    }
+
+
+# =============================
+# Local server over the stand-in database
+# =============================
+def serve_local(n_traj: int, db_latency_s: float = 0.0, seed: int = 0):
+    """Start the app on a free local port over synthetic data; returns ``(url, server, app)``."""
+    import logging
+
+    from werkzeug.serving import make_server
+
+    from bench.standin import LocalDatabase
+    from bench.synthetic import make_flights, make_sectors
+    from utils.db import set_query_handler
+
+    os.environ.setdefault("MAX_TRAJ", str(n_traj))
+    os.environ.setdefault("CACHE_PATH", os.path.join(tempfile.mkdtemp(prefix="atfas-load-"), "cache.sqlite"))
+    os.environ.setdefault("CUBE_FILL_INTERVAL_S", "0")
+    db = LocalDatabase(make_sectors(), make_flights(n_traj, REFERENCE_START - timedelta(hours=2),
+                                                    REFERENCE_END + timedelta(hours=2), seed=seed))
+    if db_latency_s > 0:
+        def handler(query, params=None):
+            time.sleep(db_latency_s)
+            return db(query, params)
+        set_query_handler(handler)
+    else:
+        set_query_handler(db)
+
+    from app import create_app
+
+    app = create_app()
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)  # no access log line per request
+    server = make_server("127.0.0.1", 0, app.server, threaded=True)
+    threading.Thread(target=server.serve_forever, name="load-server", daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", server, app
+
+
+def format_report(report: dict) -> str:
+    lines = [f"{'callback':<26} {'requests':>8} {'err':>4} {'rps':>7} {'p50 ms':>8} {'p95 ms':>8} "
+             f"{'p99 ms':>8} {'KiB/req':>8}"]
+    for name, c in report["callbacks"].items():
+        lines.append(f"{name[:26]:<26} {c['requests']:>8} {c['errors']:>4} {c['rps']:>7.2f} "
+                     f"{c['p50_ms'] or 0:>8.1f} {c['p95_ms'] or 0:>8.1f} {c['p99_ms'] or 0:>8.1f} "
+                     f"{c['kib_per_request'] or 0:>8.1f}")
+    lines.append(f"\n{report['users']} users, {report['sessions']} sessions ({report['failed_sessions']} failed) "
+                 f"in {report['wall_s']:.1f}s | {report['requests']} requests, {report['rps']:.1f} req/s, "
+                 f"{report['sessions_per_min']:.1f} sessions/min")
+    return "\n".join(lines)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m bench.load", description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8050", help="running server (ignored with --local)")
+    parser.add_argument("--local", type=int, default=0, metavar="N",
+                        help="serve the app in-process over N synthetic trajectories")
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="added per stand-in statement (--local)")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="session")
+    parser.add_argument("--users", "--concurrency", type=int, default=8, dest="users",
+                        help="concurrent virtual users")
+    parser.add_argument("--sessions", type=int, default=40, help="sessions replayed in total")
+    parser.add_argument("--sectors", type=int, nargs="+", default=None,
+                        help="sector ids to pick from (default: the layout's options)")
+    parser.add_argument("--windows", type=int, default=4, help="distinct start hours in the pool")
+    parser.add_argument("--hours", type=int, default=2, help="window length")
+    parser.add_argument("--play-steps", type=int, default=5, help="timeline positions played per session")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="pause between session steps")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="also write the JSON report here")
+    args = parser.parse_args(argv)
+
+    url, server, names = args.url, None, None
+    if args.local:
+        url, server, app = serve_local(args.local, args.db_latency_ms / 1e3, args.seed)
+        names = callback_names(app)
+    try:
+        report = run(url, args.users, args.sessions, args.scenario, args.sectors, args.windows, args.hours,
+                     args.play_steps, args.think_ms / 1e3, args.seed, names)
+    finally:
+        if server is not None:
+            server.shutdown()
+    print(format_report(report))
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if report["errors"] or report["failed_sessions"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,212 @@
+"""Time the app callbacks against the synthetic airspace.
+
+Each callback is fed the JSON round-tripped output of its upstream callback,
+as the browser would, so payload sizes and parsing costs are realistic.
+"""
+
+from __future__ import annotations
+
+import copy
+import importlib
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+from plotly.io.json import to_json_plotly
+
+from bench.standin import LocalDatabase
+from bench.synthetic import REFERENCE_END, REFERENCE_START, busiest_sector_id, make_flights, make_sectors
+from utils.columnar import ColumnarDataSource, write_columnar
+from utils.datasource import set_datasource
+from utils.db import set_query_handler
+
+CALLBACKS = (
+    "fetch_data",
+    "update_map",
+    "sample_points",
+    "move_heads",
+    "update_bar",
+    "table_from_bar_click",
+    "highlight_on_map",
+)
+
+
+def _raw(fn):
+    """Return the user function behind a Dash-registered callback."""
+    return getattr(fn, "__wrapped__", fn)
+
+
+def _roundtrip(value) -> tuple[object, int]:
+    """Serialise like Dash does and return ``(decoded, n_bytes)``."""
+    payload = to_json_plotly(value)
+    return json.loads(payload), len(payload.encode("utf-8"))
+
+
+class _Measure:
+    """Collects latency, peak memory and payload size per callback."""
+
+    def __init__(self, repeat: int, trace_memory: bool):
+        self.repeat = repeat
+        self.trace_memory = trace_memory
+        self.results: dict[str, dict] = {}
+
+    def __call__(self, name: str, fn, *args):
+        # Callbacks may mutate their State (e.g. the figure dict), so every run
+        # gets a fresh copy just like a new request would.
+        timings = []
+        out = None
+        for _ in range(self.repeat):
+            fresh = copy.deepcopy(args)
+            t0 = time.perf_counter()
+            out = fn(*fresh)
+            timings.append(time.perf_counter() - t0)
+        peak = None
+        if self.trace_memory:
+            fresh = copy.deepcopy(args)
+            tracemalloc.start()
+            fn(*fresh)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        decoded, n_bytes = _roundtrip(out)
+        self.results[name] = {
+            "latency_s": {
+                "min": min(timings),
+                "median": statistics.median(timings),
+                "mean": statistics.fmean(timings),
+                "max": max(timings),
+            },
+            "peak_mem_bytes": peak,
+            "payload_bytes": n_bytes,
+        }
+        return decoded
+
+
+def run_scale(app_module, db: LocalDatabase, n_traj: int, sector_id: int, repeat: int,
+              trace_memory: bool, seed: int, columnar_dir: str | None = None) -> dict:
+    """Benchmark every callback in :data:`CALLBACKS` for one data scale.
+
+    With ``columnar_dir`` the synthetic data is also written as a columnar
+    dataset there and served by :class:`ColumnarDataSource` instead of the
+    SQL stand-in.
+    """
+    t0 = time.perf_counter()
+    flights_df = make_flights(n_traj, seed=seed)
+    db.load(flights_df)
+    if columnar_dir:
+        eligible = flights_df[(flights_df["IsActive"] == 1) & (flights_df["IsCancelled"].fillna(0) == 0)]
+        write_columnar(columnar_dir, db.sectors, eligible)
+        set_datasource(ColumnarDataSource(columnar_dir))
+    build_s = time.perf_counter() - t0
+
+    start = REFERENCE_START.isoformat() + "Z"
+    end = REFERENCE_END.isoformat() + "Z"
+    m = _Measure(repeat, trace_memory)
+    cb = {name: _raw(getattr(app_module, name)) for name in CALLBACKS}
+
+    db.calls.clear()
+    flights, sector_fc, status, *_, bins = m("fetch_data", cb["fetch_data"], sector_id, start, end, [], [290, 410])
+    sql_s = [c[1] for c in db.calls if c[0] == "traj_by_sector"]
+    fig = m("update_map", cb["update_map"], flights, sector_fc, "lines", 8, "carto-darkmatter", 20, start)
+    sampled = m("sample_points", cb["sample_points"], flights, start, end)
+
+    t_mid = int((REFERENCE_START + (REFERENCE_END - REFERENCE_START) / 2).timestamp())
+    m("move_heads", cb["move_heads"], t_mid, fig, sampled)
+    m("update_bar", cb["update_bar"], bins, 20, start, end)
+
+    # Click the busiest bar, then select the first flight of that bin.
+    counts: dict[int, int] = {}
+    for b in bins or []:
+        counts[b["bin"]] = counts.get(b["bin"], 0) + 1
+    busiest = max(counts, key=counts.get) if counts else 0
+    click = {"points": [{"pointIndex": busiest}]}
+    rows, _styles = m("table_from_bar_click", cb["table_from_bar_click"], click, bins)
+    selected = rows[0]["FlightId"] if rows else None
+    m("highlight_on_map", cb["highlight_on_map"], selected, fig, flights, "lines", 8)
+
+    return {
+        "trajectories_in_db": n_traj,
+        "trajectories_loaded": len(flights or []),
+        "status": status,
+        "synthetic_build_s": build_s,
+        "sql_s_median": statistics.median(sql_s) if sql_s else None,
+        "callbacks": m.results,
+    }
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Return human-readable regressions where median latency grew past ``threshold``."""
+    problems = []
+    for scale, res in current["scales"].items():
+        base = baseline.get("scales", {}).get(scale)
+        if not base:
+            continue
+        for name, stats in res["callbacks"].items():
+            ref = base["callbacks"].get(name)
+            if not ref:
+                continue
+            now_s = stats["latency_s"]["median"]
+            ref_s = ref["latency_s"]["median"]
+            if ref_s > 0 and now_s / ref_s > threshold:
+                problems.append(f"{scale:>7} {name:<22} {ref_s * 1e3:9.1f} ms -> {now_s * 1e3:9.1f} ms "
+                                f"(x{now_s / ref_s:.2f})")
+    return problems
+
+
+def format_table(report: dict) -> str:
+    lines = [f"{'scale':>7} {'callback':<22} {'median ms':>10} {'peak MiB':>9} {'payload KiB':>12}"]
+    for scale, res in report["scales"].items():
+        for name, stats in res["callbacks"].items():
+            peak = stats["peak_mem_bytes"]
+            lines.append(
+                f"{scale:>7} {name:<22} {stats['latency_s']['median'] * 1e3:10.1f} "
+                f"{(peak / 2**20 if peak is not None else float('nan')):9.1f} "
+                f"{stats['payload_bytes'] / 1024:12.1f}"
+            )
+    return "\n".join(lines)
+
+
+def run(scales: list[int], repeat: int = 3, trace_memory: bool = True, seed: int = 0,
+        max_traj: int | None = None, backend: str = "mssql") -> dict:
+    """Run the suite for every scale and return the JSON-serialisable report.
+
+    ``backend`` is ``"mssql"`` (SQL statements answered by the stand-in) or
+    ``"columnar"`` (memory-mapped files via :mod:`utils.columnar`).
+    """
+    # The app reads MAX_TRAJ at import; default to "no cap below the largest scale".
+    os.environ["MAX_TRAJ"] = str(max_traj or max(scales))
+    # Every repeat must do the real work, not read the shared cache.
+    os.environ["CACHE_ENABLED"] = "False"
+    db = LocalDatabase(make_sectors())
+    previous = set_query_handler(db)
+    previous_source = set_datasource(None)
+    workdir = tempfile.TemporaryDirectory(prefix="atfas-bench-") if backend == "columnar" else None
+    try:
+        app_module = importlib.import_module("app")
+        sector_id = busiest_sector_id(db.sectors)
+        report = {
+            "created_utc": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "backend": backend,
+            "max_traj": int(os.environ["MAX_TRAJ"]),
+            "sector_id": sector_id,
+            "repeat": repeat,
+            "seed": seed,
+            "scales": {},
+        }
+        for n in scales:
+            columnar_dir = os.path.join(workdir.name, str(n)) if workdir else None
+            report["scales"][str(n)] = run_scale(app_module, db, n, sector_id, repeat, trace_memory,
+                                                 seed, columnar_dir)
+        return report
+    finally:
+        set_query_handler(previous)
+        set_datasource(previous_source)
+        if workdir:
+            workdir.cleanup()
@@ -0,0 +1,127 @@
+"""In-process stand-in for the ATFAS SQL Server.
+
+:class:`LocalDatabase` is installed with :func:`utils.db.set_query_handler`
+and answers the statements issued by ``app.py`` from synthetic frames, using
+shapely's ``STRtree`` in place of the SQL Server spatial index.
+"""
+
+from __future__ import annotations
+
+import time
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from utils.datasource import TRAJ_COLUMNS
+
+
+def _normalise(query: str) -> str:
+    return " ".join(query.split())
+
+
+class LocalDatabase:
+    """Callable ``(query, params) -> DataFrame`` backed by in-memory frames.
+
+    Every answered statement is appended to :attr:`calls` as
+    ``(kind, seconds, rows)`` so benchmarks can separate query time from
+    callback time.
+    """
+
+    def __init__(self, sectors: pd.DataFrame, flights: pd.DataFrame | None = None):
+        self.sectors = sectors.reset_index(drop=True)
+        self._sector_geoms = dict(zip(self.sectors["Id"].astype(int), shapely.from_wkt(self.sectors["WKT"])))
+        self.calls: list[tuple[str, float, int]] = []
+        self.load(flights if flights is not None else pd.DataFrame(columns=TRAJ_COLUMNS))
+
+    def load(self, flights: pd.DataFrame) -> None:
+        """Replace the trajectory table and rebuild the spatial index."""
+        self.flights = flights.reset_index(drop=True)
+        self._lines = shapely.from_wkt(self.flights["WKT"].to_numpy())
+        self._tree = shapely.STRtree(self._lines)
+        self._start = self.flights["StartTime"].to_numpy(dtype="datetime64[ns]")
+        self._end = self.flights["EndTime"].to_numpy(dtype="datetime64[ns]")
+        active = self.flights.get("IsActive", pd.Series(1, index=self.flights.index))
+        cancelled = self.flights.get("IsCancelled", pd.Series(0, index=self.flights.index))
+        self._eligible = (active.to_numpy() == 1) & (cancelled.fillna(0).to_numpy() == 0)
+
+        # Per-vertex altitudes for the STRING_SPLIT flight-level filter.
+        alts = [np.array(s.split(","), dtype=np.int64) if s else np.empty(0, np.int64)
+                for s in self.flights["AltitudeFt"].fillna("")]
+        self._alt_len = np.array([len(a) for a in alts], dtype=np.int64)
+        self._alt = np.concatenate(alts) if alts else np.empty(0, np.int64)
+        self._alt_off = np.concatenate([[0], np.cumsum(self._alt_len)])
+
+    def __call__(self, query: str, params: tuple | None = None) -> pd.DataFrame:
+        q = _normalise(query)
+        t0 = time.perf_counter()
+        if "FROM [FlightTrajectory]" in q and "@sinceUtc" in q:
+            kind, out = "traj_since", self._trajectories(*params)
+        elif "FROM [FlightTrajectory]" in q and "WHERE [Id] = @sectorId" in q:
+            kind, out = "traj_by_sector", self._trajectories(*params)
+        elif "FROM [FlightTrajectory]" in q and "ft.[FlightId] = ?" in q:
+            kind, out = "flight_detail", self._flight_detail(*params)
+        elif "FROM [FlightTrajectory]" in q and "@box" in q:
+            kind, out = "traj_in_box", self._window(*params)
+        elif "FROM [FlightTrajectory]" in q:
+            kind, out = "traj_in_window", self._window(*params)
+        elif "FROM [StaticAirspace]" in q and "WHERE [Id] = ?" in q:
+            kind, out = "sector_by_id", self._sector_by_id(*params)
+        elif "FROM [StaticAirspace]" in q:
+            kind, out = "sectors", self.sectors.copy()
+        else:
+            raise NotImplementedError(f"LocalDatabase cannot answer: {q[:80]}...")
+        self.calls.append((kind, time.perf_counter() - t0, len(out)))
+        return out
+
+    def _sector_by_id(self, sector_id) -> pd.DataFrame:
+        return self.sectors[self.sectors["Id"] == int(sector_id)].head(1).reset_index(drop=True)
+
+    def _flight_detail(self, flight_id) -> pd.DataFrame:
+        rows = self.flights[(self.flights["FlightId"] == int(flight_id)) & (self.flights["IsActive"] == 1)]
+        return rows.sort_values("StartTime", kind="stable")[TRAJ_COLUMNS].reset_index(drop=True)
+
+    def _window(self, start, end, box=None) -> pd.DataFrame:
+        start = np.datetime64(pd.Timestamp(start).to_datetime64(), "ns")
+        end = np.datetime64(pd.Timestamp(end).to_datetime64(), "ns")
+        keep = self._eligible & (self._start < end) & (self._end >= start)
+        if box is not None:
+            inside = np.zeros(len(keep), dtype=bool)
+            inside[self._tree.query(shapely.from_wkt(box), predicate="intersects")] = True
+            keep &= inside
+        idx = np.flatnonzero(keep)
+        idx = idx[np.argsort(self._start[idx], kind="stable")]
+        return self.flights.iloc[idx][TRAJ_COLUMNS].reset_index(drop=True)
+
+    def _fl_mask(self, idx: np.ndarray, min_ft: int, max_ft: int) -> np.ndarray:
+        """``EXISTS`` over the split altitudes of the rows in ``idx``."""
+        lengths = self._alt_len[idx]
+        owner = np.repeat(np.arange(len(idx)), lengths)
+        first = np.repeat(self._alt_off[idx], lengths)
+        pos = first + (np.arange(len(owner)) - np.repeat(np.cumsum(lengths) - lengths, lengths))
+        vals = self._alt[pos]
+        hit = (vals >= min_ft) & (vals <= max_ft)
+        return np.bincount(owner[hit], minlength=len(idx)) > 0
+
+    def _trajectories(self, sector_id, start, end, apply_fl, min_ft, max_ft, max_rows, tol_deg,
+                      since=None) -> pd.DataFrame:
+        sector = self._sector_geoms.get(int(sector_id))
+        if sector is None or self.flights.empty:
+            return pd.DataFrame(columns=TRAJ_COLUMNS)
+        idx = np.sort(self._tree.query(sector, predicate="intersects"))
+        start = np.datetime64(pd.Timestamp(start).to_datetime64(), "ns")
+        end = np.datetime64(pd.Timestamp(end).to_datetime64(), "ns")
+        keep = self._eligible[idx] & (self._start[idx] < end) & (self._end[idx] >= start)
+        if since is not None:
+            keep &= self._start[idx] >= np.datetime64(pd.Timestamp(since).to_datetime64(), "ns")
+        idx = idx[keep]
+        if apply_fl and len(idx):
+            idx = idx[self._fl_mask(idx, int(min_ft), int(max_ft))]
+        idx = idx[np.argsort(self._start[idx], kind="stable")][: int(max_rows)]
+
+        out = self.flights.iloc[idx][TRAJ_COLUMNS].reset_index(drop=True)
+        reduced = shapely.simplify(self._lines[idx], float(tol_deg), preserve_topology=False)
+        out["WKT"] = shapely.to_wkt(reduced, rounding_precision=6)
+        if since is not None:
+            out["LiveMark"] = out["StartTime"]
+        return out
@@ -0,0 +1,260 @@
+"""Synthetic ``StaticAirspace`` / ``Flight`` / ``FlightTrajectory`` data.
+
+Everything is generated from a seeded NumPy generator so two runs with the
+same arguments produce identical tables. Column names and dtypes mirror what
+``pd.read_sql`` returns for the production queries.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import shapely
+
+# Reference window used by the benchmarks (naive UTC, like the app).
+REFERENCE_START = datetime(2024, 6, 1, 0, 0)
+REFERENCE_END = REFERENCE_START + timedelta(hours=12)
+
+# Region roughly covering the Bangkok FIR (lon, lat).
+REGION = (97.0, 6.0, 105.0, 20.0)
+
+AIRPORTS = {
+    "VTBS": (100.750, 13.690),
+    "VTBD": (100.607, 13.912),
+    "VTCC": (98.962, 18.767),
+    "VTSP": (98.317, 8.113),
+    "VTSS": (100.393, 6.933),
+    "VTUD": (102.788, 17.386),
+    "VTSM": (100.062, 9.548),
+    "VTCT": (99.883, 19.952),
+    "VTUK": (102.784, 16.466),
+    "VTBU": (101.005, 12.680),
+}
+# Entry/exit points on the region edge for overflights, with a foreign "airport".
+GATES = {
+    "VHHH": (105.0, 17.5),
+    "RKSI": (105.0, 19.5),
+    "WSSS": (101.5, 6.0),
+    "WMKK": (99.5, 6.0),
+    "VIDP": (97.0, 19.0),
+    "VYYY": (97.0, 16.0),
+    "OMDB": (97.0, 10.0),
+    "VVTS": (105.0, 10.5),
+}
+AIRLINES = ("THA", "AIQ", "NOK", "TLM", "BKP", "SIA", "CPA", "UAE", "VJC", "KAL")
+AIRCRAFT = (("A320", "M"), ("A321", "M"), ("B738", "M"), ("A20N", "M"),
+            ("A333", "H"), ("A359", "H"), ("B77W", "H"), ("B789", "H"), ("AT76", "M"))
+
+
+def make_sectors(nx: int = 4, ny: int = 4, region: tuple = REGION) -> pd.DataFrame:
+    """Return a ``StaticAirspace``-shaped frame tiling ``region`` with sectors.
+
+    Each grid cell becomes a lower (FL000–FL245) and an upper (FL245–FL600)
+    sector, so ``nx * ny * 2`` rows are produced.
+    """
+    x0, y0, x1, y1 = region
+    xs = np.linspace(x0, x1, nx + 1)
+    ys = np.linspace(y0, y1, ny + 1)
+    rows = []
+    sid = 1
+    for band, (lo, hi) in enumerate(((0, 24500), (24500, 60000))):
+        for j in range(ny):
+            for i in range(nx):
+                ring = [(xs[i], ys[j]), (xs[i + 1], ys[j]), (xs[i + 1], ys[j + 1]),
+                        (xs[i], ys[j + 1]), (xs[i], ys[j])]
+                wkt = "POLYGON ((" + ", ".join(f"{x:.4f} {y:.4f}" for x, y in ring) + "))"
+                name = f"SYN{'LU'[band]}{j:02d}{i:02d}"
+                rows.append({"Id": sid, "Name": name, "LowerLimitFt": lo, "UpperLimitFt": hi, "WKT": wkt})
+                sid += 1
+    return pd.DataFrame(rows).sort_values("Name", ignore_index=True)
+
+
+def busiest_sector_id(sectors: pd.DataFrame) -> int:
+    """Id of the upper sector whose centroid is closest to the Bangkok TMA."""
+    upper = sectors[sectors["LowerLimitFt"] > 0]
+    centroids = shapely.centroid(shapely.from_wkt(upper["WKT"].to_numpy()))
+    bx, by = AIRPORTS["VTBS"]
+    d = (shapely.get_x(centroids) - bx) ** 2 + (shapely.get_y(centroids) - by) ** 2
+    return int(upper["Id"].to_numpy()[int(np.argmin(d))])
+
+
+def _ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenate ``arange(s, s + n)`` for every pair without a Python loop."""
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    owner = np.repeat(np.arange(len(lengths)), lengths)
+    first = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return starts[owner] + (np.arange(total) - first)
+
+
+def _csv_per_row(values: np.ndarray, offsets: np.ndarray) -> list[str]:
+    """Join a flat integer array into one comma-separated string per row."""
+    text = list(map(str, values.tolist()))
+    return [",".join(text[offsets[i]:offsets[i + 1]]) for i in range(len(offsets) - 1)]
+
+
+def make_flights(
+    n_traj: int,
+    start: datetime = REFERENCE_START,
+    end: datetime = REFERENCE_END,
+    seed: int = 0,
+    split_fraction: float = 0.1,
+) -> pd.DataFrame:
+    """Return ``n_traj`` joined ``FlightTrajectory``/``Flight`` rows.
+
+    The frame carries every column selected by ``SQL_TRAJ_BY_SECTOR`` plus the
+    ``IsActive``/``IsCancelled`` flags the query filters on. ``WKT`` holds the
+    full-resolution ``PositionLine``; ``AltitudeFt``, ``SpeedKn`` and
+    ``Heading`` are per-vertex CSV strings like the production columns.
+    Roughly ``split_fraction`` of the flights are stored as two route portions.
+    """
+    rng = np.random.default_rng(seed)
+    n_split = int(round(n_traj * split_fraction / 2))
+    n_flights = n_traj - n_split
+
+    places = {**AIRPORTS, **GATES}
+    codes = np.array(list(places))
+    pos = np.array(list(places.values()))
+    is_airport = np.arange(len(codes)) < len(AIRPORTS)
+
+    # Weight Bangkok heavily so the central sectors see realistic hot spots.
+    weights = np.where(is_airport, 1.0, 0.6)
+    weights[:2] = 6.0
+    weights /= weights.sum()
+    orig = rng.choice(len(codes), n_flights, p=weights)
+    dest = rng.choice(len(codes) - 1, n_flights, p=None)
+    dest = np.where(dest >= orig, dest + 1, dest)
+
+    o = pos[orig]
+    d = pos[dest]
+    # Dogleg waypoint perpendicular to the great-circle-ish chord.
+    chord = d - o
+    normal = np.stack([-chord[:, 1], chord[:, 0]], axis=1)
+    mid = (o + d) / 2 + normal * rng.normal(0.0, 0.12, (n_flights, 1))
+
+    n_vtx = rng.integers(40, 160, n_flights)
+    offsets = np.concatenate([[0], np.cumsum(n_vtx)])
+    owner = np.repeat(np.arange(n_flights), n_vtx)
+    frac = (np.arange(offsets[-1]) - offsets[owner]) / np.maximum(n_vtx[owner] - 1, 1)
+    first_leg = frac < 0.5
+    leg_t = np.where(first_leg, frac * 2, (frac - 0.5) * 2)[:, None]
+    xy = np.where(first_leg[:, None], o[owner] + (mid[owner] - o[owner]) * leg_t,
+                  mid[owner] + (d[owner] - mid[owner]) * leg_t)
+    xy += rng.normal(0.0, 0.004, xy.shape)
+
+    # Vertical profile: climb out of / descend into airports, cruise otherwise.
+    cruise = rng.integers(24, 42, n_flights) * 1000
+    climb = np.where(is_airport[orig][owner], np.clip(frac / 0.2, 0, 1), 1.0)
+    descend = np.where(is_airport[dest][owner], np.clip((1 - frac) / 0.2, 0, 1), 1.0)
+    alt = np.round(cruise[owner] * np.minimum(climb, descend) / 100).astype(np.int64) * 100
+    spd = (250 + (alt / 41000) * 230 + rng.normal(0, 5, alt.shape)).astype(np.int64)
+    step = np.diff(xy, axis=0, append=xy[-1:])
+    hdg = (np.degrees(np.arctan2(step[:, 0], step[:, 1])) % 360).astype(np.int64)
+    last = offsets[1:] - 1
+    hdg[last] = hdg[np.maximum(last - 1, 0)]
+
+    # Timing: ~450 kt ground speed over the flown distance (1 deg ~ 60 NM).
+    seg = np.hypot(*np.diff(xy, axis=0).T)
+    seg = np.append(seg, 0.0)
+    seg[last] = 0.0
+    dist_nm = np.bincount(owner, weights=seg, minlength=n_flights) * 60.0
+    dur_s = np.maximum(dist_nm / 450.0 * 3600.0, 600.0)
+    span_s = (end - start).total_seconds()
+    t0 = rng.uniform(-4 * 3600, span_s, n_flights)
+
+    # Route portions: split some flights at their middle vertex.
+    split = np.zeros(n_flights, dtype=bool)
+    split[rng.choice(n_flights, n_split, replace=False)] = True
+    row_flight = np.repeat(np.arange(n_flights), np.where(split, 2, 1))
+    portion = np.zeros(len(row_flight), dtype=np.int64)
+    portion[1:] = (row_flight[1:] == row_flight[:-1]).astype(np.int64)
+    half = n_vtx[row_flight] // 2
+    v_start = np.where(split[row_flight] & (portion == 1), half, 0)
+    v_stop = np.where(split[row_flight] & (portion == 0), half + 1, n_vtx[row_flight])
+    row_len = v_stop - v_start
+    row_idx = _ranges(offsets[row_flight] + v_start, row_len)
+    row_offsets = np.concatenate([[0], np.cumsum(row_len)])
+
+    lines = shapely.linestrings(xy[row_idx], indices=np.repeat(np.arange(len(row_flight)), row_len))
+    wkt = shapely.to_wkt(lines, rounding_precision=5)
+    f_start = v_start / np.maximum(n_vtx[row_flight] - 1, 1)
+    f_stop = (v_stop - 1) / np.maximum(n_vtx[row_flight] - 1, 1)
+    base = np.datetime64(start, "s")
+    st = base + (t0[row_flight] + f_start * dur_s[row_flight]).astype("timedelta64[s]")
+    en = base + (t0[row_flight] + f_stop * dur_s[row_flight]).astype("timedelta64[s]")
+
+    # Flight plan attributes, one per flight then broadcast to its rows.
+    airline = rng.choice(AIRLINES, n_flights)
+    number = rng.integers(1, 9999, n_flights).astype(str)
+    callsign = np.char.add(airline.astype(str), number)
+    ac = rng.integers(0, len(AIRCRAFT), n_flights)
+    ac_type = np.array([a for a, _ in AIRCRAFT])[ac]
+    wtc = np.array([w for _, w in AIRCRAFT])[ac]
+    reg = np.char.add("HS-", rng.integers(100, 999, n_flights).astype(str))
+
+    def fs(arr):
+        """Broadcast a per-flight array to the trajectory rows."""
+        return arr[row_flight]
+
+    def ts(arr):
+        return pd.to_datetime(fs(arr))
+
+    etot = base + t0.astype("timedelta64[s]")
+    eldt = etot + dur_s.astype("timedelta64[s]")
+    sobt = etot - np.timedelta64(15, "m")
+    now = base + np.timedelta64(int(span_s // 2), "s")
+    delay = rng.integers(-5, 25, n_flights).astype("timedelta64[m]")
+    atot = np.where(etot + delay <= now, etot + delay, np.datetime64("NaT"))
+    aldt = np.where(eldt + delay <= now, eldt + delay, np.datetime64("NaT"))
+    regulated = rng.random(n_flights) < 0.3
+    ctot = np.where(regulated, etot + np.timedelta64(10, "m"), np.datetime64("NaT"))
+    cldt = np.where(regulated, eldt + np.timedelta64(10, "m"), np.datetime64("NaT"))
+
+    frame = pd.DataFrame({
+        "TrajectoryId": np.arange(1, len(row_flight) + 1, dtype=np.int64),
+        "FlightId": fs(np.arange(100_001, 100_001 + n_flights, dtype=np.int64)),
+        "FlightSourceId": fs(rng.integers(1, 4, n_flights)),
+        "StartTime": pd.to_datetime(st),
+        "EndTime": pd.to_datetime(en),
+        "AltitudeFt": _csv_per_row(alt[row_idx], row_offsets),
+        "Heading": _csv_per_row(hdg[row_idx], row_offsets),
+        "SpeedKn": _csv_per_row(spd[row_idx], row_offsets),
+        "WKT": wkt,
+        "Callsign": fs(callsign),
+        "AirportDeparture": fs(codes[orig]),
+        "AirportArrival": fs(codes[dest]),
+        "FlightRule": "I",
+        "FlightType": "S",
+        "AircraftType": fs(ac_type),
+        "WakeTurbulanceCategory": fs(wtc),
+        "REG": fs(reg),
+        "LevelInitial": fs(cruise // 100),
+        "SpeedInitial": fs(np.full(n_flights, 450)),
+        "SID": fs(np.char.add(codes[orig], "1A")),
+        "STAR": fs(np.char.add(codes[dest], "2B")),
+        "RunwayDeparture": "01L",
+        "RunwayArrival": "19R",
+        "AirportAlternate": "VTBD",
+        "Number": fs(number),
+        "SOBT": ts(sobt),
+        "EOBT": ts(sobt),
+        "STOT": ts(etot),
+        "SLDT": ts(eldt),
+        "TimeFiling": ts(sobt - np.timedelta64(3, "h")),
+        "ETOT": ts(etot),
+        "ELDT": ts(eldt),
+        "CTOT": ts(ctot),
+        "CLDT": ts(cldt),
+        "ATOT": ts(atot),
+        "ALDT": ts(aldt),
+    })
+    frame["IsActive"] = (rng.random(len(frame)) > 0.02).astype(np.int64)
+    cancelled = rng.random(n_flights)
+    frame["IsCancelled"] = pd.array(
+        np.where(cancelled < 0.01, 1, 0)[row_flight], dtype="Int64"
+    )
+    frame.loc[fs(cancelled > 0.95), "IsCancelled"] = pd.NA
+    return frame
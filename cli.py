@@ -0,0 +1,306 @@
+"""Command-line tools for the ATFAS trajectory & demand app.
+
+Run ``python cli.py --help`` for the list of commands.
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import timedelta
+
+from utils.time import parse_utc
+
+
+def cmd_columnar_build(args: argparse.Namespace) -> int:
+    """Copy sectors and every trajectory in a window from SQL Server to local files."""
+    from utils.columnar import write_columnar
+    from utils.datasource import MSSQLDataSource
+
+    source = MSSQLDataSource()
+    start, end = parse_utc(args.start), parse_utc(args.end)
+    t0 = time.perf_counter()
+    sectors = source.list_sectors()
+    trajectories = source.window_trajectories(start, end)
+    t1 = time.perf_counter()
+    path = write_columnar(args.out, sectors, trajectories,
+                          meta={"source": "mssql", "start": start.isoformat(), "end": end.isoformat()})
+    t2 = time.perf_counter()
+    print(f"{len(trajectories)} trajectories, {len(sectors)} sectors -> {path} "
+          f"(query {t1 - t0:.1f}s, write {t2 - t1:.1f}s)")
+    return 0
+
+
+def cmd_snapshot_export(args: argparse.Namespace) -> int:
+    """Export a sector/window from the configured data source as a snapshot."""
+    from utils.datasource import get_datasource
+    from utils.snapshot import export_snapshot, resolve
+
+    t0 = time.perf_counter()
+    key = export_snapshot(get_datasource(), args.sector, parse_utc(args.start), parse_utc(args.end),
+                          fl_range=tuple(args.fl) if args.fl else None, max_rows=args.max_rows, name=args.name)
+    print(f"Saved snapshot {key} -> {resolve(key)} ({time.perf_counter() - t0:.1f}s)")
+    return 0
+
+
+def cmd_snapshot_list(args: argparse.Namespace) -> int:
+    """List saved snapshots, newest first."""
+    from utils.snapshot import list_snapshots
+
+    for snap in list_snapshots():
+        print(f"{snap['key']:<40} {snap.get('sector_name', '?'):<12} {snap.get('start', '?')} -> "
+              f"{snap.get('end', '?')}  {snap.get('n_trajectories', 0):>7} traj")
+    return 0
+
+
+def cmd_snapshot_open(args: argparse.Namespace) -> int:
+    """Serve the app with a snapshot as its only data source."""
+    from utils.datasource import set_datasource
+    from utils.snapshot import open_snapshot
+
+    t0 = time.perf_counter()
+    source = open_snapshot(args.key)
+    print(f"Opened {args.key} ({source.n} trajectories) in {(time.perf_counter() - t0) * 1e3:.0f} ms")
+    set_datasource(source)
+
+    from app import app
+
+    app.run(host=args.host or os.getenv("DASH_HOST", "0.0.0.0"),
+            port=args.port or int(os.getenv("DASH_PORT", "8050")), debug=False)
+    return 0
+
+
+def _report_tasks(args: argparse.Namespace) -> list[dict]:
+    """One task per (sector or airport, window) selected on the command line."""
+    from utils.datasource import get_datasource
+    from utils.places import place_catalog
+
+    start, end = parse_utc(args.start), parse_utc(args.end)
+    step = timedelta(hours=args.window_hours) if args.window_hours else end - start
+    windows = []
+    while start < end:
+        windows.append((start, min(start + step, end)))
+        start += step
+
+    areas = []
+    if args.sectors or not args.airports:
+        sectors = get_datasource().list_sectors()
+        wanted = {s.upper() for s in args.sectors or []}
+        for row in sectors.itertuples(index=False):
+            if not wanted or str(row.Id) in wanted or str(row.Name).upper() in wanted:
+                areas.append(("sector", int(row.Id), str(row.Name)))
+        missing = wanted - {str(a[1]) for a in areas} - {a[2].upper() for a in areas}
+        if missing:
+            raise SystemExit(f"Unknown sectors: {', '.join(sorted(missing))}")
+    for code in args.airports or []:
+        place = place_catalog().get("airport", code)
+        if place is None:
+            raise SystemExit(f"Airport {code!r} is not in the places catalog")
+        areas.append(("airport", place.code, place.name))
+    return [{"kind": kind, "id": area_id, "name": name, "start": w0, "end": w1, "max_rows": args.max_rows}
+            for kind, area_id, name in areas for w0, w1 in windows]
+
+
+def cmd_demand_report(args: argparse.Namespace) -> int:
+    """Write 20-minute demand tables for many sectors/airports and windows, in parallel."""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    import pandas as pd
+
+    from utils.demand import init_worker, run_task
+
+    tasks = _report_tasks(args)
+    workers = max(1, min(args.workers or os.cpu_count() or 1, len(tasks)))
+    print(f"{len(tasks)} tasks on {workers} workers, at most {args.db_concurrency} querying at once")
+    t0 = time.perf_counter()
+    tables, timings = [], []
+
+    def done(table, timing):
+        tables.append(table)
+        timings.append(timing)
+        print(f"[{len(timings)}/{len(tasks)}] {timing['AreaType']} {timing['AreaName']} "
+              f"{timing['WindowStart']:%Y-%m-%d %H:%M}: {timing['Flights']} flights "
+              f"(query {timing['QueryS']:.1f}s, waited {timing['WaitS']:.1f}s)")
+
+    if workers == 1:
+        for task in tasks:
+            done(*run_task(task))
+    else:
+        # spawn: every worker opens its own ODBC connections
+        ctx = multiprocessing.get_context("spawn")
+        slots = ctx.BoundedSemaphore(max(1, args.db_concurrency))
+        with ProcessPoolExecutor(workers, mp_context=ctx, initializer=init_worker, initargs=(slots,)) as pool:
+            for future in as_completed([pool.submit(run_task, task) for task in tasks]):
+                done(*future.result())
+    wall = time.perf_counter() - t0
+
+    demand = pd.concat(tables, ignore_index=True).sort_values(["AreaType", "AreaName", "IntervalStart"], ignore_index=True)
+    for col in ("Departures", "Arrivals"):  # airports only; blank for sectors
+        if col in demand:
+            demand[col] = demand[col].astype("Int64")
+    timing = pd.DataFrame(timings).round({"WaitS": 3, "QueryS": 3, "BinS": 3})
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"demand.{args.format}")
+    if args.format == "parquet":
+        try:
+            demand.to_parquet(path, index=False)
+        except ImportError as exc:
+            raise SystemExit(f"Parquet output needs pyarrow ({exc}); use --format csv") from exc
+    else:
+        demand.to_csv(path, index=False)
+    timing.to_csv(os.path.join(args.out, "timings.csv"), index=False)
+
+    busy = float((timing["QueryS"] + timing["BinS"]).sum())
+    query = timing["QueryS"].tolist()
+    print(f"{len(demand)} rows -> {path}")
+    print(f"wall {wall:.1f}s | query p50 {statistics.median(query):.2f}s, "
+          f"max {max(query):.2f}s, total {sum(query):.1f}s | "
+          f"busy/wall {busy / wall:.1f}x | {timing['Trajectories'].sum()} trajectories")
+    return 0
+
+
+def cmd_startup_profile(args: argparse.Namespace) -> int:
+    """Time a cold start of the app in a fresh interpreter: phases and slowest imports."""
+    import json
+
+    from utils.startup import import_profile
+
+    code = "import json, app; a = app.app\n"
+    if args.layout:
+        code += "a.server.test_client().get('/_dash-layout')\n"
+    code += "from utils.startup import startup; print(json.dumps(startup.report()))"
+    t0 = time.perf_counter()
+    rows, out = import_profile(code=code)
+    wall = time.perf_counter() - t0
+    report = json.loads(out.strip().splitlines()[-1])
+
+    print(f"{'phase':<16} {'start ms':>9} {'ms':>9}")
+    for p in report["phases"]:
+        print(f"{p['phase']:<16} {p['start_ms']:>9.1f} {p['ms']:>9.1f}")
+    # importtime lists children before their parent: app.py's own imports are
+    # the depth-1 rows just before its depth-0 row
+    direct, pending = [], []
+    for r in rows:
+        if r["depth"] == 1:
+            pending.append(r)
+        elif r["depth"] == 0:
+            direct, pending = (pending, []) if r["module"] == "app" else (direct, [])
+    print("\nslowest imports of app.py (cumulative):")
+    for r in sorted(direct, key=lambda r: -r["cumulative_ms"])[:args.top]:
+        print(f"  {r['cumulative_ms']:>9.1f} ms  {r['module']}")
+    print("\nslowest modules (self time):")
+    for r in sorted(rows, key=lambda r: -r["self_ms"])[:args.top]:
+        print(f"  {r['self_ms']:>9.1f} ms  {r['module']}")
+    print(f"\nprocess wall {wall * 1e3:.0f} ms | {len(rows)} modules imported")
+    return 0
+
+
+def cmd_cube_fill(args: argparse.Namespace) -> int:
+    """Bin finished days into the historical demand cube, then compact old days into months."""
+    from datetime import date
+
+    from utils.cube import compact, fill, fill_day
+    from utils.datasource import get_datasource
+
+    source = get_datasource()
+    t0 = time.perf_counter()
+    if args.day:
+        for day in args.day:
+            fill_day(source, date.fromisoformat(day))
+        added = [date.fromisoformat(d) for d in args.day]
+    else:
+        added = fill(source, days=args.days)
+    print(f"binned {len(added)} days in {time.perf_counter() - t0:.1f}s"
+          + (f" ({min(added)} .. {max(added)})" if added else ""))
+    if not args.no_compact:
+        months = compact()
+        print(f"compacted into {', '.join(months)}" if months else "nothing to compact")
+    return 0
+
+
+def cmd_cube_info(args: argparse.Namespace) -> int:
+    """List the days held by the demand cube and its partitions on disk."""
+    from utils.cube import CUBE_DIR, get_cube
+
+    days = get_cube().days()
+    print(f"{CUBE_DIR}: {len(days)} days" + (f", {days[0]} .. {days[-1]}" if days else ""))
+    for sub in ("months", "days"):
+        base = CUBE_DIR / sub
+        for path in sorted(base.iterdir()) if base.is_dir() else []:
+            if path.is_dir() and not path.name.startswith("."):
+                size = sum(f.stat().st_size for f in path.iterdir())
+                print(f"  {sub}/{path.name}  {size / 1024:.0f} KiB")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python cli.py", description=__doc__)
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("columnar-build", help=cmd_columnar_build.__doc__)
+    p.add_argument("--start", required=True, help="window start (UTC, ISO-8601)")
+    p.add_argument("--end", required=True, help="window end (UTC, ISO-8601)")
+    p.add_argument("--out", default="data/columnar", help="dataset directory")
+    p.set_defaults(func=cmd_columnar_build)
+
+    p = sub.add_parser("snapshot-export", help=cmd_snapshot_export.__doc__)
+    p.add_argument("--sector", type=int, required=True, help="StaticAirspace Id")
+    p.add_argument("--start", required=True, help="window start (UTC, ISO-8601)")
+    p.add_argument("--end", required=True, help="window end (UTC, ISO-8601)")
+    p.add_argument("--fl", type=int, nargs=2, metavar=("MIN_FT", "MAX_FT"), help="altitude band filter")
+    p.add_argument("--max-rows", type=int, default=int(os.getenv("MAX_TRAJ", "2000")))
+    p.add_argument("--name", default=None, help="snapshot name (default: <sector>_<start>)")
+    p.set_defaults(func=cmd_snapshot_export)
+
+    p = sub.add_parser("demand-report", help=cmd_demand_report.__doc__)
+    p.add_argument("--start", required=True, help="report start (UTC, ISO-8601)")
+    p.add_argument("--end", required=True, help="report end (UTC, ISO-8601)")
+    p.add_argument("--window-hours", type=float, default=24, help="split the range into windows (0 = one window)")
+    p.add_argument("--sectors", nargs="*", help="StaticAirspace Ids or names (default: all, unless --airports)")
+    p.add_argument("--airports", nargs="*", help="airport codes from the places catalog")
+    p.add_argument("--workers", type=int, default=int(os.getenv("REPORT_WORKERS", "0")),
+                   help="worker processes (default: CPU count)")
+    p.add_argument("--db-concurrency", type=int, default=int(os.getenv("REPORT_DB_CONCURRENCY", "4")),
+                   help="workers allowed to query the database at the same time")
+    p.add_argument("--max-rows", type=int, default=2**31 - 1, help="row cap per query (default: none)")
+    p.add_argument("--format", choices=["csv", "parquet"], default="csv", help="parquet needs pyarrow")
+    p.add_argument("--out", default="reports", help="output directory")
+    p.set_defaults(func=cmd_demand_report)
+
+    p = sub.add_parser("startup-profile", help=cmd_startup_profile.__doc__)
+    p.add_argument("--top", type=int, default=15, help="imports to list")
+    p.add_argument("--layout", action="store_true", help="also serve the first layout (queries the sector list)")
+    p.set_defaults(func=cmd_startup_profile)
+
+    p = sub.add_parser("cube-fill", help=cmd_cube_fill.__doc__)
+    p.add_argument("--days", type=int, default=int(os.getenv("CUBE_BACKFILL_DAYS", "56")),
+                   help="finished days to look back over; only missing ones are queried")
+    p.add_argument("--day", nargs="*", help="(re)bin these days (YYYY-MM-DD) instead")
+    p.add_argument("--no-compact", action="store_true", help="leave day partitions as they are")
+    p.set_defaults(func=cmd_cube_fill)
+
+    p = sub.add_parser("cube-info", help=cmd_cube_info.__doc__)
+    p.set_defaults(func=cmd_cube_info)
+
+    p = sub.add_parser("snapshot-list", help=cmd_snapshot_list.__doc__)
+    p.set_defaults(func=cmd_snapshot_list)
+
+    p = sub.add_parser("snapshot-open", help=cmd_snapshot_open.__doc__)
+    p.add_argument("key", help="<name> (latest version) or <name>/<version>")
+    p.add_argument("--host", default=None)
+    p.add_argument("--port", type=int, default=None)
+    p.set_defaults(func=cmd_snapshot_open)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
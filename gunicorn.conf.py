@@ -0,0 +1,50 @@
+# Gunicorn settings for serving the Dash app with several worker processes.
+#
+#   gunicorn -c gunicorn.conf.py
+#
+# Workers share sectors and query results through the SQLite cache in
+# utils/cache.py (CACHE_PATH), so N workers still issue each distinct
+# sector/window query once per CACHE_TTL_S. Metrics at METRICS_ROUTE are
+# per worker; scrape through a service that sums the series.
+#
+# Local load test (python -m bench.load --scenario fetch, 8 clients, 120 requests
+# over 4 sectors x 4 windows, 20k synthetic trajectories, 300 ms simulated
+# DB latency, 1 vCPU):
+#   1 worker,  no cache   1.9 req/s   p50 4050 ms
+#   4 workers, no cache   2.1 req/s   p50 3260 ms
+#   4 workers, cache      7.6 req/s   p50  301 ms   (22 misses / 120)
+import multiprocessing
+import os
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except Exception:  # dotenv not installed
+    pass
+
+wsgi_app = "wsgi:create_server()"
+bind = f"{os.getenv('DASH_HOST', '0.0.0.0')}:{os.getenv('DASH_PORT', '8050')}"
+workers = int(os.getenv("WEB_WORKERS", str(min(multiprocessing.cpu_count(), 8))))
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "4"))
+# Long sector/window queries must not trip the worker watchdog.
+timeout = int(os.getenv("WEB_TIMEOUT", "120"))
+graceful_timeout = 30
+keepalive = 5
+# Import and build the app once in the master; workers fork ready to serve.
+# Nothing at import touches the database: the layout (and the sector list)
+# is built per page load. DB and cache connections are opened per process.
+# ``python cli.py startup-profile`` times a cold start.
+preload_app = os.getenv("WEB_PRELOAD", "True").lower() == "true"
+# Recycle workers periodically to cap fragmentation from large frames.
+max_requests = int(os.getenv("WEB_MAX_REQUESTS", "1000"))
+max_requests_jitter = 100
+accesslog = "-"
+
+
+def post_fork(server, worker):
+    # Background threads must start in the worker; the first request would
+    # start it too, this way the cube fills before any traffic arrives.
+    from utils.cube import start_filler
+
+    start_filler()
@@ -0,0 +1,53 @@
+from datetime import timedelta
+
+import numpy as np
+import pytest
+
+from bench.synthetic import REFERENCE_START, make_flights
+from utils.conflicts import CONFLICT_COLUMNS, CONFLICT_FLOOR_FT, detect_conflicts, resample
+from utils.dataset import TrajectoryDataset
+from utils.places import haversine_nm
+
+
+def _records(n=150):
+    df = make_flights(n, REFERENCE_START, REFERENCE_START + timedelta(hours=2), seed=5)
+    return TrajectoryDataset.from_frame(df).records()
+
+
+def _brute_force(records, h_nm, v_ft, step_s):
+    """``{(FlightA, FlightB): (first k, last k, min distance)}`` from every sample pair per time step."""
+    s = resample(records, step_s)
+    keep = s["alt"] >= CONFLICT_FLOOR_FT
+    k, lat, lon, alt, fid = (s[name][keep] for name in ("k", "lat", "lon", "alt", "fid"))
+    out = {}
+    for t in np.unique(k):
+        idx = np.flatnonzero(k == t)
+        i, j = np.triu_indices(len(idx), 1)
+        i, j = idx[i], idx[j]
+        d = haversine_nm(lat[i], lon[i], lat[j], lon[j])
+        ok = (fid[i] != fid[j]) & (np.abs(alt[i] - alt[j]) < v_ft) & (d < h_nm)
+        for a, b, dist in zip(fid[i][ok], fid[j][ok], d[ok]):
+            pair = (min(a, b), max(a, b))
+            first, last, best = out.get(pair, (t, t, np.inf))
+            out[pair] = (min(first, t), max(last, t), min(best, dist))
+    return out
+
+
+@pytest.mark.parametrize("h_nm, v_ft", [(5, 1000), (20, 2000), (60, 5000)])
+def test_detect_conflicts_matches_brute_force(h_nm, v_ft):
+    records, step_s = _records(), 30.0
+    got = detect_conflicts(records, h_nm, v_ft, step_s, workers=0)
+    expected = _brute_force(records, h_nm, v_ft, step_s)
+    assert list(got.columns) == CONFLICT_COLUMNS
+    assert set(zip(got["FlightA"], got["FlightB"])) == set(expected)
+    for row in got.itertuples():
+        first, last, best = expected[(row.FlightA, row.FlightB)]
+        assert row.Start.timestamp() == first * step_s
+        assert row.End.timestamp() == last * step_s
+        assert row.MinDistNm == pytest.approx(best, abs=0.005)
+        assert row.VertFt < v_ft
+
+
+def test_no_conflicts():
+    assert detect_conflicts([]).empty
+    assert detect_conflicts(_records(1)).columns.tolist() == CONFLICT_COLUMNS
@@ -0,0 +1,77 @@
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+from utils.cube import INTERVALS, N_SPANS, DemandCube, compact, span_index, span_mask, write_day
+
+TODAY = date(2024, 3, 20)
+DAYS = [date(2024, 2, 20) + timedelta(days=i) for i in range(28)]  # across a month boundary
+
+
+def _counts(day, sectors):
+    rng = np.random.default_rng(day.toordinal())
+    return rng.integers(0, 5, size=(len(sectors), INTERVALS, N_SPANS))
+
+
+def _fill(root):
+    expected = {}
+    for day in DAYS:
+        sectors = [1, 2]
+        counts = _counts(day, sectors)
+        write_day(day, sectors, counts, root)
+        for sid, c in zip(sectors, counts):
+            expected[day, sid] = c
+    return expected
+
+
+def _history(expected, sid, days, fl_range=None):
+    mask = span_mask(fl_range)
+    return np.array([expected[d, sid][:, mask].sum(axis=-1) if (d, sid) in expected else np.full(INTERVALS, np.nan)
+                     for d in days])
+
+
+@pytest.mark.parametrize("fl_range", [None, (20000, 30000)])
+def test_history_survives_compaction(tmp_path, fl_range):
+    expected = _fill(tmp_path)
+    days = DAYS + [date(2024, 1, 1)]  # plus a day the cube lacks; sector 3 is never stored
+    cube = DemandCube(tmp_path)
+    for sid in (1, 2, 3):
+        np.testing.assert_array_equal(cube.history(sid, days, fl_range), _history(expected, sid, days, fl_range))
+
+    assert compact(tmp_path, older_than_days=7, today=TODAY) == ["2024-02", "2024-03"]
+    remaining = sorted(p.name for p in (tmp_path / "days").iterdir())
+    assert remaining == [d.isoformat() for d in DAYS if (TODAY - d).days <= 7]
+    for c in (cube, DemandCube(tmp_path)):  # an open cube notices the new listing
+        assert c.days() == DAYS
+        for sid in (1, 2, 3):
+            np.testing.assert_array_equal(c.history(sid, days, fl_range), _history(expected, sid, days, fl_range))
+
+
+def test_refilled_day_wins_over_its_month(tmp_path):
+    expected = _fill(tmp_path)
+    compact(tmp_path, older_than_days=7, today=TODAY)
+    day = DAYS[0]
+    write_day(day, [1, 2], np.ones((2, INTERVALS, N_SPANS), dtype=np.int64), tmp_path)
+    compact(tmp_path, older_than_days=7, today=TODAY)
+    cube = DemandCube(tmp_path)
+    np.testing.assert_array_equal(cube.history(1, [day]), np.full((1, INTERVALS), N_SPANS))
+    np.testing.assert_array_equal(cube.history(1, DAYS[1:3]), _history(expected, 1, DAYS[1:3]))
+
+
+def test_baseline_needs_enough_weeks(tmp_path):
+    _fill(tmp_path)
+    cube = DemandCube(tmp_path)
+    starts = [datetime(2024, 3, 19, 10, 0), datetime(2024, 3, 19, 10, 20)]
+    base = cube.baseline(1, starts, weeks=8)
+    assert base["weeks"] == 4  # the Tuesdays 20 Feb .. 12 Mar; 13 Feb and earlier are not stored
+    assert base["p10"].shape == (2,) and (base["p10"] <= base["p50"]).all() and (base["p50"] <= base["p90"]).all()
+    assert cube.baseline(1, [datetime(2024, 1, 9, 10, 0)]) is None
+
+
+def test_span_index_and_mask():
+    spans = span_index([5000, 25000, np.nan], [15000, 26000, np.nan])
+    assert spans[-1] == N_SPANS - 1
+    mask = span_mask((20000, 30000))
+    assert not mask[spans[0]] and mask[spans[1]] and not mask[-1]
+    assert span_mask(None).all()
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bench.synthetic import make_flights
+from utils.dataset import RECORD_COLUMNS, TIME_COLUMNS, TrajectoryDataset
+
+ID_FIELDS = ("TrajectoryId", "FlightId", "FlightSourceId")
+
+
+def _legacy_records(df):
+    """The per-row builder ``fetch_data`` used before :class:`TrajectoryDataset`."""
+    out = []
+    for _, r in df.iterrows():
+        rec = {name: r.get(name) for name in RECORD_COLUMNS}
+        for name in ID_FIELDS:
+            rec[name] = int(r[name]) if pd.notna(r.get(name)) else None
+        for name in TIME_COLUMNS:
+            rec[name] = r[name].isoformat() if pd.notna(r.get(name)) else None
+        out.append(rec)
+    return out
+
+
+def _frame():
+    df = make_flights(300, seed=3).astype({"Callsign": object, "SID": object, "FlightSourceId": object})
+    rng = np.random.default_rng(3)
+    df.loc[rng.random(len(df)) < 0.2, "Callsign"] = None
+    df.loc[rng.random(len(df)) < 0.2, "ATOT"] = pd.NaT
+    df.loc[rng.random(len(df)) < 0.2, "FlightSourceId"] = None
+    df["ETOT"] = df["ETOT"].astype("datetime64[ms]")
+    df.loc[:9, "ETOT"] += pd.Timedelta(milliseconds=250)  # isoformat() then prints microseconds
+    return df
+
+
+def test_records_match_legacy_builder():
+    df = _frame()
+    got, expected = TrajectoryDataset.from_frame(df).records(), _legacy_records(df)
+    assert len(got) == len(expected)
+    for g, e in zip(got, expected):
+        assert list(g) == RECORD_COLUMNS
+        assert g == e
+
+
+def test_records_round_trip():
+    records = TrajectoryDataset.from_frame(_frame()).records()
+    assert TrajectoryDataset.from_records(records).records() == records
+
+
+def test_take_and_simplified_share_tables():
+    ds = TrajectoryDataset.from_frame(_frame())
+    part = ds.take(np.arange(0, len(ds), 7))
+    assert part.records() == ds.records()[::7]
+    coarse = ds.simplified(0.05)
+    assert coarse.tables is ds.tables
+    assert [r["Callsign"] for r in coarse.records()] == [r["Callsign"] for r in ds.records()]
+    assert sum(map(len, coarse.column("WKT"))) < sum(map(len, ds.column("WKT")))
+
+
+def test_empty_dataset():
+    ds = TrajectoryDataset.from_frame(pd.DataFrame(columns=RECORD_COLUMNS))
+    assert len(ds) == 0 and ds.records() == []
+    with pytest.raises(IndexError):
+        ds[0]
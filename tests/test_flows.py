@@ -0,0 +1,67 @@
+from datetime import datetime, timedelta
+
+import pandas as pd
+import pytest
+
+from utils.flows import FLOW_COLUMNS, VISIT_COLUMNS, SectorIndex, flow_matrix, sector_visits
+
+T0 = datetime(2024, 1, 1, 10, 0)
+
+
+def _sectors():
+    # West/East halves at FL0-400, a small box straddling their border at the north edge
+    return pd.DataFrame({
+        "Id": [1, 2, 3],
+        "Name": ["WEST", "EAST", "NOTCH"],
+        "LowerLimitFt": [0, 0, 0],
+        "UpperLimitFt": [40000, 40000, 40000],
+        "WKT": ["POLYGON ((100 10, 101 10, 101 12, 100 12, 100 10))",
+                "POLYGON ((101 10, 102 10, 102 12, 101 12, 101 10))",
+                "POLYGON ((100.99 11.9, 101.01 11.9, 101.01 12, 100.99 12, 100.99 11.9))"],
+    })
+
+
+def _flight(fid, wkt, minutes, alt=30000):
+    return {"FlightId": fid, "StartTime": T0, "EndTime": T0 + timedelta(minutes=minutes),
+            "WKT": wkt, "AltitudeFt": f"{alt},{alt}"}
+
+
+def test_sector_visits_orders_handover():
+    visits = sector_visits([_flight(7, "LINESTRING (100.2 11, 101.8 11)", 20)], SectorIndex(_sectors()))
+    assert visits["Sector"].tolist() == [1, 2]
+    assert (visits["Entry"] <= visits["Exit"]).all()
+    assert visits["Exit"].iloc[0] < visits["Entry"].iloc[1]
+
+
+def test_corner_clip_is_not_a_handover():
+    # 0.02° per 30 s sample, so one sample falls in the notch: WEST -> EAST, not WEST -> NOTCH -> EAST
+    path = "LINESTRING (100.2 11.95, 101.8 11.95)"
+    visits = sector_visits([_flight(7, path, 40)], SectorIndex(_sectors()), step_s=30, min_samples=2)
+    assert visits["Sector"].tolist() == [1, 2]
+
+
+def test_corner_clip_rejoins_split_visit():
+    # WEST, one sample in EAST, back to WEST: a single WEST visit
+    path = "LINESTRING (100.2 11, 101.01 11, 100.2 11)"
+    visits = sector_visits([_flight(7, path, 60)], SectorIndex(_sectors()), step_s=30, min_samples=2)
+    assert visits["Sector"].tolist() == [1]
+
+
+@pytest.mark.parametrize("records", [
+    [],
+    [_flight(7, "LINESTRING (110 20, 111 20)", 20)],  # outside every volume
+    [_flight(7, "LINESTRING (100.2 11, 101.8 11)", 20, alt=45000)],  # above every volume
+])
+def test_no_visits(records):
+    assert sector_visits(records, SectorIndex(_sectors())).columns.tolist() == VISIT_COLUMNS
+    assert sector_visits(records, SectorIndex(_sectors())).empty
+    flows = flow_matrix(records, _sectors(), T0, T0 + timedelta(hours=1))
+    assert flows.empty and flows.columns.tolist() == FLOW_COLUMNS
+
+
+def test_flow_matrix_counts_flights_per_interval():
+    records = [_flight(fid, "LINESTRING (100.2 11, 101.8 11)", 20) for fid in (1, 2)]
+    records.append(_flight(3, "LINESTRING (101.8 11, 100.2 11)", 20))
+    flows = flow_matrix(records, _sectors(), T0, T0 + timedelta(hours=1))
+    assert flows[["From", "To", "Flights"]].values.tolist() == [["WEST", "EAST", 2], ["EAST", "WEST", 1]]
+    assert (flows["IntervalStart"] == T0).all()
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+import shapely
+
+from utils.geometry import dp_significance, simplify_path, simplify_paths, vw_significance
+
+TURNAROUND = [(100.0, 13.0), (100.5, 13.0), (101.0, 13.0), (100.75, 13.0005), (100.5, 13.001)]
+
+
+def _paths(seed=0, n=40):
+    rng = np.random.default_rng(seed)
+    paths = [np.array(TURNAROUND)]
+    for _ in range(n):
+        steps = rng.normal(size=(int(rng.integers(2, 60)), 2)) * rng.uniform(0.001, 0.5)
+        paths.append(np.array([100.0, 13.0]) + np.cumsum(steps, axis=0))
+    return paths
+
+
+def _significance(paths, significance=dp_significance):
+    offsets = np.concatenate([[0], np.cumsum([len(p) for p in paths])])
+    xy = np.concatenate(paths)
+    return significance(xy[:, 0], xy[:, 1], offsets), offsets
+
+
+def _triangle(a, b, c):
+    return 0.5 * abs((a[0] - b[0]) * (c[1] - b[1]) - (c[0] - b[0]) * (a[1] - b[1]))
+
+
+def _vw_reference(path):
+    """Sequential Visvalingam-Whyatt: drop the smallest effective area, update its neighbours."""
+    alive = list(range(len(path)))
+    area = {i: _triangle(path[i - 1], path[i], path[i + 1]) for i in alive[1:-1]}
+    sig = np.full(len(path), np.inf)
+    while len(alive) > 2:
+        k = min(range(1, len(alive) - 1), key=lambda k: (area[alive[k]], alive[k]))
+        i = alive.pop(k)
+        sig[i] = area[i]
+        for k in (k - 1, k):
+            if 0 < k < len(alive) - 1:
+                j = alive[k]
+                area[j] = max(_triangle(path[alive[k - 1]], path[j], path[alive[k + 1]]), sig[i])
+    return sig
+
+
+@pytest.mark.parametrize("tol", [1e-4, 1e-3, 0.01, 0.05, 0.2, 1.0])
+def test_dp_significance_matches_shapely(tol):
+    paths = _paths()
+    sig, offsets = _significance(paths)
+    for path, a, b in zip(paths, offsets[:-1], offsets[1:]):
+        kept = path[sig[a:b] >= tol]
+        expected = shapely.get_coordinates(shapely.simplify(shapely.LineString(path), tol, preserve_topology=False))
+        np.testing.assert_array_equal(kept, expected)
+
+
+def test_dp_significance_measures_to_segment_not_line():
+    sig, _ = _significance([np.array(TURNAROUND)])
+    # The far end of the turnaround lies on the chord's line but 0.5° beyond the segment
+    assert sig[2] == pytest.approx(0.5, rel=1e-3)
+    assert np.isinf(sig[[0, -1]]).all()
+
+
+def test_vw_significance_matches_sequential_reference():
+    paths = _paths(seed=1, n=60)
+    sig, offsets = _significance(paths, vw_significance)
+    for path, a, b in zip(paths, offsets[:-1], offsets[1:]):
+        expected = _vw_reference(path)
+        np.testing.assert_allclose(sig[a:b], expected, rtol=1e-12)
+        # Same removal order, hence the same vertices at every budget
+        np.testing.assert_array_equal(np.argsort(sig[a:b], kind="stable"), np.argsort(expected, kind="stable"))
+
+
+def test_simplify_path_reuses_the_cutoff_projection():
+    # (lat, lon) paths far apart in latitude, so one path alone has another mean
+    paths = [np.column_stack([lat + np.zeros(50), 100.0 + np.cumsum(np.random.default_rng(int(lat)).normal(size=50))])
+             for lat in (0.0, 60.0)]
+    kept, cutoff = simplify_paths(paths, budget=40)
+    for path, idx in zip(paths, kept):
+        np.testing.assert_array_equal(simplify_path(path, cutoff), idx)
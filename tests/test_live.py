@@ -0,0 +1,19 @@
+from utils.live import Segments
+
+
+def test_segments_remove_deletes_from_the_back():
+    seg = Segments([("a", 3), ("b", 2), ("c", 1), ("d", 2)])
+    items = ["a0", "a1", "a2", "b0", "b1", "c0", "d0", "d1"]
+    other = list(items)
+    assert seg.total == len(items)
+    assert seg.remove({"b", "d"}, items, other) == 4
+    assert items == other == ["a0", "a1", "a2", "c0"]
+    assert seg.keys == ["a", "c"] and seg.offset("c") == 3 and "b" not in seg
+
+
+def test_segments_add_after_remove():
+    seg = Segments([("a", 2)])
+    seg.add("b", 5)
+    seg.remove(["a"])
+    seg.add("c")
+    assert (seg.offset("b"), seg.offset("c"), seg.total, len(seg)) == (0, 5, 6, 2)
@@ -0,0 +1,58 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+import shapely
+
+from bench.synthetic import AIRPORTS, REFERENCE_END, REFERENCE_START, make_flights
+from utils.places import Area, Place, TrackIndex, haversine_nm
+
+
+@pytest.fixture(scope="module")
+def flights():
+    return make_flights(400, seed=7)
+
+
+def _brute_force(df, area, start, end):
+    """Rows with a vertex in ``area`` overlapping ``[start, end)``, ordered by StartTime."""
+    hits = []
+    for i, r in df.reset_index(drop=True).iterrows():
+        if not (r["StartTime"] < end and r["EndTime"] >= start):
+            continue
+        xy = shapely.get_coordinates(shapely.from_wkt(r["WKT"]))
+        profile = r["AltitudeFt"].split(",") if isinstance(r["AltitudeFt"], str) and r["AltitudeFt"] else []
+        alt = np.array([float(v) if v else np.nan for v in profile])
+        if len(alt) != len(xy):  # profile does not line up with the geometry: no altitude filter
+            alt = np.full(len(xy), np.nan)
+        inside = haversine_nm(area.place.lat, area.place.lon, xy[:, 1], xy[:, 0]) <= area.radius_nm
+        inside &= np.isnan(alt) | ((alt >= area.min_ft) & (alt <= area.max_ft))
+        if inside.any():
+            hits.append((r["StartTime"], i))
+    return np.array([i for _t, i in sorted(hits, key=lambda h: h[0])], dtype=np.int64)
+
+
+@pytest.mark.parametrize("code, radius_nm, band", [
+    ("VTBS", 10, (0, 99999)),
+    ("VTBS", 40, (0, 10000)),
+    ("VTCC", 25, (5000, 30000)),
+])
+def test_query_matches_brute_force(flights, code, radius_nm, band):
+    lon, lat = AIRPORTS[code]
+    area = Area(Place("airport", code, code, lat, lon), radius_nm, *band)
+    start, end = REFERENCE_START + timedelta(hours=2), REFERENCE_END - timedelta(hours=2)
+    rows = TrackIndex(flights, grid_deg=0.25).query(area, start, end)
+    expected = _brute_force(flights, area, start, end)
+    assert len(expected)
+    np.testing.assert_array_equal(np.sort(rows), np.sort(expected))
+    assert pd.Series(flights["StartTime"].to_numpy()[rows]).is_monotonic_increasing
+
+
+def test_frame_rebuilds_geometry(flights):
+    index = TrackIndex(flights)
+    rows = np.arange(0, len(flights), 9)
+    out = index.frame(rows)
+    assert list(out["TrajectoryId"]) == list(flights["TrajectoryId"].to_numpy()[rows])
+    got = shapely.from_wkt(out["WKT"].to_numpy())
+    expected = shapely.from_wkt(flights["WKT"].to_numpy()[rows])
+    assert shapely.equals_exact(got, expected, tolerance=1e-6).all()
@@ -0,0 +1,289 @@
+"""Versioned JSON API on the Flask server behind the Dash app.
+
+Endpoints under ``API_PREFIX`` (default ``/api/v1``):
+
+``GET /sectors``                               sectors (``?geometry=1`` adds GeoJSON polygons)
+``GET /sectors/<id>/demand``                   flights per 20-minute interval
+``GET /sectors/<id>/trajectories``             trajectories as a GeoJSON FeatureCollection
+``GET /airports/<code>/demand``                demand in the airport cylinder, with departures/arrivals
+``GET /flights/<id>``                          all trajectories of one flight, full resolution
+``GET /sectors/<id>/export/<kind>.<fmt>``      streamed download (see :mod:`utils.export`)
+
+Windows are given as ``start``/``end`` (ISO-8601 UTC); ``fl_min``/``fl_max``
+(feet) apply the flight-level filter. Every JSON response body is kept in the
+shared cache with its ETag, Last-Modified time and a gzip copy, so a client
+revalidating with ``If-None-Match``/``If-Modified-Since`` gets a 304 without
+the query being run again; exports are streamed and never cached.
+"""
+
+from __future__ import annotations
+
+import functools
+import gzip
+import hashlib
+import json
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+import numpy as np
+import shapely
+
+from utils.cache import CACHE_ENABLED, make_key, shared_cache
+from utils.datasource import get_datasource
+from utils.demand import REPORT_TOL_DEG, demand_table
+from utils.metrics import API_REQUESTS
+from utils.places import area_trajectories, place_area, place_catalog
+from utils.time import parse_utc
+
+API_ENABLED = os.getenv("API_ENABLED", "True").lower() == "true"
+API_PREFIX = os.getenv("API_PREFIX", "/api/v1")
+API_CACHE_TTL_S = float(os.getenv("API_CACHE_TTL_S", "120"))
+API_GZIP = os.getenv("API_GZIP", "True").lower() == "true"
+API_GZIP_MIN_BYTES = int(os.getenv("API_GZIP_MIN_BYTES", "1024"))
+API_MAX_ROWS = int(os.getenv("API_MAX_ROWS", "20000"))  # cap for /trajectories
+
+# Trajectory fields exposed as GeoJSON properties
+FEATURE_PROPERTIES = [
+    "TrajectoryId", "FlightId", "Callsign", "AirportDeparture", "AirportArrival", "AircraftType",
+    "WakeTurbulanceCategory", "FlightRule", "StartTime", "EndTime", "AltitudeFt", "SpeedKn",
+]
+
+
+class ApiError(ValueError):
+    """Bad request parameters; rendered as ``{"error": ...}`` with ``status``."""
+
+    def __init__(self, message: str, status: int = 400):
+        super().__init__(message)
+        self.status = status
+
+
+# =============================
+# Parameters
+# =============================
+def _window(args):
+    try:
+        start, end = parse_utc(args["start"]), parse_utc(args["end"])
+    except KeyError as exc:
+        raise ApiError(f"missing parameter {exc.args[0]!r}") from None
+    except ValueError as exc:
+        raise ApiError(f"bad timestamp: {exc}") from None
+    if end <= start:
+        raise ApiError("end must be after start")
+    return start, end
+
+
+def _fl_range(args):
+    if "fl_min" not in args and "fl_max" not in args:
+        return None
+    return _int(args, "fl_min", 0), _int(args, "fl_max", 99999)
+
+
+def _int(args, name, default):
+    try:
+        return int(args.get(name, default))
+    except ValueError:
+        raise ApiError(f"{name} must be an integer") from None
+
+
+def _float(args, name, default):
+    try:
+        return float(args.get(name, default))
+    except ValueError:
+        raise ApiError(f"{name} must be a number") from None
+
+
+# =============================
+# Payloads
+# =============================
+def _json_value(v):
+    if v is None or isinstance(v, (str, bool, int, float)):
+        return None if isinstance(v, float) and v != v else v
+    if isinstance(v, np.generic):
+        return _json_value(v.item())
+    if hasattr(v, "isoformat"):
+        return None if str(v) == "NaT" else v.isoformat()
+    return str(v)
+
+
+def features(df):
+    """GeoJSON Feature text of each trajectory row (geometry serialised by GEOS)."""
+    geoms = shapely.to_geojson(shapely.from_wkt(df["WKT"].to_numpy(), on_invalid="ignore")) if len(df) else []
+    cols = [c for c in FEATURE_PROPERTIES if c in df]
+    rows = df[cols].itertuples(index=False, name=None)
+    return (
+        '{"type":"Feature","geometry":' + (g or "null") + ',"properties":'
+        + json.dumps(dict(zip(cols, map(_json_value, row))), separators=(",", ":")) + "}"
+        for g, row in zip(geoms, rows)
+    )
+
+
+def feature_collection(df) -> str:
+    """Trajectory frame -> GeoJSON FeatureCollection text."""
+    return '{"type":"FeatureCollection","features":[' + ",".join(features(df)) + "]}"
+
+
+def demand_payload(area: dict, df, start, end, airport=None) -> dict:
+    table = demand_table(df, start, end, airport=airport)
+    bins = [{k.lower() if k != "IntervalStart" else "start": _json_value(v) for k, v in row.items()}
+            for row in table.to_dict(orient="records")]
+    return {**area, "start": start.isoformat(), "end": end.isoformat(), "interval_minutes": 20,
+            "trajectories": len(df), "flights": int(table["Flights"].sum()), "bins": bins}
+
+
+# =============================
+# Conditional GET + response cache
+# =============================
+def _entry(body: str | bytes) -> dict:
+    data = body.encode("utf-8") if isinstance(body, str) else body
+    return {
+        "etag": '"' + hashlib.sha1(data).hexdigest()[:20] + '"',
+        "modified": time.time(),
+        "body": data,
+        "gzip": gzip.compress(data, 5) if API_GZIP and len(data) >= API_GZIP_MIN_BYTES else None,
+    }
+
+
+def _not_modified(entry: dict, request) -> bool:
+    tags = request.headers.get("If-None-Match")
+    if tags:
+        tags = {t.strip().removeprefix("W/") for t in tags.split(",")}
+        return "*" in tags or entry["etag"] in tags
+    since = request.headers.get("If-Modified-Since")
+    if since:
+        try:
+            return int(entry["modified"]) <= parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def conditional(view):
+    """Serve ``view``'s JSON (dict or pre-serialised text) with ETag/304 and an optional gzip copy."""
+
+    @functools.wraps(view)
+    def wrapper(**kwargs):
+        from flask import Response, request
+
+        def compute():
+            out = view(**kwargs)
+            return _entry(out if isinstance(out, str) else json.dumps(out, separators=(",", ":")))
+
+        try:
+            if CACHE_ENABLED and API_CACHE_TTL_S > 0:
+                key = make_key("api", request.path, sorted(request.args.items(multi=True)))
+                entry = shared_cache().get_or_compute(key, compute, API_CACHE_TTL_S)
+            else:
+                entry = compute()
+        except ApiError as exc:
+            API_REQUESTS.inc(view.__name__, str(exc.status))
+            return Response(json.dumps({"error": str(exc)}), status=exc.status, mimetype="application/json")
+
+        headers = {
+            "ETag": entry["etag"],
+            "Last-Modified": formatdate(entry["modified"], usegmt=True),
+            "Cache-Control": "no-cache",  # always revalidate; 304s are cheap
+            "Vary": "Accept-Encoding",
+        }
+        if _not_modified(entry, request):
+            API_REQUESTS.inc(view.__name__, "304")
+            return Response(status=304, headers=headers)
+        body = entry["body"]
+        if entry["gzip"] is not None and "gzip" in request.headers.get("Accept-Encoding", ""):
+            body, headers["Content-Encoding"] = entry["gzip"], "gzip"
+        API_REQUESTS.inc(view.__name__, "200")
+        return Response(body, status=200, headers=headers, mimetype="application/json")
+
+    return wrapper
+
+
+# =============================
+# Routes
+# =============================
+@conditional
+def sectors():
+    from flask import request
+
+    from utils.geometry import polygon_wkt_to_geojson_feature
+
+    df = get_datasource().list_sectors()
+    if request.args.get("geometry") in ("1", "true"):
+        return {"type": "FeatureCollection", "features": [
+            polygon_wkt_to_geojson_feature(name=str(r.Name), wkt=str(r.WKT), props={
+                "id": int(r.Id), "lower_ft": int(r.LowerLimitFt), "upper_ft": int(r.UpperLimitFt)})
+            for r in df.itertuples(index=False)
+        ]}
+    return {"sectors": [{"id": int(r.Id), "name": str(r.Name), "lower_ft": int(r.LowerLimitFt),
+                         "upper_ft": int(r.UpperLimitFt)} for r in df.itertuples(index=False)]}
+
+
+def _sector(source, sector_id):
+    row = source.get_sector(sector_id)
+    if row is None:
+        raise ApiError(f"unknown sector {sector_id}", 404)
+    return {"sector": {"id": int(row["Id"]), "name": str(row["Name"])}}
+
+
+@conditional
+def sector_demand(sector_id: int):
+    from flask import request
+
+    source = get_datasource()
+    area = _sector(source, sector_id)
+    start, end = _window(request.args)
+    df = source.trajectories(sector_id, start, end, fl_range=_fl_range(request.args), max_rows=2**31 - 1,
+                             tol_deg=REPORT_TOL_DEG)
+    return demand_payload(area, df, start, end)
+
+
+@conditional
+def sector_trajectories(sector_id: int):
+    from flask import request
+
+    source = get_datasource()
+    _sector(source, sector_id)
+    start, end = _window(request.args)
+    max_rows = min(_int(request.args, "max_rows", API_MAX_ROWS), API_MAX_ROWS)
+    df = source.trajectories(sector_id, start, end, fl_range=_fl_range(request.args), max_rows=max_rows,
+                             tol_deg=_float(request.args, "tol_deg", 0.0))
+    return feature_collection(df)
+
+
+@conditional
+def airport_demand(code: str):
+    from flask import request
+
+    place = place_catalog().get("airport", code)
+    if place is None:
+        raise ApiError(f"unknown airport {code}", 404)
+    start, end = _window(request.args)
+    radius = _float(request.args, "radius_nm", 0) or None
+    area = place_area(place, radius, _fl_range(request.args))
+    df = area_trajectories(get_datasource(), area, start, end, max_rows=2**31 - 1, tol_deg=REPORT_TOL_DEG)
+    payload = {"airport": {"code": place.code, "name": place.name, "radius_nm": area.radius_nm,
+                           "min_ft": area.min_ft, "max_ft": area.max_ft}}
+    return demand_payload(payload, df, start, end, airport=place.code)
+
+
+@conditional
+def flight(flight_id: int):
+    df = get_datasource().flight_detail(flight_id)
+    if df.empty:
+        raise ApiError(f"unknown flight {flight_id}", 404)
+    return feature_collection(df)
+
+
+def register_api(app, prefix: str = API_PREFIX) -> None:
+    """Mount the API blueprint on the Dash app's Flask server."""
+    from flask import Blueprint
+
+    from utils.export import sector_export
+
+    bp = Blueprint("api_v1", __name__, url_prefix=prefix)
+    bp.add_url_rule("/sectors", view_func=sectors)
+    bp.add_url_rule("/sectors/<int:sector_id>/demand", view_func=sector_demand)
+    bp.add_url_rule("/sectors/<int:sector_id>/trajectories", view_func=sector_trajectories)
+    bp.add_url_rule("/airports/<code>/demand", view_func=airport_demand)
+    bp.add_url_rule("/flights/<int:flight_id>", view_func=flight)
+    bp.add_url_rule("/sectors/<int:sector_id>/export/<kind>.<fmt>", view_func=sector_export)
+    app.server.register_blueprint(bp)
@@ -0,0 +1,235 @@
+"""Two-tier cache shared by every worker process on a host.
+
+Tier 1 is a small per-process LRU of live objects, bounded by item count and
+by their estimated size (``MEM_GLOBAL_MB``, see :mod:`utils.memory`); tier 2 is a SQLite file
+(WAL mode) holding pickled, zlib-compressed values that all gunicorn workers
+read and write. :meth:`SharedCache.get_or_compute` adds a cross-process lease
+so N workers missing the same key run the expensive computation once.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Any, Callable
+
+from utils.memory import MEM_GLOBAL_MB, estimate_bytes
+from utils.metrics import CACHE_LOCAL_EVICTIONS, CACHE_REQUESTS
+
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "True").lower() == "true"
+CACHE_PATH = os.getenv("CACHE_PATH", "cache/atfas-cache.sqlite")
+CACHE_MAX_MB = float(os.getenv("CACHE_MAX_MB", "512"))
+CACHE_LOCAL_ITEMS = int(os.getenv("CACHE_LOCAL_ITEMS", "32"))
+CACHE_TTL_S = float(os.getenv("CACHE_TTL_S", "120"))          # trajectory query results
+CACHE_SECTOR_TTL_S = float(os.getenv("CACHE_SECTOR_TTL_S", "3600"))  # sector list/geometry
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache (key TEXT PRIMARY KEY, expires REAL NOT NULL, size INTEGER NOT NULL,
+                                  value BLOB NOT NULL);
+CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires);
+CREATE TABLE IF NOT EXISTS lease (key TEXT PRIMARY KEY, owner TEXT NOT NULL, expires REAL NOT NULL);
+"""
+
+_MISSING = object()
+
+
+def make_key(namespace: str, *parts: Any) -> str:
+    """Stable cache key from a namespace and ``repr``-able parts."""
+    digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+class SharedCache:
+    """Per-process LRU in front of a host-wide SQLite store."""
+
+    def __init__(self, path: str = CACHE_PATH, max_bytes: int = int(CACHE_MAX_MB * 2**20),
+                 local_items: int = CACHE_LOCAL_ITEMS, local_max_bytes: int = int(MEM_GLOBAL_MB * 2**20)):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.local_items = local_items
+        self.local_max_bytes = local_max_bytes
+        self._local: OrderedDict[str, tuple[float, Any, int]] = OrderedDict()
+        self._local_bytes = 0
+        self._lock = threading.Lock()
+        self._tls = threading.local()
+        self._written = 0  # bytes stored since the last _evict
+
+    # -- storage ----------------------------------------------------------
+    def _db(self) -> sqlite3.Connection:
+        """Connection for this thread, reopened after ``fork`` (pid changes)."""
+        conn = getattr(self._tls, "conn", None)
+        if conn is None or self._tls.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._tls.conn, self._tls.pid = conn, os.getpid()
+        return conn
+
+    def _local_get(self, key: str):
+        with self._lock:
+            hit = self._local.get(key)
+            if hit is None:
+                return _MISSING
+            expires, value, size = hit
+            if expires < time.time():
+                del self._local[key]
+                self._local_bytes -= size
+                return _MISSING
+            self._local.move_to_end(key)
+            return value
+
+    def _local_set(self, key: str, value: Any, expires: float) -> None:
+        size = estimate_bytes(value)
+        with self._lock:
+            old = self._local.pop(key, None)
+            self._local_bytes += size - (old[2] if old else 0)
+            self._local[key] = (expires, value, size)
+            # Least recently used out first; the newest entry always stays
+            while len(self._local) > 1:
+                if len(self._local) > self.local_items:
+                    limit = "items"
+                elif self.local_max_bytes and self._local_bytes > self.local_max_bytes:
+                    limit = "bytes"
+                else:
+                    break
+                evicted, (_expires, _value, evicted_size) = self._local.popitem(last=False)
+                self._local_bytes -= evicted_size
+                CACHE_LOCAL_EVICTIONS.inc(evicted.split(":", 1)[0], limit)
+
+    def local_usage(self) -> dict:
+        """Decoded entries held by this process: count, estimated bytes and their split by namespace."""
+        with self._lock:
+            by_namespace: dict[str, int] = {}
+            for key, (_expires, _value, size) in self._local.items():
+                namespace = key.split(":", 1)[0]
+                by_namespace[namespace] = by_namespace.get(namespace, 0) + size
+            return {"items": len(self._local), "bytes": self._local_bytes,
+                    "max_items": self.local_items, "max_bytes": self.local_max_bytes, "by_namespace": by_namespace}
+
+    # -- public API -------------------------------------------------------
+    def get(self, key: str, default: Any = None, local: bool = True) -> Any:
+        """Cached value or ``default``; ``local=False`` skips tier 1 (values other workers update)."""
+        namespace = key.split(":", 1)[0]
+        value = self._local_get(key) if local else _MISSING
+        if value is not _MISSING:
+            CACHE_REQUESTS.inc(namespace, "local_hit")
+            return value
+        row = self._db().execute("SELECT expires, value FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[0] < time.time():
+            CACHE_REQUESTS.inc(namespace, "miss")
+            return default
+        value = pickle.loads(zlib.decompress(row[1]))
+        if local:
+            self._local_set(key, value, row[0])
+        CACHE_REQUESTS.inc(namespace, "shared_hit")
+        return value
+
+    def set(self, key: str, value: Any, ttl: float, local: bool = True) -> None:
+        expires = time.time() + ttl
+        blob = zlib.compress(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), 1)
+        if local:
+            self._local_set(key, value, expires)
+        db = self._db()
+        db.execute("INSERT OR REPLACE INTO cache (key, expires, size, value) VALUES (?, ?, ?, ?)",
+                   (key, expires, len(blob), blob))
+        # The size check scans the table: run it once per 1/64 of the budget written, not per set
+        self._written += len(blob)
+        if self._written >= self.max_bytes // 64:
+            self._written = 0
+            self._evict(db)
+
+    def contains(self, key: str) -> bool:
+        """Whether tier 2 holds an unexpired ``key`` (no value decoded, no metrics)."""
+        row = self._db().execute("SELECT 1 FROM cache WHERE key = ? AND expires >= ?", (key, time.time())).fetchone()
+        return row is not None
+
+    def pop(self, key: str, default: Any = None) -> Any:
+        """Remove ``key`` and return its value; only one caller across processes gets it."""
+        with self._lock:
+            hit = self._local.pop(key, None)
+            if hit is not None:
+                self._local_bytes -= hit[2]
+        db = self._db()
+        row = db.execute("SELECT expires, value FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or not db.execute("DELETE FROM cache WHERE key = ?", (key,)).rowcount:
+            return default
+        return pickle.loads(zlib.decompress(row[1])) if row[0] >= time.time() else default
+
+    def _evict(self, db: sqlite3.Connection) -> None:
+        db.execute("DELETE FROM cache WHERE expires < ?", (time.time(),))
+        total = db.execute("SELECT COALESCE(SUM(size), 0) FROM cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Drop the entries closest to expiry until we are under budget.
+        freed = 0
+        for key, size in db.execute("SELECT key, size FROM cache ORDER BY expires").fetchall():
+            db.execute("DELETE FROM cache WHERE key = ?", (key,))
+            freed += size
+            if total - freed <= self.max_bytes:
+                break
+
+    def get_or_compute(self, key: str, compute: Callable[[], Any], ttl: float, lease_s: float = 120.0) -> Any:
+        """Return the cached value or compute it once across all processes.
+
+        The first process to miss takes a lease on ``key`` and runs
+        ``compute``; others poll for the value until the lease expires, after
+        which they compute it themselves.
+        """
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+        deadline = time.time() + lease_s
+        while True:
+            if self.try_lease(key, lease_s):
+                try:
+                    value = compute()
+                    self.set(key, value, ttl)
+                    return value
+                finally:
+                    self.release(key)
+            time.sleep(0.05)
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                return value
+            if time.time() > deadline:
+                return compute()
+
+    def try_lease(self, key: str, lease_s: float) -> bool:
+        """Take the cross-process lease on ``key`` unless another holder's is still valid."""
+        db = self._db()
+        now = time.time()
+        db.execute("DELETE FROM lease WHERE key = ? AND expires < ?", (key, now))
+        return bool(db.execute("INSERT OR IGNORE INTO lease (key, owner, expires) VALUES (?, ?, ?)",
+                               (key, self._owner(), now + lease_s)).rowcount)
+
+    def release(self, key: str) -> None:
+        self._db().execute("DELETE FROM lease WHERE key = ? AND owner = ?", (key, self._owner()))
+
+    @staticmethod
+    def _owner() -> str:
+        return f"{os.getpid()}:{threading.get_ident()}"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._local.clear()
+            self._local_bytes = 0
+        self._db().execute("DELETE FROM cache")
+
+
+_shared: SharedCache | None = None
+
+
+def shared_cache() -> SharedCache:
+    """Process-wide :class:`SharedCache` configured from the environment."""
+    global _shared
+    if _shared is None:
+        _shared = SharedCache()
+    return _shared
@@ -0,0 +1,302 @@
+"""Local columnar backend: memory-mapped NumPy files with a spatial index.
+
+A dataset is a directory holding ``manifest.json``, ``sectors.json`` and one
+``.npy`` file per column. Per-trajectory columns have one entry per row;
+vertex data (``lon``/``lat``) and the per-vertex profiles (``alt``, ``spd``,
+``hdg``) are flat arrays addressed through ``*_offsets`` arrays of length
+``n + 1``. String columns are stored as ``int32`` category codes (``-1`` is
+null) with the categories in the manifest, timestamps as ``datetime64[ms]``.
+Everything is opened with ``np.load(mmap_mode="r")`` so opening is O(1) and
+only the pages a query touches are read.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from utils.datasource import SECTOR_COLUMNS, TRAJ_COLUMNS, DataSource
+
+FORMAT = "atfas-columnar"
+FORMAT_VERSION = 1
+
+# Per-vertex CSV columns and the array names they are stored under.
+PROFILES = {"AltitudeFt": "alt", "SpeedKn": "spd", "Heading": "hdg"}
+_INT_NULL = np.iinfo(np.int32).min
+
+
+def _ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenate ``arange(s, s + n)`` for every pair without a Python loop."""
+    total = int(lengths.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.int64)
+    owner = np.repeat(np.arange(len(lengths)), lengths)
+    first = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return starts[owner] + (np.arange(total) - first)
+
+
+def _parse_profile(values: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """Split CSV strings into a flat ``int32`` array plus offsets."""
+    parts = values.fillna("").astype(str).str.split(",")
+    lengths = parts.map(lambda p: 0 if p == [""] else len(p)).to_numpy(dtype=np.int64)
+    flat = [tok for p in parts if p != [""] for tok in p]
+    try:
+        arr = np.array(flat, dtype=np.float64)
+    except ValueError:  # empty or non-numeric tokens: slow, tolerant path
+        arr = pd.to_numeric(pd.Series(flat, dtype=object), errors="coerce").to_numpy(dtype=np.float64)
+    out = np.where(np.isnan(arr), _INT_NULL, arr).astype(np.int32)
+    return out, np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+
+
+def _format_profile(values: np.ndarray, offsets: np.ndarray, idx: np.ndarray) -> list[str | None]:
+    """Inverse of :func:`_parse_profile` for the rows in ``idx``."""
+    starts = np.asarray(offsets[idx])
+    lengths = np.asarray(offsets[idx + 1]) - starts
+    flat = np.asarray(values[_ranges(starts, lengths)])
+    text = list(map(str, flat.tolist()))
+    for i in np.flatnonzero(flat == _INT_NULL):
+        text[i] = ""
+    bounds = np.concatenate([[0], np.cumsum(lengths)]).tolist()
+    return [",".join(text[a:b]) if b > a else None for a, b in zip(bounds[:-1], bounds[1:])]
+
+
+def write_columnar(path: str | os.PathLike, sectors: pd.DataFrame, trajectories: pd.DataFrame,
+                   meta: dict | None = None) -> Path:
+    """Write ``sectors``/``trajectories`` frames as a columnar dataset.
+
+    ``trajectories`` must have the :data:`utils.datasource.TRAJ_COLUMNS`
+    layout with full-resolution ``WKT``. The dataset is assembled in a
+    temporary sibling directory and renamed into place, so readers never see
+    a half-written dataset. Returns the final path.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=f".{path.name}.", dir=path.parent))
+    try:
+        df = trajectories.reset_index(drop=True)
+        columns: dict[str, str] = {}
+        categories: dict[str, list] = {}
+
+        geoms = shapely.from_wkt(df["WKT"].to_numpy(), on_invalid="ignore")
+        coords, owner = shapely.get_coordinates(geoms, return_index=True)
+        counts = np.bincount(owner, minlength=len(df)).astype(np.int64)
+        np.save(tmp / "lon.npy", coords[:, 0].astype(np.float64))
+        np.save(tmp / "lat.npy", coords[:, 1].astype(np.float64))
+        np.save(tmp / "vtx_offsets.npy", np.concatenate([[0], np.cumsum(counts)]).astype(np.int64))
+        bounds = shapely.bounds(geoms)
+        np.save(tmp / "bbox.npy", np.nan_to_num(bounds, nan=0.0))
+
+        for col, key in PROFILES.items():
+            values, offsets = _parse_profile(df[col] if col in df else pd.Series([None] * len(df)))
+            np.save(tmp / f"{key}.npy", values)
+            np.save(tmp / f"{key}_offsets.npy", offsets)
+
+        for col in TRAJ_COLUMNS:
+            if col in PROFILES or col == "WKT":
+                continue
+            s = df[col] if col in df else pd.Series([None] * len(df))
+            if pd.api.types.is_datetime64_any_dtype(s) or col in ("StartTime", "EndTime"):
+                arr = pd.to_datetime(s).to_numpy(dtype="datetime64[ms]")
+                columns[col] = "time"
+            elif pd.api.types.is_numeric_dtype(s) and not pd.api.types.is_bool_dtype(s):
+                arr = s.to_numpy(dtype=np.float64, na_value=np.nan)
+                if not np.isnan(arr).any() and np.array_equal(arr, np.round(arr)):
+                    arr = arr.astype(np.int64)
+                columns[col] = "number"
+            else:
+                codes, cats = pd.factorize(s, use_na_sentinel=True)
+                arr = codes.astype(np.int32)
+                categories[col] = [str(c) for c in cats]
+                columns[col] = "category"
+            np.save(tmp / f"{col}.npy", arr)
+
+        secs = sectors[SECTOR_COLUMNS].copy()
+        (tmp / "sectors.json").write_text(json.dumps(secs.to_dict(orient="records"), default=str))
+        manifest = {
+            "format": FORMAT,
+            "version": FORMAT_VERSION,
+            "created_utc": datetime.now(timezone.utc).isoformat(),
+            "n_trajectories": int(len(df)),
+            "n_vertices": int(len(coords)),
+            "columns": columns,
+            "categories": categories,
+            "meta": meta or {},
+        }
+        (tmp / "manifest.json").write_text(json.dumps(manifest, indent=1))
+
+        if path.exists():
+            shutil.rmtree(path)
+        os.replace(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+    return path
+
+
+class ColumnarDataSource(DataSource):
+    """Serve :class:`~utils.datasource.DataSource` queries from a columnar dataset.
+
+    The sector query runs on an ``STRtree`` of trajectory bounding boxes,
+    followed by vectorized time/flight-level masks and an exact
+    ``shapely.intersects`` on the surviving candidates only.
+    """
+
+    name = "columnar"
+
+    def __init__(self, path: str | os.PathLike):
+        self.path = Path(path)
+        manifest = json.loads((self.path / "manifest.json").read_text())
+        if manifest.get("format") != FORMAT:
+            raise ValueError(f"{self.path} is not an {FORMAT} dataset")
+        if int(manifest.get("version", 0)) > FORMAT_VERSION:
+            raise ValueError(f"{self.path} uses format v{manifest['version']}; this build reads v{FORMAT_VERSION}")
+        self.manifest = manifest
+        self.n = int(manifest["n_trajectories"])
+        self._cols: dict[str, np.ndarray] = {}
+
+        sectors = pd.DataFrame(json.loads((self.path / "sectors.json").read_text()), columns=SECTOR_COLUMNS)
+        self._sectors = sectors.sort_values("Name", ignore_index=True)
+        self._sector_geoms = dict(zip(self._sectors["Id"].astype(int), shapely.from_wkt(self._sectors["WKT"])))
+
+        self.lon = self._load("lon")
+        self.lat = self._load("lat")
+        self.vtx_offsets = self._load("vtx_offsets")
+        bbox = np.asarray(self._load("bbox"))
+        self._tree = shapely.STRtree(shapely.box(bbox[:, 0], bbox[:, 1], bbox[:, 2], bbox[:, 3]))
+        self.start = self._load("StartTime")
+        self.end = self._load("EndTime")
+
+    def _load(self, name: str) -> np.ndarray:
+        if name not in self._cols:
+            self._cols[name] = np.load(self.path / f"{name}.npy", mmap_mode="r")
+        return self._cols[name]
+
+    # -- geometry helpers -------------------------------------------------
+    def coords(self, idx: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Stacked ``(lon, lat)`` vertices of rows ``idx`` and their row lengths."""
+        starts = np.asarray(self.vtx_offsets[idx])
+        lengths = np.asarray(self.vtx_offsets[idx + 1]) - starts
+        pos = _ranges(starts, lengths)
+        return np.column_stack([self.lon[pos], self.lat[pos]]), lengths
+
+    def geometries(self, idx: np.ndarray) -> np.ndarray:
+        """Shapely geometries for rows ``idx`` (points for single-vertex rows)."""
+        xy, lengths = self.coords(idx)
+        out = np.empty(len(idx), dtype=object)
+        row = np.repeat(np.arange(len(idx)), lengths)
+        line_rows = lengths >= 2
+        if line_rows.any():
+            mask = line_rows[row]
+            line_no = np.cumsum(line_rows) - 1
+            out[line_rows] = shapely.linestrings(xy[mask], indices=line_no[row[mask]])
+        point_rows = lengths == 1
+        if point_rows.any():
+            out[point_rows] = shapely.points(xy[point_rows[row]])
+        out[lengths == 0] = None
+        return out
+
+    def _fl_mask(self, idx: np.ndarray, min_ft: int, max_ft: int) -> np.ndarray:
+        alt = self._load("alt")
+        offsets = self._load("alt_offsets")
+        starts = np.asarray(offsets[idx])
+        lengths = np.asarray(offsets[idx + 1]) - starts
+        vals = alt[_ranges(starts, lengths)]
+        hit = (vals >= min_ft) & (vals <= max_ft) & (vals != _INT_NULL)
+        owner = np.repeat(np.arange(len(idx)), lengths)
+        return np.bincount(owner[hit], minlength=len(idx)) > 0
+
+    # -- DataSource -------------------------------------------------------
+    def list_sectors(self) -> pd.DataFrame:
+        return self._sectors.copy()
+
+    def get_sector(self, sector_id: int) -> pd.Series | None:
+        rows = self._sectors[self._sectors["Id"] == int(sector_id)]
+        return None if rows.empty else rows.iloc[0]
+
+    def _candidates(self, sector, start, end, fl_range=None) -> np.ndarray:
+        """Rows whose bounding box meets ``sector`` within the window and FL band, ordered by start."""
+        idx = np.sort(self._tree.query(sector))
+        t0 = np.datetime64(pd.Timestamp(start).to_datetime64(), "ms")
+        t1 = np.datetime64(pd.Timestamp(end).to_datetime64(), "ms")
+        idx = idx[(self.start[idx] < t1) & (self.end[idx] >= t0)]
+        if fl_range and len(idx):
+            idx = idx[self._fl_mask(idx, int(fl_range[0]), int(fl_range[1]))]
+        return idx[np.argsort(self.start[idx], kind="stable")]
+
+    def trajectories(self, sector_id, start, end, fl_range=None, max_rows=2000, tol_deg=0.0):
+        sector = self._sector_geoms.get(int(sector_id))
+        if sector is None or self.n == 0:
+            return pd.DataFrame(columns=TRAJ_COLUMNS)
+        idx = self._candidates(sector, start, end, fl_range)
+        geoms = self.geometries(idx)
+        hit = shapely.intersects(geoms, sector)
+        idx, geoms = idx[hit][: int(max_rows)], geoms[hit][: int(max_rows)]
+        return self.frame(idx, tol_deg=tol_deg, geoms=geoms)
+
+    def iter_trajectories(self, sector_id, start, end, fl_range=None, tol_deg=0.0, chunk_rows=5000):
+        sector = self._sector_geoms.get(int(sector_id))
+        if sector is None or self.n == 0:
+            return
+        idx = self._candidates(sector, start, end, fl_range)
+        for i in range(0, len(idx), chunk_rows):
+            part = idx[i:i + chunk_rows]
+            geoms = self.geometries(part)
+            hit = shapely.intersects(geoms, sector)
+            if hit.any():
+                yield self.frame(part[hit], tol_deg=tol_deg, geoms=geoms[hit])
+
+    def flight_detail(self, flight_id: int) -> pd.DataFrame:
+        idx = np.flatnonzero(np.asarray(self._load("FlightId")) == int(flight_id))
+        idx = idx[np.argsort(self.start[idx], kind="stable")]
+        return self.frame(idx)
+
+    def window_trajectories(self, start: datetime, end: datetime, bbox=None) -> pd.DataFrame:
+        """Every trajectory overlapping ``[start, end)``, or crossing ``bbox``, full-resolution geometry."""
+        if bbox is not None:
+            box = shapely.box(*bbox)
+            idx = self._candidates(box, start, end)
+            geoms = self.geometries(idx)
+            hit = shapely.intersects(geoms, box)
+            return self.frame(idx[hit], geoms=geoms[hit])
+        t0 = np.datetime64(pd.Timestamp(start).to_datetime64(), "ms")
+        t1 = np.datetime64(pd.Timestamp(end).to_datetime64(), "ms")
+        idx = np.flatnonzero((np.asarray(self.start) < t1) & (np.asarray(self.end) >= t0))
+        return self.frame(idx[np.argsort(self.start[idx], kind="stable")])
+
+    def frame(self, idx: np.ndarray, tol_deg: float = 0.0, geoms: np.ndarray | None = None) -> pd.DataFrame:
+        """Materialise rows ``idx`` as a :data:`TRAJ_COLUMNS` frame.
+
+        ``geoms`` may pass already-built geometries for ``idx`` to skip
+        rebuilding them from the vertex arrays.
+        """
+        idx = np.asarray(idx, dtype=np.int64)
+        data: dict[str, object] = {}
+        kinds = self.manifest["columns"]
+        for col in TRAJ_COLUMNS:
+            if col == "WKT":
+                if geoms is None:
+                    geoms = self.geometries(idx)
+                if tol_deg and len(geoms):
+                    geoms = shapely.simplify(geoms, float(tol_deg), preserve_topology=False)
+                data[col] = shapely.to_wkt(geoms, rounding_precision=6) if len(geoms) else []
+            elif col in PROFILES:
+                key = PROFILES[col]
+                data[col] = _format_profile(self._load(key), self._load(f"{key}_offsets"), idx)
+            elif kinds.get(col) == "category":
+                codes = np.asarray(self._load(col)[idx])
+                cats = np.array(self.manifest["categories"][col] + [None], dtype=object)
+                data[col] = cats[np.where(codes < 0, len(cats) - 1, codes)]
+            elif col in kinds:
+                arr = np.asarray(self._load(col)[idx])
+                data[col] = pd.to_datetime(arr) if kinds[col] == "time" else arr
+            else:
+                data[col] = [None] * len(idx)
+        return pd.DataFrame(data, columns=TRAJ_COLUMNS)
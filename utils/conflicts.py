@@ -0,0 +1,203 @@
+"""Loss-of-separation detection over the loaded trajectories.
+
+Every trajectory row is resampled onto a common clock (``CONFLICT_STEP_S``),
+with its vertices timed evenly between StartTime and EndTime as the map
+animation does. Samples are hashed into (time, lat, lon, altitude) buckets
+one separation minimum in size, so two aircraft closer than the minima can
+only share a bucket or sit in neighbouring ones; only those candidates get
+the exact haversine/vertical check. Work grows with the number of samples,
+not with the number of flight pairs. Time slices are independent, so large
+windows can be split over a process pool (``CONFLICT_WORKERS``).
+"""
+
+from __future__ import annotations
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from utils.columnar import _parse_profile, _ranges
+from utils.places import haversine_nm
+
+CONFLICT_H_NM = float(os.getenv("CONFLICT_H_NM", "5"))
+CONFLICT_V_FT = float(os.getenv("CONFLICT_V_FT", "1000"))
+CONFLICT_STEP_S = float(os.getenv("CONFLICT_STEP_S", "10"))
+CONFLICT_FLOOR_FT = float(os.getenv("CONFLICT_FLOOR_FT", "1000"))  # ignore samples below (ground, final approach)
+CONFLICT_WORKERS = int(os.getenv("CONFLICT_WORKERS", "0"))  # 0 = run in the calling process
+CONFLICT_CHUNK = int(os.getenv("CONFLICT_CHUNK", "250000"))  # samples per time slice / pool task
+
+CONFLICT_COLUMNS = ["FlightA", "FlightB", "CallsignA", "CallsignB", "Start", "End", "DurationS",
+                    "MinDistNm", "VertFt", "ClosestTime", "Lat", "Lon"]
+
+# Neighbouring buckets (dy, dx, dz) in one half-space; (0, 0, 0) is handled separately
+_OFFSETS = [(dy, dx, dz) for dy in (-1, 0, 1) for dx in (-1, 0, 1) for dz in (-1, 0, 1) if (dy, dx, dz) > (0, 0, 0)]
+
+
+def resample(records: list[dict], step_s: float = CONFLICT_STEP_S) -> dict[str, np.ndarray]:
+    """Positions of every row at the multiples of ``step_s`` it spans.
+
+    Returns flat arrays ``k`` (time index), ``lat``, ``lon``, ``alt`` and
+    ``fid``. Altitude profiles that do not line up with the (simplified)
+    geometry are stretched over its vertices.
+    """
+    df = pd.DataFrame.from_records(records or [], columns=["FlightId", "StartTime", "EndTime", "WKT", "AltitudeFt"])
+    df = df[df["StartTime"].notna() & df["EndTime"].notna() & df["WKT"].notna()].reset_index(drop=True)
+    empty = {name: np.empty(0) for name in ("k", "lat", "lon", "alt", "fid")}
+    if df.empty:
+        return empty
+    geoms = shapely.from_wkt(df["WKT"].to_numpy(), on_invalid="ignore")
+    coords, owner = shapely.get_coordinates(geoms, return_index=True)
+    n = np.bincount(owner, minlength=len(df))
+    first = np.concatenate([[0], np.cumsum(n)])[:-1]
+    frac = (np.arange(len(coords)) - first[owner]) / np.maximum(n - 1, 1)[owner]
+
+    # Vertex altitude: linear position along the row's profile
+    values, offsets = _parse_profile(df["AltitudeFt"])
+    prof = np.where(values == np.iinfo(np.int32).min, np.nan, values.astype(np.float64))
+    m = np.diff(offsets)
+    has = m[owner] > 0
+    pos = frac * (m[owner] - 1)
+    lo = np.floor(pos).astype(np.int64)
+    hi = np.minimum(lo + 1, m[owner] - 1)
+    alt = np.full(len(coords), np.nan)
+    base = offsets[:-1][owner]
+    w = pos - lo
+    alt[has] = (prof[(base + lo)[has]] * (1 - w[has]) + prof[(base + hi)[has]] * w[has])
+
+    # Vertex times relative to the earliest start; rows are laid end to end on
+    # one axis (row * span) so a single np.interp serves all of them.
+    st = pd.to_datetime(df["StartTime"]).to_numpy(dtype="datetime64[ms]").astype(np.int64) / 1e3
+    en = pd.to_datetime(df["EndTime"]).to_numpy(dtype="datetime64[ms]").astype(np.int64) / 1e3
+    t0 = float(np.floor(st.min() / step_s) * step_s)
+    st, en = st - t0, np.maximum(en - t0, st - t0)
+    span = float(en.max()) + step_s
+    t = st[owner] + frac * (en - st)[owner] + owner * span
+
+    k0 = np.ceil(st / step_s).astype(np.int64)
+    k1 = np.floor(en / step_s).astype(np.int64)
+    count = np.where(n > 0, np.maximum(k1 - k0 + 1, 0), 0)
+    if not count.sum():
+        return empty
+    k = _ranges(k0, count)
+    row = np.repeat(np.arange(len(df)), count)
+    ts = k * step_s + row * span
+    out = {
+        "k": k + int(round(t0 / step_s)),
+        "lat": np.interp(ts, t, coords[:, 1]),
+        "lon": np.interp(ts, t, coords[:, 0]),
+        "alt": np.interp(ts, t, np.nan_to_num(alt, nan=-1e9)),
+        "fid": df["FlightId"].to_numpy(dtype=np.int64)[row],
+    }
+    # Rows without altitude were interpolated against the sentinel: drop them
+    keep = out["alt"] > -1e8
+    return {name: arr[keep] for name, arr in out.items()}
+
+
+def _detect_chunk(k, lat, lon, alt, fid, h_nm, v_ft) -> np.ndarray:
+    """Conflicting sample pairs ``(i, j)`` (indices into the chunk) of one time slice."""
+    if len(k) < 2:
+        return np.empty((0, 2), dtype=np.int64)
+    lat_cell = h_nm / 60.0
+    lon_cell = lat_cell / max(np.cos(np.radians(min(float(np.abs(lat).max()), 89.0))), 1e-6)
+    cells = [k - k.min(),
+             np.floor(lat / lat_cell).astype(np.int64),
+             np.floor(lon / lon_cell).astype(np.int64),
+             np.floor(alt / v_ft).astype(np.int64)]
+    # Mixed-radix key with a margin of one bucket, so +-1 never wraps
+    key = np.zeros(len(k), dtype=np.int64)
+    radix = []
+    for c in cells:
+        c -= c.min() - 1
+        size = int(c.max()) + 2
+        key = key * size + c
+        radix.append(size)
+    order = np.argsort(key, kind="stable")
+    skey = key[order]
+
+    ny, nx, nz = radix[1:]
+    pairs = []
+    for dy, dx, dz in [(0, 0, 0)] + _OFFSETS:
+        target = skey + (dy * nx + dx) * nz + dz
+        lo = np.searchsorted(skey, target, side="left")
+        hi = np.searchsorted(skey, target, side="right")
+        if (dy, dx, dz) == (0, 0, 0):
+            lo = np.maximum(lo, np.arange(len(skey)) + 1)  # each pair once
+        n = np.maximum(hi - lo, 0)
+        if not n.sum():
+            continue
+        i = order[np.repeat(np.arange(len(skey)), n)]
+        j = order[_ranges(lo, n)]
+        ok = (fid[i] != fid[j]) & (np.abs(alt[i] - alt[j]) < v_ft)
+        i, j = i[ok], j[ok]
+        ok = haversine_nm(lat[i], lon[i], lat[j], lon[j]) < h_nm
+        pairs.append(np.column_stack([i[ok], j[ok]]))
+    return np.concatenate(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+
+
+_pool: ProcessPoolExecutor | None = None
+
+
+def _executor(workers: int) -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        # spawn: forking a threaded server worker is not safe
+        _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def detect_conflicts(records: list[dict], h_nm: float = CONFLICT_H_NM, v_ft: float = CONFLICT_V_FT,
+                     step_s: float = CONFLICT_STEP_S, workers: int = CONFLICT_WORKERS) -> pd.DataFrame:
+    """Flight pairs closer than ``h_nm`` and ``v_ft`` at the same time, one row per pair.
+
+    Each row spans the first to last conflicting sample and reports the
+    closest approach (``MinDistNm``, the vertical gap there, time and
+    midpoint). Rows are ordered by ``Start``.
+    """
+    s = resample(records, step_s)
+    keep = s["alt"] >= CONFLICT_FLOOR_FT
+    s = {name: arr[keep] for name, arr in s.items()}
+    order = np.argsort(s["k"], kind="stable")
+    s = {name: arr[order] for name, arr in s.items()}
+    if len(s["k"]) < 2:
+        return pd.DataFrame(columns=CONFLICT_COLUMNS)
+
+    # Slices end on a time-index boundary so no pair straddles two of them
+    cuts = np.unique(np.searchsorted(s["k"], s["k"][::max(CONFLICT_CHUNK, 1)], side="left"))
+    bounds = list(zip(cuts, list(cuts[1:]) + [len(s["k"])]))
+    args = [tuple(s[name][a:b] for name in ("k", "lat", "lon", "alt", "fid")) + (h_nm, v_ft) for a, b in bounds]
+    if workers and len(args) > 1:
+        results = list(_executor(workers).map(_detect_chunk, *zip(*args)))
+    else:
+        results = [_detect_chunk(*a) for a in args]
+    ij = np.concatenate([r + a for r, (a, _b) in zip(results, bounds)]) if results else np.empty((0, 2), np.int64)
+    if not len(ij):
+        return pd.DataFrame(columns=CONFLICT_COLUMNS)
+
+    i, j = ij[:, 0], ij[:, 1]
+    fa, fb = np.minimum(s["fid"][i], s["fid"][j]), np.maximum(s["fid"][i], s["fid"][j])
+    hits = pd.DataFrame({
+        "FlightA": fa, "FlightB": fb, "k": s["k"][i],
+        "dist": haversine_nm(s["lat"][i], s["lon"][i], s["lat"][j], s["lon"][j]),
+        "vert": np.abs(s["alt"][i] - s["alt"][j]),
+        "lat": (s["lat"][i] + s["lat"][j]) / 2, "lon": (s["lon"][i] + s["lon"][j]) / 2,
+    })
+    grouped = hits.groupby(["FlightA", "FlightB"], sort=False)
+    closest = hits.loc[grouped["dist"].idxmin()].set_index(["FlightA", "FlightB"])
+    span = grouped["k"].agg(["min", "max"])
+    callsigns = {r.get("FlightId"): r.get("Callsign") for r in records}
+    out = pd.DataFrame({
+        "Start": pd.to_datetime(span["min"] * step_s, unit="s"),
+        "End": pd.to_datetime(span["max"] * step_s, unit="s"),
+        "DurationS": (span["max"] - span["min"]) * step_s,
+        "MinDistNm": closest["dist"].round(2),
+        "VertFt": np.floor(closest["vert"]),  # stays below the vertical minimum
+        "ClosestTime": pd.to_datetime(closest["k"] * step_s, unit="s"),
+        "Lat": closest["lat"], "Lon": closest["lon"],
+    }).reset_index()
+    out["CallsignA"] = out["FlightA"].map(callsigns)
+    out["CallsignB"] = out["FlightB"].map(callsigns)
+    return out.sort_values(["Start", "FlightA", "FlightB"], ignore_index=True)[CONFLICT_COLUMNS]
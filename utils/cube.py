@@ -0,0 +1,392 @@
+"""Historical demand cube: flights per sector, day, 20-minute interval and altitude span.
+
+Finished UTC days are binned once and kept under ``CUBE_DIR`` as memory-mapped
+NumPy partitions, so comparing a window with the same weekday of past weeks
+reads a few kilobytes instead of re-running the sector query for every day:
+
+* ``days/<YYYY-MM-DD>/`` holds one day: ``counts.npy`` with shape
+  ``(sectors, 72, spans)`` and ``manifest.json`` (sector ids, band size);
+* ``months/<YYYY-MM>/`` holds compacted days: ``counts.npy`` with shape
+  ``(days, sectors, 72, spans)`` plus ``dates.npy``.
+
+A flight is counted as in the bar chart (once, in the interval holding its
+earliest StartTime) under the span ``(lowest band, highest band)`` its
+altitude profile touches, bands being ``CUBE_BAND_FT`` thick; the last span
+holds flights without a profile. That keeps the flight-level filter exact
+at band resolution: a flight passes ``[min_ft, max_ft]`` when its span
+overlaps the bands of that range.
+
+:func:`fill` adds missing finished days and :func:`compact` folds days older
+than ``CUBE_COMPACT_AFTER_DAYS`` into their month; :func:`start_filler` runs
+both periodically in a daemon thread (one process at a time holds the lock).
+Partitions are written to a temporary sibling and renamed into place, so
+readers never see a half-written one.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from utils.columnar import _parse_profile
+from utils.demand import BIN, REPORT_TOL_DEG
+
+CUBE_DIR = Path(os.getenv("CUBE_DIR", "cube"))
+CUBE_ENABLED = os.getenv("CUBE_ENABLED", "True").lower() == "true"
+CUBE_BAND_FT = int(os.getenv("CUBE_BAND_FT", "10000"))
+CUBE_TOP_FT = int(os.getenv("CUBE_TOP_FT", "50000"))  # everything above falls in the top band
+CUBE_BACKFILL_DAYS = int(os.getenv("CUBE_BACKFILL_DAYS", "56"))
+CUBE_COMPACT_AFTER_DAYS = int(os.getenv("CUBE_COMPACT_AFTER_DAYS", "7"))
+CUBE_FILL_INTERVAL_S = float(os.getenv("CUBE_FILL_INTERVAL_S", "3600"))  # 0 = no background filler
+CUBE_FILL_DELAY_S = float(os.getenv("CUBE_FILL_DELAY_S", "60"))  # first run after startup
+CUBE_BASELINE_WEEKS = int(os.getenv("CUBE_BASELINE_WEEKS", "8"))
+CUBE_MIN_WEEKS = int(os.getenv("CUBE_MIN_WEEKS", "2"))  # fewer days of history: no overlay
+
+INTERVALS = int(timedelta(days=1) / BIN)  # 72
+N_BANDS = CUBE_TOP_FT // CUBE_BAND_FT + 1
+N_SPANS = N_BANDS * N_BANDS + 1  # (lo, hi) pairs, then "no profile"
+
+log = logging.getLogger("atfas.cube")
+
+
+# =============================
+# Binning
+# =============================
+def span_index(lo_ft, hi_ft) -> np.ndarray:
+    """Span of altitude extremes (NaN: no profile)."""
+    lo_ft, hi_ft = np.asarray(lo_ft, dtype=np.float64), np.asarray(hi_ft, dtype=np.float64)
+    lo = np.clip(np.floor(np.nan_to_num(lo_ft) / CUBE_BAND_FT), 0, N_BANDS - 1).astype(np.int64)
+    hi = np.clip(np.floor(np.nan_to_num(hi_ft) / CUBE_BAND_FT), 0, N_BANDS - 1).astype(np.int64)
+    return np.where(np.isnan(lo_ft) | np.isnan(hi_ft), N_SPANS - 1, lo * N_BANDS + hi)
+
+
+def span_mask(fl_range: tuple[int, int] | None) -> np.ndarray:
+    """Spans counted under the flight-level filter ``(min_ft, max_ft)`` (all spans without one)."""
+    mask = np.ones(N_SPANS, dtype=bool)
+    if fl_range:
+        a, b = (min(max(int(v) // CUBE_BAND_FT, 0), N_BANDS - 1) for v in fl_range)
+        lo, hi = np.divmod(np.arange(N_SPANS - 1), N_BANDS)
+        mask[:-1] = (lo <= b) & (hi >= a)
+        mask[-1] = False  # the SQL filter needs an altitude in range
+    return mask
+
+
+def day_counts(trajectories: pd.DataFrame, day: date) -> np.ndarray:
+    """``(72, spans)`` flight counts of one sector's trajectories on ``day``."""
+    out = np.zeros((INTERVALS, N_SPANS), dtype=np.int64)
+    if trajectories.empty:
+        return out
+    values, offsets = _parse_profile(trajectories["AltitudeFt"])
+    alt = np.where(values == np.iinfo(np.int32).min, np.nan, values.astype(np.float64))
+    row = np.repeat(np.arange(len(trajectories)), np.diff(offsets))
+    lo = pd.Series(alt).groupby(row).min().reindex(range(len(trajectories)))
+    hi = pd.Series(alt).groupby(row).max().reindex(range(len(trajectories)))
+    flights = pd.DataFrame({
+        "FlightId": trajectories["FlightId"].to_numpy(),
+        "StartTime": pd.to_datetime(trajectories["StartTime"]).to_numpy(),
+        "lo": lo.to_numpy(), "hi": hi.to_numpy(),
+    }).groupby("FlightId", sort=False).agg(StartTime=("StartTime", "min"), lo=("lo", "min"), hi=("hi", "max"))
+    offset = (flights["StartTime"] - pd.Timestamp(day)).dt.total_seconds().to_numpy()
+    idx = np.floor(offset / BIN.total_seconds())
+    ok = (offset >= 0) & (idx < INTERVALS)
+    cell = idx[ok].astype(np.int64) * N_SPANS + span_index(flights["lo"], flights["hi"])[ok]
+    return np.bincount(cell, minlength=INTERVALS * N_SPANS).reshape(INTERVALS, N_SPANS)
+
+
+# =============================
+# Partitions
+# =============================
+def _write(path: Path, arrays: dict[str, np.ndarray], manifest: dict) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = Path(tempfile.mkdtemp(prefix=f".{path.name}.", dir=path.parent))
+    try:
+        for name, arr in arrays.items():
+            np.save(tmp / f"{name}.npy", arr)
+        manifest = {**manifest, "band_ft": CUBE_BAND_FT, "n_bands": N_BANDS,
+                    "created_utc": datetime.now(timezone.utc).isoformat()}
+        (tmp / "manifest.json").write_text(json.dumps(manifest))
+        if path.exists():
+            shutil.rmtree(path)
+        os.replace(tmp, path)
+    except BaseException:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+
+def _counts_dtype(counts: np.ndarray) -> np.ndarray:
+    return counts.astype(np.uint16 if counts.max(initial=0) < 2**16 else np.uint32)
+
+
+def write_day(day: date, sector_ids: list[int], counts: np.ndarray, root: Path | None = None) -> Path:
+    """Store ``counts`` (``(sectors, 72, spans)``) as the partition of ``day``."""
+    path = (root or CUBE_DIR) / "days" / day.isoformat()
+    _write(path, {"counts": _counts_dtype(counts)}, {"day": day.isoformat(), "sectors": [int(s) for s in sector_ids]})
+    return path
+
+
+class _Partition:
+    """One day or month directory, memory-mapped on first use."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.manifest = json.loads((path / "manifest.json").read_text())
+        self.sectors = {int(s): i for i, s in enumerate(self.manifest["sectors"])}
+        if (path / "dates.npy").exists():
+            self.dates = np.load(path / "dates.npy").astype("datetime64[D]")
+        else:
+            self.dates = np.array([self.manifest["day"]], dtype="datetime64[D]")
+        self._counts = None
+
+    @property
+    def counts(self) -> np.ndarray:
+        """``(days, sectors, 72, spans)``; day partitions get a leading axis of one."""
+        if self._counts is None:
+            arr = np.load(self.path / "counts.npy", mmap_mode="r")
+            self._counts = arr[None] if arr.ndim == 3 else arr
+        return self._counts
+
+    @property
+    def compatible(self) -> bool:
+        return self.manifest.get("band_ft") == CUBE_BAND_FT and self.manifest.get("n_bands") == N_BANDS
+
+
+class DemandCube:
+    """Read side of the cube: which partition holds each day, and vectorized lookups."""
+
+    def __init__(self, root: str | os.PathLike | None = None):
+        self.root = Path(root) if root else CUBE_DIR
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._days: dict[np.datetime64, tuple[_Partition, int]] = {}
+
+    def _listing_stamp(self):
+        return tuple((self.root / sub).stat().st_mtime_ns if (self.root / sub).is_dir() else None
+                     for sub in ("days", "months"))
+
+    def _index(self) -> dict:
+        """Day -> (partition, row); rebuilt when a partition is added or removed."""
+        stamp = self._listing_stamp()
+        with self._lock:
+            if stamp != self._stamp:
+                days = {}
+                for sub in ("months", "days"):  # a day left over from compaction loses to its month
+                    base = self.root / sub
+                    for path in sorted(base.iterdir()) if base.is_dir() else []:
+                        if path.name.startswith(".") or not (path / "manifest.json").exists():
+                            continue
+                        part = _Partition(path)
+                        if not part.compatible:
+                            log.warning("Skipping %s: built with other altitude bands", path)
+                            continue
+                        for row, d in enumerate(part.dates):
+                            days.setdefault(d, (part, row))
+                self._days, self._stamp = days, stamp
+            return self._days
+
+    def days(self) -> list[date]:
+        return sorted(d.astype(date) for d in self._index())
+
+    def has_day(self, day: date) -> bool:
+        return np.datetime64(day, "D") in self._index()
+
+    def history(self, sector_id: int, days, fl_range: tuple[int, int] | None = None) -> np.ndarray:
+        """Flights per interval, ``(len(days), 72)``; NaN rows for days the cube does not hold."""
+        index = self._index()
+        days = np.asarray(days, dtype="datetime64[D]")
+        out = np.full((len(days), INTERVALS), np.nan)
+        mask = span_mask(fl_range)
+        groups: dict[int, tuple[_Partition, list, list]] = {}  # one fancy-indexed read per partition
+        for i, d in enumerate(days):
+            hit = index.get(d)
+            if hit is None or int(sector_id) not in hit[0].sectors:
+                continue
+            _part, targets, rows = groups.setdefault(id(hit[0]), (hit[0], [], []))
+            targets.append(i)
+            rows.append(hit[1])
+        for part, targets, rows in groups.values():
+            block = part.counts[np.asarray(rows), part.sectors[int(sector_id)]]
+            out[targets] = block[..., mask].sum(axis=-1)
+        return out
+
+    def baseline(self, sector_id: int, starts: list[datetime], weeks: int = CUBE_BASELINE_WEEKS,
+                 fl_range: tuple[int, int] | None = None) -> dict | None:
+        """Same-weekday history of the intervals starting at ``starts`` (20-minute aligned).
+
+        Returns ``mean``, ``p10``, ``p50``, ``p90`` (one value per interval) and
+        ``weeks`` (the number of past weeks found), or ``None`` with fewer
+        than ``CUBE_MIN_WEEKS``.
+        """
+        if not starts:
+            return None
+        t = np.asarray(starts, dtype="datetime64[m]")
+        day = t.astype("datetime64[D]")
+        slot = ((t - day).astype(np.int64) // int(BIN.total_seconds() // 60))
+        back = day[None, :] - (7 * np.arange(1, weeks + 1))[:, None].astype("timedelta64[D]")
+        wanted = np.unique(back)
+        hist = self.history(sector_id, wanted, fl_range)
+        rows = np.searchsorted(wanted, back)
+        values = hist[rows, slot[None, :]]  # (weeks, intervals)
+        found = int((~np.isnan(values)).any(axis=1).sum())
+        if found < CUBE_MIN_WEEKS:
+            return None
+        with np.errstate(all="ignore"):
+            p10, p50, p90 = np.nanpercentile(values, [10, 50, 90], axis=0)
+            mean = np.nanmean(values, axis=0)
+        return {"mean": mean, "p10": p10, "p50": p50, "p90": p90, "weeks": found}
+
+
+_cube: DemandCube | None = None
+
+
+def get_cube() -> DemandCube:
+    global _cube
+    if _cube is None:
+        _cube = DemandCube()
+    return _cube
+
+
+# =============================
+# Filling and compaction
+# =============================
+def fill_day(source, day: date, sector_ids: list[int] | None = None, root: Path | None = None) -> Path:
+    """Query every sector for ``day`` (UTC) and store its partition."""
+    source = getattr(source, "inner", source)  # one-off, full-day results: skip the shared cache
+    if sector_ids is None:
+        sector_ids = [int(s) for s in source.list_sectors()["Id"]]
+    start = datetime.combine(day, datetime.min.time())
+    counts = np.zeros((len(sector_ids), INTERVALS, N_SPANS), dtype=np.int64)
+    for i, sid in enumerate(sector_ids):
+        df = source.trajectories(sid, start, start + timedelta(days=1), max_rows=2**31 - 1, tol_deg=REPORT_TOL_DEG)
+        counts[i] = day_counts(df, day)
+    return write_day(day, sector_ids, counts, root)
+
+
+def missing_days(days: int = CUBE_BACKFILL_DAYS, today: date | None = None, cube: DemandCube | None = None) -> list[date]:
+    """Finished days of the last ``days`` the cube lacks, most recent first."""
+    today = today or datetime.now(timezone.utc).date()
+    cube = cube or get_cube()
+    return [d for d in (today - timedelta(days=k) for k in range(1, days + 1)) if not cube.has_day(d)]
+
+
+def fill(source, days: int = CUBE_BACKFILL_DAYS, today: date | None = None, root: Path | None = None,
+         sector_ids: list[int] | None = None) -> list[date]:
+    """Bin the missing finished days of the last ``days``; returns the days added."""
+    cube = DemandCube(root) if root else get_cube()
+    added = []
+    for day in missing_days(days, today, cube):
+        t0 = time.perf_counter()
+        fill_day(source, day, sector_ids, root)
+        log.info("cube: binned %s in %.1fs", day, time.perf_counter() - t0)
+        added.append(day)
+    return added
+
+
+def compact(root: Path | None = None, older_than_days: int = CUBE_COMPACT_AFTER_DAYS,
+            today: date | None = None) -> list[str]:
+    """Fold day partitions older than ``older_than_days`` into their month; returns the months written."""
+    root = root or CUBE_DIR
+    today = today or datetime.now(timezone.utc).date()
+    base = root / "days"
+    by_month: dict[str, list[_Partition]] = {}
+    for path in sorted(base.iterdir()) if base.is_dir() else []:
+        if path.name.startswith(".") or not (path / "manifest.json").exists():
+            continue
+        part = _Partition(path)
+        if part.compatible and (today - part.dates[0].astype(date)).days > older_than_days:
+            by_month.setdefault(path.name[:7], []).append(part)
+
+    written = []
+    for month, parts in by_month.items():
+        target = root / "months" / month
+        if (target / "manifest.json").exists() and (old := _Partition(target)).compatible:
+            parts = [old] + parts
+        sectors = sorted({s for p in parts for s in p.sectors})
+        dates = np.unique(np.concatenate([p.dates for p in parts]))
+        counts = np.zeros((len(dates), len(sectors), INTERVALS, N_SPANS), dtype=np.int64)
+        cols = {s: i for i, s in enumerate(sectors)}
+        for part in parts:  # later partitions (re-filled days) win
+            rows = np.searchsorted(dates, part.dates)
+            for sid, j in part.sectors.items():
+                counts[rows, cols[sid]] = part.counts[:, j]
+        _write(target, {"counts": _counts_dtype(counts), "dates": dates.astype("datetime64[D]")},
+               {"month": month, "sectors": sectors})
+        for part in parts:
+            if part.path.parent == base:
+                shutil.rmtree(part.path, ignore_errors=True)
+        written.append(month)
+    return written
+
+
+def run_once(source=None) -> list[date]:
+    """One filler pass: bin missing days, then compact.
+
+    Only the database is binned by default: a snapshot or columnar dataset
+    covers a single window and would store empty days around it.
+    """
+    from utils.datasource import MSSQLDataSource, get_datasource
+
+    source = source or get_datasource()
+    if not isinstance(getattr(source, "inner", source), MSSQLDataSource):
+        return []
+    added = fill(source)
+    compact()
+    return added
+
+
+_filler: threading.Thread | None = None
+
+
+def start_filler(interval_s: float = CUBE_FILL_INTERVAL_S, delay_s: float = CUBE_FILL_DELAY_S) -> None:
+    """Run :func:`run_once` every ``interval_s`` in a daemon thread of this process.
+
+    Call it from the serving process: gunicorn's ``post_fork`` hook, or the
+    app's first request (a no-op once running). Each worker starts one and a
+    non-blocking ``flock`` on ``CUBE_DIR/.lock`` lets only one of them work
+    at a time.
+    """
+    global _filler
+    if not CUBE_ENABLED or interval_s <= 0 or (_filler is not None and _filler.is_alive()):
+        return
+
+    def loop():
+        time.sleep(delay_s)
+        while True:
+            try:
+                with _exclusive() as held:
+                    if held:
+                        run_once()
+            except Exception:
+                log.exception("cube: filler pass failed")
+            time.sleep(interval_s)
+
+    _filler = threading.Thread(target=loop, name="cube-filler", daemon=True)
+    _filler.start()
+
+
+@contextmanager
+def _exclusive():
+    """Yield whether this process got ``CUBE_DIR/.lock`` (held until the block ends)."""
+    CUBE_DIR.mkdir(parents=True, exist_ok=True)
+    with open(CUBE_DIR / ".lock", "w") as f:  # closing releases the lock
+        try:
+            import fcntl
+        except ImportError:  # no flock (Windows): single-process deployments only
+            yield True
+            return
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False
+            return
+        yield True
@@ -0,0 +1,224 @@
+"""Columnar, interned trajectory dataset.
+
+A :class:`TrajectoryDataset` holds a trajectory result (``TRAJ_COLUMNS``)
+as one numpy array per column instead of one dict per row:
+
+* ids are ``int64`` (``FlightSourceId`` uses :data:`MISSING` for NULL);
+* timestamps are ``int64`` epoch milliseconds (UTC, :data:`MISSING` for NaT);
+* low-cardinality strings (callsigns, airports, aircraft types, ...) are
+  interned: ``int32`` codes into one sorted table of distinct values
+  (``-1`` for NULL);
+* geometry and the comma-separated profiles stay as object arrays.
+
+It is built straight from the query frame with vectorized conversions,
+pickles compactly into the shared cache and renders the JSON-ready
+``store-flights`` records column by column. Row access goes through
+:class:`TrajectoryRow`, a ``__slots__`` view that copies nothing.
+"""
+
+from __future__ import annotations
+
+from collections.abc import Iterable, Iterator
+
+import numpy as np
+import pandas as pd
+import shapely
+
+MISSING = np.iinfo(np.int64).min
+
+ID_COLUMNS = ["TrajectoryId", "FlightId", "FlightSourceId"]
+TIME_COLUMNS = [
+    "StartTime", "EndTime", "SOBT", "EOBT", "STOT", "SLDT", "TimeFiling",
+    "ETOT", "ELDT", "CTOT", "CLDT", "ATOT", "ALDT",
+]
+INTERNED_COLUMNS = [
+    "Callsign", "AirportDeparture", "AirportArrival", "FlightRule", "FlightType", "AircraftType",
+    "WakeTurbulanceCategory", "REG", "SID", "STAR", "RunwayDeparture", "RunwayArrival",
+    "AirportAlternate", "RoutePortion",
+]
+
+# Key order of a store-flights record
+RECORD_COLUMNS = [
+    "TrajectoryId", "FlightId", "FlightSourceId", "Callsign", "AirportDeparture", "AirportArrival",
+    "FlightRule", "FlightType", "AircraftType", "WakeTurbulanceCategory", "REG", "LevelInitial",
+    "SpeedInitial", "SID", "STAR", "RunwayDeparture", "RunwayArrival", "AirportAlternate", "Number",
+    "SOBT", "EOBT", "STOT", "SLDT", "TimeFiling", "ETOT", "ELDT", "CTOT", "CLDT", "ATOT", "ALDT",
+    "StartTime", "EndTime", "WKT", "AltitudeFt", "SpeedKn", "Heading", "RoutePortion",
+]
+
+
+def epoch_ms(values) -> np.ndarray:
+    """Timestamps (datetimes, ISO strings or ``None``) -> int64 epoch ms, :data:`MISSING` for NaT."""
+    if isinstance(values, pd.Series) and values.dtype.kind == "M":
+        arr = values.to_numpy(dtype="datetime64[ms]")
+    else:
+        arr = pd.to_datetime(pd.Series(values, dtype=object), errors="coerce", format="ISO8601")
+        arr = arr.dt.tz_localize(None) if arr.dt.tz is not None else arr
+        arr = arr.to_numpy(dtype="datetime64[ms]")
+    return arr.astype(np.int64)  # NaT is int64 min, i.e. MISSING
+
+
+def iso_strings(ms: np.ndarray) -> list:
+    """Epoch ms -> ``datetime.isoformat()`` strings (``None`` for :data:`MISSING`)."""
+    ms = np.asarray(ms, dtype=np.int64)
+    dt = ms.astype("datetime64[ms]")
+    out = np.datetime_as_string(dt, unit="s").astype(object)
+    frac = (ms % 1000 != 0) & (ms != MISSING)
+    if frac.any():  # isoformat() prints microseconds only when present
+        out[frac] = np.datetime_as_string(dt[frac].astype("datetime64[us]"), unit="us")
+    out[ms == MISSING] = None
+    return out.tolist()
+
+
+def intern(values) -> tuple[np.ndarray, np.ndarray]:
+    """Strings -> ``(codes, table)`` with ``table[codes]`` the values, code ``-1`` for NULL/NaN."""
+    cat = pd.Categorical(pd.Series(values, dtype=object).where(lambda s: s.map(_present), None))
+    return cat.codes.astype(np.int32), np.asarray(cat.categories, dtype=object)
+
+
+def _present(v) -> bool:
+    return v is not None and v == v
+
+
+def _decode(codes: np.ndarray, table: np.ndarray) -> list:
+    out = np.empty(len(codes), dtype=object)
+    ok = codes >= 0
+    out[ok] = table[codes[ok]]
+    return out.tolist()
+
+
+class TrajectoryRow:
+    """Read-only view of one row; ``row["Callsign"]`` / ``row.get(...)`` decode on access."""
+
+    __slots__ = ("_ds", "_i")
+
+    def __init__(self, ds: "TrajectoryDataset", i: int):
+        self._ds = ds
+        self._i = i
+
+    def __getitem__(self, name: str):
+        return self._ds.value(name, self._i)
+
+    def get(self, name: str, default=None):
+        if name not in self._ds.columns and name not in self._ds.codes:
+            return default
+        value = self._ds.value(name, self._i)
+        return default if value is None else value
+
+    def to_dict(self) -> dict:
+        return {name: self[name] for name in RECORD_COLUMNS}
+
+
+class TrajectoryDataset:
+    """Column arrays of a trajectory result (see the module docstring)."""
+
+    __slots__ = ("columns", "codes", "tables", "length")
+
+    def __init__(self, columns: dict, codes: dict, tables: dict, length: int):
+        self.columns = columns  # name -> ndarray (ids, times, object columns)
+        self.codes = codes      # name -> int32 codes into tables[name]
+        self.tables = tables    # name -> sorted distinct values
+        self.length = length
+
+    # =============================
+    # Construction
+    # =============================
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "TrajectoryDataset":
+        """Dataset over a ``TRAJ_COLUMNS`` frame (missing columns become NULL)."""
+        n = len(df)
+
+        def col(name):
+            return df[name] if name in df else pd.Series([None] * n, dtype=object)
+
+        columns, codes, tables = {}, {}, {}
+        for name in ID_COLUMNS:
+            s = pd.to_numeric(col(name), errors="coerce").astype("Int64")
+            columns[name] = s.to_numpy(dtype=np.int64, na_value=MISSING)
+        for name in TIME_COLUMNS:
+            columns[name] = epoch_ms(col(name))
+        for name in INTERNED_COLUMNS:
+            codes[name], tables[name] = intern(col(name))
+        for name in RECORD_COLUMNS:
+            if name not in columns and name not in codes:
+                columns[name] = col(name).to_numpy(dtype=object)
+        return cls(columns, codes, tables, n)
+
+    @classmethod
+    def from_records(cls, records: Iterable[dict]) -> "TrajectoryDataset":
+        """Dataset over ``store-flights`` records (ISO times are parsed in one pass)."""
+        return cls.from_frame(pd.DataFrame.from_records(list(records or []), columns=RECORD_COLUMNS))
+
+    # =============================
+    # Access
+    # =============================
+    def __len__(self) -> int:
+        return self.length
+
+    def __getitem__(self, i: int) -> TrajectoryRow:
+        if not -self.length <= i < self.length:
+            raise IndexError(i)
+        return TrajectoryRow(self, i % self.length if self.length else i)
+
+    def __iter__(self) -> Iterator[TrajectoryRow]:
+        return (TrajectoryRow(self, i) for i in range(self.length))
+
+    def value(self, name: str, i: int):
+        """One decoded cell, as it appears in a record."""
+        if name in self.codes:
+            code = self.codes[name][i]
+            return self.tables[name][code] if code >= 0 else None
+        v = self.columns[name][i]
+        if name in TIME_COLUMNS:
+            return iso_strings([v])[0]
+        if name in ID_COLUMNS:
+            return None if v == MISSING else int(v)
+        return v
+
+    def column(self, name: str) -> list:
+        """One column decoded to the values a record holds."""
+        if name in self.codes:
+            return _decode(self.codes[name], self.tables[name])
+        arr = self.columns[name]
+        if name in TIME_COLUMNS:
+            return iso_strings(arr)
+        if name in ID_COLUMNS:
+            out = arr.astype(object)
+            out[arr == MISSING] = None
+            return out.tolist()
+        return arr.tolist()
+
+    def take(self, index) -> "TrajectoryDataset":
+        """Rows at ``index`` (int array or boolean mask); interned tables are shared."""
+        columns = {name: arr[index] for name, arr in self.columns.items()}
+        codes = {name: arr[index] for name, arr in self.codes.items()}
+        return TrajectoryDataset(columns, codes, self.tables, len(next(iter(columns.values()))))
+
+    def simplified(self, tol_deg: float) -> "TrajectoryDataset":
+        """Copy with ``WKT`` simplified to ``tol_deg`` degrees; the other columns are shared."""
+        wkt = self.columns["WKT"]
+        ok = np.fromiter((isinstance(v, str) and bool(v) for v in wkt), dtype=bool, count=len(wkt))
+        out = wkt.copy()
+        if ok.any():
+            geoms = shapely.simplify(shapely.from_wkt(wkt[ok]), float(tol_deg), preserve_topology=False)
+            out[ok] = shapely.to_wkt(geoms, rounding_precision=6)
+        return TrajectoryDataset({**self.columns, "WKT": out}, self.codes, self.tables, self.length)
+
+    def records(self) -> list[dict]:
+        """JSON-ready ``store-flights`` records, one dict per row."""
+        if not self.length:
+            return []
+        cols = [self.column(name) for name in RECORD_COLUMNS]
+        return [dict(zip(RECORD_COLUMNS, row)) for row in zip(*cols)]
+
+    @property
+    def nbytes(self) -> int:
+        """Approximate memory held by the columns (object cells counted by their string length)."""
+        total = sum(t.nbytes + sum(len(v) for v in t if isinstance(v, str)) for t in self.tables.values())
+        total += sum(c.nbytes for c in self.codes.values())
+        for arr in self.columns.values():
+            total += arr.nbytes
+            if arr.dtype == object:
+                total += sum(len(v) for v in arr if isinstance(v, str))
+        return total
+
@@ -0,0 +1,339 @@
+"""Pluggable data sources for sectors and trajectories.
+
+The app talks to a :class:`DataSource` instead of issuing T-SQL directly.
+:class:`MSSQLDataSource` wraps the ATFAS SQL Server through
+:func:`utils.db.sql_query`; :class:`utils.columnar.ColumnarDataSource` serves
+the same queries from local memory-mapped files. Pick one with the
+``DATA_SOURCE`` environment variable (``mssql`` or ``columnar``).
+With ``CACHE_ENABLED`` the SQL Server source is wrapped in
+:class:`CachedDataSource` so results are shared by every worker process.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from abc import ABC, abstractmethod
+from datetime import datetime
+
+import pandas as pd
+
+from utils.db import sql_chunks, sql_query
+
+DATA_SOURCE = os.getenv("DATA_SOURCE", "mssql").lower()
+COLUMNAR_PATH = os.getenv("COLUMNAR_PATH", "data/columnar")
+# FlightTrajectory column tracked by live mode (e.g. a row-modified timestamp)
+LIVE_HWM_COLUMN = os.getenv("LIVE_HWM_COLUMN", "StartTime")
+if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", LIVE_HWM_COLUMN):
+    raise ValueError(f"LIVE_HWM_COLUMN must be a plain column name, got {LIVE_HWM_COLUMN!r}")
+
+SECTOR_COLUMNS = ["Id", "Name", "LowerLimitFt", "UpperLimitFt", "WKT"]
+
+# Columns of a trajectory result, in SQL_TRAJ_BY_SECTOR select order.
+TRAJ_COLUMNS = [
+    "TrajectoryId", "FlightId", "FlightSourceId", "StartTime", "EndTime",
+    "AltitudeFt", "Heading", "SpeedKn", "WKT",
+    "Callsign", "AirportDeparture", "AirportArrival",
+    "FlightRule", "FlightType", "AircraftType", "WakeTurbulanceCategory",
+    "REG", "LevelInitial", "SpeedInitial", "SID", "STAR",
+    "RunwayDeparture", "RunwayArrival", "AirportAlternate", "Number",
+    "SOBT", "EOBT", "STOT", "SLDT", "TimeFiling",
+    "ETOT", "ELDT", "CTOT", "CLDT", "ATOT", "ALDT",
+]
+
+SQL_SECTORS = """
+SELECT [Id], [Name], [LowerLimitFt], [UpperLimitFt], [Geography].STAsText() AS WKT
+FROM [StaticAirspace]
+ORDER BY [Name]
+"""
+
+# Fetch a single sector by Id (fresh geometry from DB)
+SQL_SECTOR_BY_ID = """
+SELECT TOP 1 [Id], [Name], [LowerLimitFt], [UpperLimitFt], [Geography].STAsText() AS WKT
+FROM [StaticAirspace]
+WHERE [Id] = ?
+"""
+
+_TRAJ_SELECT = """
+  ft.[Id]               AS TrajectoryId,
+  ft.[FlightId],
+  ft.[FlightSourceId],
+  ft.[StartTime],
+  ft.[EndTime],
+  ft.[AltitudeFt],
+  ft.[Heading],
+  ft.[SpeedKn],
+  {wkt} AS WKT,
+  -- Flight table details for rich hover
+  f.[Callsign], f.[AirportDeparture], f.[AirportArrival],
+  f.[FlightRule], f.[FlightType], f.[AircraftType], f.[WakeTurbulanceCategory],
+  f.[REG], f.[LevelInitial], f.[SpeedInitial], f.[SID], f.[STAR],
+  f.[RunwayDeparture], f.[RunwayArrival], f.[AirportAlternate], f.[Number],
+  f.[SOBT], f.[EOBT], f.[STOT], f.[SLDT], f.[TimeFiling],
+  f.[ETOT], f.[ELDT], f.[CTOT], f.[CLDT], f.[ATOT], f.[ALDT]
+"""
+
+_TRAJ_BY_SECTOR = """
+DECLARE @sectorId INT = ?;
+DECLARE @startUtc DATETIME2 = ?;
+DECLARE @endUtc   DATETIME2 = ?;
+DECLARE @applyFL BIT = ?;        -- 0 = off, 1 = on
+DECLARE @minFt   INT = ?;        -- lower flight level in feet
+DECLARE @maxFt   INT = ?;        -- upper flight level in feet
+DECLARE @maxRows INT = ?;        -- hard cap to protect UI
+DECLARE @tolDeg  FLOAT = ?;      -- geometry simplification tolerance in degrees
+{declare}
+WITH sector AS (
+  SELECT [Geography] AS g
+  FROM [StaticAirspace]
+  WHERE [Id] = @sectorId
+)
+SELECT TOP (@maxRows){select}
+FROM [FlightTrajectory] ft
+JOIN [Flight] f ON f.[Id] = ft.[FlightId]
+CROSS JOIN sector s
+WHERE ft.[IsActive] = 1
+  AND ft.[StartTime] <  @endUtc
+  AND ft.[EndTime]   >= @startUtc
+  AND (f.[IsCancelled] = 0 OR f.[IsCancelled] IS NULL)
+  AND ft.[PositionLine].STIntersects(s.g) = 1
+  AND (
+        @applyFL = 0 OR EXISTS (
+            SELECT 1
+            FROM STRING_SPLIT(ft.[AltitudeFt], ',') AS ss
+            CROSS APPLY (SELECT TRY_CAST(ss.value AS INT) AS AltFt) AS a
+            WHERE a.AltFt BETWEEN @minFt AND @maxFt
+        )
+  ){where}
+ORDER BY ft.[StartTime] ASC;
+"""
+
+_REDUCED_SELECT = _TRAJ_SELECT.format(wkt="ft.[PositionLine].Reduce(@tolDeg).STAsText()")
+
+SQL_TRAJ_BY_SECTOR = _TRAJ_BY_SECTOR.format(declare="", select=_REDUCED_SELECT, where="")
+
+# Live mode: only rows at or past the high-water mark on LIVE_HWM_COLUMN
+SQL_TRAJ_SINCE = _TRAJ_BY_SECTOR.format(
+    declare="DECLARE @sinceUtc DATETIME2 = ?; -- live high-water mark\n",
+    select=_REDUCED_SELECT.rstrip() + f",\n  ft.[{LIVE_HWM_COLUMN}] AS LiveMark\n",
+    where=f"\n  AND ft.[{LIVE_HWM_COLUMN}] >= @sinceUtc",
+)
+
+# All active trajectories of one flight, full-resolution geometry
+SQL_FLIGHT_DETAIL = """
+SELECT""" + _TRAJ_SELECT.format(wkt="ft.[PositionLine].STAsText()") + """
+FROM [FlightTrajectory] ft
+JOIN [Flight] f ON f.[Id] = ft.[FlightId]
+WHERE ft.[FlightId] = ?
+  AND ft.[IsActive] = 1
+ORDER BY ft.[StartTime] ASC;
+"""
+
+_TRAJ_IN_WINDOW = """
+DECLARE @startUtc DATETIME2 = ?;
+DECLARE @endUtc   DATETIME2 = ?;
+{declare}
+SELECT""" + _TRAJ_SELECT.format(wkt="ft.[PositionLine].STAsText()") + """
+FROM [FlightTrajectory] ft
+JOIN [Flight] f ON f.[Id] = ft.[FlightId]
+WHERE ft.[IsActive] = 1
+  AND ft.[StartTime] <  @endUtc
+  AND ft.[EndTime]   >= @startUtc
+  AND (f.[IsCancelled] = 0 OR f.[IsCancelled] IS NULL){where}
+ORDER BY ft.[StartTime] ASC;
+"""
+
+# Every active trajectory overlapping a window (bulk export to local files)
+SQL_TRAJ_IN_WINDOW = _TRAJ_IN_WINDOW.format(declare="", where="")
+
+# ... limited to those crossing a lon/lat rectangle (area query indexes)
+SQL_TRAJ_IN_BOX = _TRAJ_IN_WINDOW.format(
+    declare="DECLARE @box NVARCHAR(MAX) = ?;  -- POLYGON WKT, counter-clockwise\n",
+    where="\n  AND ft.[PositionLine].STIntersects(geography::STGeomFromText(@box, 4326)) = 1",
+)
+
+
+class DataSource(ABC):
+    """Read-only access to sectors and trajectories.
+
+    Frames returned by every implementation share the column layout of the
+    SQL statements above (:data:`SECTOR_COLUMNS`, :data:`TRAJ_COLUMNS`), so
+    callers never need to know which backend produced them.
+    """
+
+    name = "abstract"
+
+    @abstractmethod
+    def list_sectors(self) -> pd.DataFrame:
+        """All sectors ordered by name."""
+
+    @abstractmethod
+    def get_sector(self, sector_id: int) -> pd.Series | None:
+        """One sector row, or ``None`` when the id is unknown."""
+
+    @abstractmethod
+    def trajectories(
+        self,
+        sector_id: int,
+        start: datetime,
+        end: datetime,
+        fl_range: tuple[int, int] | None = None,
+        max_rows: int = 2000,
+        tol_deg: float = 0.0,
+    ) -> pd.DataFrame:
+        """Trajectories intersecting a sector within ``[start, end)``.
+
+        ``fl_range`` is an inclusive ``(min_ft, max_ft)`` altitude band that at
+        least one vertex must fall in; ``tol_deg`` simplifies the returned
+        geometry. Rows are ordered by ``StartTime`` and capped at ``max_rows``.
+        """
+
+    @abstractmethod
+    def flight_detail(self, flight_id: int) -> pd.DataFrame:
+        """All trajectory rows of one flight with full-resolution geometry."""
+
+    def iter_trajectories(self, sector_id, start, end, fl_range=None, tol_deg=0.0, chunk_rows=5000):
+        """:meth:`trajectories` without a row cap, as frames of up to ``chunk_rows`` rows.
+
+        Backends that can read incrementally override this so exports run in
+        constant memory; the default slices one uncapped result.
+        """
+        df = self.trajectories(sector_id, start, end, fl_range=fl_range, max_rows=2**31 - 1, tol_deg=tol_deg)
+        for i in range(0, len(df), chunk_rows):
+            yield df.iloc[i:i + chunk_rows].reset_index(drop=True)
+
+    def trajectories_since(self, sector_id, start, end, since, fl_range=None, max_rows=2000, tol_deg=0.0):
+        """Like :meth:`trajectories`, limited to rows whose mark is ``>= since``.
+
+        The mark is returned in an extra ``LiveMark`` column. Static sources
+        have no modification time, so ``StartTime`` serves as the mark.
+        """
+        # Rows starting at/after ``since`` all overlap [max(start, since), end); the
+        # uncapped query keeps rows that started earlier from using up max_rows.
+        df = self.trajectories(sector_id, max(start, since), end, fl_range=fl_range, max_rows=2**31 - 1,
+                               tol_deg=tol_deg)
+        df = df[pd.to_datetime(df["StartTime"]) >= pd.Timestamp(since)].head(max_rows).reset_index(drop=True)
+        return df.assign(LiveMark=df["StartTime"])
+
+
+class MSSQLDataSource(DataSource):
+    """The ATFAS SQL Server, queried with the T-SQL statements in this module."""
+
+    name = "mssql"
+
+    def list_sectors(self) -> pd.DataFrame:
+        return sql_query(SQL_SECTORS, name="SQL_SECTORS")
+
+    def get_sector(self, sector_id: int) -> pd.Series | None:
+        df = sql_query(SQL_SECTOR_BY_ID, (int(sector_id),), name="SQL_SECTOR_BY_ID")
+        return None if df.empty else df.iloc[0]
+
+    def trajectories(self, sector_id, start, end, fl_range=None, max_rows=2000, tol_deg=0.0):
+        apply = 1 if fl_range else 0
+        min_ft, max_ft = fl_range if fl_range else (0, 99999)
+        params = (int(sector_id), start, end, apply, int(min_ft), int(max_ft), int(max_rows), float(tol_deg))
+        return sql_query(SQL_TRAJ_BY_SECTOR, params, name="SQL_TRAJ_BY_SECTOR")
+
+    def iter_trajectories(self, sector_id, start, end, fl_range=None, tol_deg=0.0, chunk_rows=5000):
+        apply = 1 if fl_range else 0
+        min_ft, max_ft = fl_range if fl_range else (0, 99999)
+        params = (int(sector_id), start, end, apply, int(min_ft), int(max_ft), 2**31 - 1, float(tol_deg))
+        return sql_chunks(SQL_TRAJ_BY_SECTOR, params, name="SQL_TRAJ_BY_SECTOR", chunk_rows=chunk_rows)
+
+    def trajectories_since(self, sector_id, start, end, since, fl_range=None, max_rows=2000, tol_deg=0.0):
+        apply = 1 if fl_range else 0
+        min_ft, max_ft = fl_range if fl_range else (0, 99999)
+        params = (int(sector_id), start, end, apply, int(min_ft), int(max_ft), int(max_rows), float(tol_deg), since)
+        return sql_query(SQL_TRAJ_SINCE, params, name="SQL_TRAJ_SINCE")
+
+    def flight_detail(self, flight_id: int) -> pd.DataFrame:
+        return sql_query(SQL_FLIGHT_DETAIL, (int(flight_id),), name="SQL_FLIGHT_DETAIL")
+
+    def window_trajectories(self, start: datetime, end: datetime, bbox=None) -> pd.DataFrame:
+        """Every active trajectory overlapping ``[start, end)`` (bulk export), or crossing ``bbox``."""
+        if bbox is None:
+            return sql_query(SQL_TRAJ_IN_WINDOW, (start, end), name="SQL_TRAJ_IN_WINDOW")
+        x0, y0, x1, y1 = bbox
+        box = f"POLYGON(({x0} {y0}, {x1} {y0}, {x1} {y1}, {x0} {y1}, {x0} {y0}))"
+        return sql_query(SQL_TRAJ_IN_BOX, (start, end, box), name="SQL_TRAJ_IN_BOX")
+
+
+class CachedDataSource(DataSource):
+    """Serve another source's results through :func:`utils.cache.shared_cache`.
+
+    Keys include the wrapped source's name and every query argument, so
+    identical requests from any worker on the host hit the same entry and
+    concurrent misses issue a single query.
+    """
+
+    def __init__(self, inner: DataSource, ttl_s: float | None = None, sector_ttl_s: float | None = None):
+        from utils.cache import CACHE_SECTOR_TTL_S, CACHE_TTL_S, shared_cache
+
+        self.inner = inner
+        self.cache = shared_cache()
+        self.ttl_s = CACHE_TTL_S if ttl_s is None else ttl_s
+        self.sector_ttl_s = CACHE_SECTOR_TTL_S if sector_ttl_s is None else sector_ttl_s
+
+    @property
+    def name(self) -> str:
+        return self.inner.name
+
+    def _cached(self, namespace: str, ttl: float, compute, *args):
+        from utils.cache import make_key
+
+        return self.cache.get_or_compute(make_key(namespace, self.inner.name, *args), compute, ttl)
+
+    def list_sectors(self) -> pd.DataFrame:
+        return self._cached("sectors", self.sector_ttl_s, self.inner.list_sectors)
+
+    def get_sector(self, sector_id: int) -> pd.Series | None:
+        return self._cached("sector", self.sector_ttl_s, lambda: self.inner.get_sector(sector_id), int(sector_id))
+
+    def trajectories(self, sector_id, start, end, fl_range=None, max_rows=2000, tol_deg=0.0):
+        args = (int(sector_id), start, end, tuple(fl_range) if fl_range else None, int(max_rows), float(tol_deg))
+        return self._cached("traj", self.ttl_s, lambda: self.inner.trajectories(*args), *args)
+
+    def iter_trajectories(self, *args, **kwargs):
+        # Exports are one-off and too large for the shared cache.
+        return self.inner.iter_trajectories(*args, **kwargs)
+
+    def trajectories_since(self, *args, **kwargs):
+        # Deltas are only useful fresh; never cache them.
+        return self.inner.trajectories_since(*args, **kwargs)
+
+    def flight_detail(self, flight_id: int) -> pd.DataFrame:
+        return self._cached("flight", self.ttl_s, lambda: self.inner.flight_detail(flight_id), int(flight_id))
+
+    def __getattr__(self, attr):
+        if attr == "inner":
+            raise AttributeError(attr)
+        # Backend-specific extras (e.g. MSSQLDataSource.window_trajectories) stay uncached.
+        return getattr(self.inner, attr)
+
+
+_datasource: DataSource | None = None
+
+
+def get_datasource() -> DataSource:
+    """Return the process-wide data source selected by ``DATA_SOURCE``."""
+    global _datasource
+    if _datasource is None:
+        if DATA_SOURCE == "columnar":
+            from utils.columnar import ColumnarDataSource
+
+            _datasource = ColumnarDataSource(COLUMNAR_PATH)
+        elif DATA_SOURCE == "mssql":
+            from utils.cache import CACHE_ENABLED
+
+            # Columnar files are already shared through the OS page cache.
+            _datasource = CachedDataSource(MSSQLDataSource()) if CACHE_ENABLED else MSSQLDataSource()
+        else:
+            raise ValueError(f"Unknown DATA_SOURCE {DATA_SOURCE!r} (expected 'mssql' or 'columnar')")
+    return _datasource
+
+
+def set_datasource(source: DataSource | None) -> DataSource | None:
+    """Replace the process-wide data source; returns the previous one."""
+    global _datasource
+    previous, _datasource = _datasource, source
+    return previous
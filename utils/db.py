@@ -2,10 +2,20 @@
 
 from __future__ import annotations
 
+import contextvars
+import itertools
+import json
+import logging
 import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import date, datetime
+from logging.handlers import RotatingFileHandler
+from typing import Callable, Iterator
 
 import pandas as pd
-import pyodbc
 
 try:  # pragma: no cover - environment loading is side effect
     from dotenv import load_dotenv
@@ -13,6 +23,8 @@ try:  # pragma: no cover - environment loading is side effect
 except Exception:  # pragma: no cover - dotenv not installed
     pass
 
+from utils.metrics import SQL_CANCELLED, current_correlation_id, observe_sql
+
 DB_DRIVER = os.getenv("MSSQL_DRIVER", "ODBC Driver 18 for SQL Server")
 DB_SERVER = os.getenv("MSSQL_SERVER", "localhost,1433")
 DB_DATABASE = os.getenv("MSSQL_DATABASE", "ATFAS")
@@ -27,8 +39,249 @@ CONNECTION = (
     "Encrypt=yes;TrustServerCertificate=yes;Connection Timeout=10;"
 )
 
+# Slow-query log: statements slower than this are written to SQL_LOG_FILE
+# (0 logs every statement, a negative value disables the log).
+SQL_SLOW_MS = float(os.getenv("SQL_SLOW_MS", "1000"))
+# "off", "stats" (SET STATISTICS TIME/IO messages) or "plan" (actual XML plan)
+SQL_CAPTURE = os.getenv("SQL_CAPTURE", "off").lower()
+# Comma-separated statement names to capture; empty means all statements.
+SQL_CAPTURE_STATEMENTS = {s.strip() for s in os.getenv("SQL_CAPTURE_STATEMENTS", "").split(",") if s.strip()}
+SQL_LOG_FILE = os.getenv("SQL_LOG_FILE", "logs/sql.jsonl")
+SQL_LOG_MAX_BYTES = int(os.getenv("SQL_LOG_MAX_BYTES", str(10 * 2**20)))
+SQL_LOG_BACKUPS = int(os.getenv("SQL_LOG_BACKUPS", "5"))
+# Server-side limit per statement (pyodbc Connection.timeout); 0 = none
+SQL_QUERY_TIMEOUT_S = int(os.getenv("SQL_QUERY_TIMEOUT_S", "0"))
+# Cancel a session's in-flight statement when a newer request supersedes it
+SQL_SUPERSEDE = os.getenv("SQL_SUPERSEDE", "True").lower() == "true"
+SQL_SUPERSEDE_POLL_S = float(os.getenv("SQL_SUPERSEDE_POLL_S", "0.25"))  # cross-worker check interval
+
+QueryHandler = Callable[[str, "tuple | None"], pd.DataFrame]
+
+# Optional replacement for the SQL Server round-trip (benchmarks, demos).
+_query_handler: QueryHandler | None = None
+
+sql_log = logging.getLogger("atfas.sql")
+
+
+def set_query_handler(handler: QueryHandler | None) -> QueryHandler | None:
+    """Route :func:`sql_query` through ``handler`` instead of SQL Server.
+
+    The handler receives the same ``(query, params)`` pair and must return a
+    DataFrame shaped like the server result. Pass ``None`` to restore the
+    ODBC connection. Returns the previously installed handler.
+    """
+    global _query_handler
+    previous, _query_handler = _query_handler, handler
+    return previous
+
+
+def _connect():
+    """Open a new ODBC connection (``pyodbc`` is imported on first use)."""
+    import pyodbc
+
+    conn = pyodbc.connect(CONNECTION)
+    if SQL_QUERY_TIMEOUT_S > 0:
+        conn.timeout = SQL_QUERY_TIMEOUT_S
+    return conn
+
+
+# =============================
+# Query supersession
+# =============================
+class QueryCancelled(RuntimeError):
+    """A newer request for the same key superseded this one; its result would be discarded."""
+
+
+@dataclass
+class _Scope:
+    key: str
+    generation: int
+    cursor: object | None = None
+    cancelled: bool = False
+
+
+_scope: contextvars.ContextVar[_Scope | None] = contextvars.ContextVar("atfas_sql_scope", default=None)
+_inflight: dict[int, _Scope] = {}  # id(scope) -> scope with a statement running in this process
+_inflight_lock = threading.Lock()
+_generations = itertools.count()
+_watcher_pid: int | None = None
+_latest: dict[str, int] = {}  # key -> newest generation, when there is no shared cache
+
+
+def _latest_key(key: str) -> str:
+    return f"supersede:{key}"
+
+
+def _claim(scope: _Scope) -> None:
+    """Publish ``scope`` as the newest generation of its key (across workers when caching is on)."""
+    from utils.cache import CACHE_ENABLED, shared_cache
+
+    if CACHE_ENABLED:
+        shared_cache().set(_latest_key(scope.key), scope.generation, ttl=3600, local=False)
+        return
+    with _inflight_lock:
+        _latest[scope.key] = max(_latest.get(scope.key, 0), scope.generation)
+
+
+def _superseded(scope: _Scope) -> bool:
+    from utils.cache import CACHE_ENABLED, shared_cache
+
+    if scope.cancelled:
+        return True
+    if CACHE_ENABLED:
+        return shared_cache().get(_latest_key(scope.key), 0, local=False) > scope.generation
+    with _inflight_lock:
+        return _latest.get(scope.key, 0) > scope.generation
+
+
+def _cancel(scope: _Scope) -> None:
+    scope.cancelled = True
+    if scope.cursor is not None:
+        try:
+            scope.cursor.cancel()  # the blocked execute/fetch raises in the owning thread
+        except Exception:  # already finished or connection gone
+            pass
+
+
+def _watch() -> None:
+    """Cancel local statements superseded by a request another worker received."""
+    while True:
+        time.sleep(SQL_SUPERSEDE_POLL_S)
+        with _inflight_lock:
+            scopes = list(_inflight.values())
+        for scope in scopes:
+            if not scope.cancelled and _superseded(scope):
+                _cancel(scope)
 
-def sql_query(query: str, params: tuple | None = None) -> pd.DataFrame:
+
+def _ensure_watcher() -> None:
+    global _watcher_pid
+    with _inflight_lock:
+        if _watcher_pid == os.getpid():
+            return
+        _watcher_pid = os.getpid()
+    threading.Thread(target=_watch, name="atfas-sql-supersede", daemon=True).start()
+
+
+@contextmanager
+def superseding(key: str | None):
+    """Run the block as the latest request for ``key`` (e.g. ``"<session>:fetch_data"``).
+
+    Entering claims a new generation for ``key`` in the shared cache and
+    cancels statements of older generations still running, in this process
+    at once and in other workers within ``SQL_SUPERSEDE_POLL_S``. With
+    ``CACHE_ENABLED`` off, generations are kept in this process only.
+    :func:`sql_query` calls inside the block raise :class:`QueryCancelled`
+    once superseded. ``None`` (or ``SQL_SUPERSEDE`` off) disables it.
+    """
+    if not key or not SQL_SUPERSEDE:
+        yield None
+        return
+    # Wall-clock ns orders claims across workers; the counter breaks ties
+    scope = _Scope(key, time.time_ns() * 1000 + next(_generations) % 1000)
+    _claim(scope)
+    with _inflight_lock:
+        older = [s for s in _inflight.values() if s.key == key and s.generation < scope.generation]
+    for s in older:
+        _cancel(s)
+    token = _scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _scope.reset(token)
+
+
+def _read_cancellable(conn, query: str, params: tuple | None, scope: _Scope) -> pd.DataFrame:
+    """``pd.read_sql`` on a cursor registered with ``scope`` so a newer request can cancel it."""
+    cur = conn.cursor()
+    scope.cursor = cur
+    with _inflight_lock:
+        _inflight[id(scope)] = scope
+    _ensure_watcher()
+    try:
+        cur.execute(query, params or ())
+        columns = [d[0] for d in cur.description]
+        rows = cur.fetchall()
+    finally:
+        with _inflight_lock:
+            _inflight.pop(id(scope), None)
+        scope.cursor = None
+        cur.close()
+    return pd.DataFrame.from_records([tuple(r) for r in rows], columns=columns, coerce_float=True)
+
+
+def _sql_logger() -> logging.Logger:
+    """Return the ``atfas.sql`` logger, attaching the rotating file on first use."""
+    if not any(isinstance(h, RotatingFileHandler) for h in sql_log.handlers):
+        os.makedirs(os.path.dirname(SQL_LOG_FILE) or ".", exist_ok=True)
+        handler = RotatingFileHandler(SQL_LOG_FILE, maxBytes=SQL_LOG_MAX_BYTES, backupCount=SQL_LOG_BACKUPS)
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        sql_log.addHandler(handler)
+        sql_log.setLevel(logging.INFO)
+        sql_log.propagate = False
+    return sql_log
+
+
+def _json_param(v):
+    if isinstance(v, (datetime, date)):
+        return v.isoformat()
+    if v is None or isinstance(v, (bool, int, float, str)):
+        return v
+    return str(v)
+
+
+def _write_record(event: str, name: str, params: tuple | None, elapsed_s: float, rows: int, **extra) -> None:
+    _sql_logger().info(json.dumps({
+        "ts": datetime.utcnow().isoformat() + "Z",
+        "event": event,
+        "statement": name,
+        "ms": round(elapsed_s * 1e3, 2),
+        "rows": rows,
+        "params": [_json_param(p) for p in (params or ())],
+        "correlation_id": current_correlation_id(),
+        **extra,
+    }))
+
+
+def _capture_enabled(name: str) -> bool:
+    if SQL_CAPTURE not in ("stats", "plan"):
+        return False
+    return not SQL_CAPTURE_STATEMENTS or name in SQL_CAPTURE_STATEMENTS
+
+
+def _read_with_capture(conn, query: str, params: tuple | None) -> tuple[pd.DataFrame, dict]:
+    """Run ``query`` with STATISTICS output enabled and collect it.
+
+    ``stats`` mode gathers the informational messages produced by
+    ``SET STATISTICS TIME, IO``; ``plan`` mode gathers the actual execution
+    plan XML returned by ``SET STATISTICS XML`` as an extra result set.
+    """
+    cur = conn.cursor()
+    if SQL_CAPTURE == "plan":
+        cur.execute("SET STATISTICS XML ON;")
+    else:
+        cur.execute("SET STATISTICS TIME ON; SET STATISTICS IO ON;")
+    cur.execute(query, params or ())
+
+    df: pd.DataFrame | None = None
+    messages: list[str] = []
+    plans: list[str] = []
+    while True:
+        messages.extend(str(m[1]) for m in (getattr(cur, "messages", None) or []))
+        if cur.description is not None:
+            columns = [d[0] for d in cur.description]
+            rows = cur.fetchall()
+            if len(columns) == 1 and "Showplan" in columns[0]:
+                plans.extend(str(r[0]) for r in rows)
+            elif df is None:
+                df = pd.DataFrame.from_records([tuple(r) for r in rows], columns=columns)
+        if not cur.nextset():
+            break
+    cur.close()
+    return (df if df is not None else pd.DataFrame()), {"mode": SQL_CAPTURE, "messages": messages, "plans": plans}
+
+
+def sql_query(query: str, params: tuple | None = None, name: str | None = None) -> pd.DataFrame:
     """Execute an SQL query and return the results as a DataFrame.
 
     Parameters
@@ -37,11 +290,91 @@ def sql_query(query: str, params: tuple | None = None) -> pd.DataFrame:
         SQL query string to execute.
     params:
         Optional sequence of parameters to pass to the query.
+    name:
+        Statement name used for metrics, the slow-query log and plan capture
+        (e.g. ``"SQL_TRAJ_BY_SECTOR"``).
 
     Returns
     -------
     pandas.DataFrame
         Data returned by the server.
+
+    Raises
+    ------
+    QueryCancelled
+        Inside :func:`superseding`, when a newer request for the same key
+        arrived before the statement started or cancelled it while running.
+        A statement that completes anyway returns normally (its result can
+        still fill the cache).
+    """
+    name = name or "adhoc"
+    captured = None
+    scope = _scope.get()
+    if scope is not None and _superseded(scope):
+        SQL_CANCELLED.inc(name, "skipped")
+        raise QueryCancelled(f"{name} superseded before it started ({scope.key})")
+    t0 = time.perf_counter()
+    try:
+        if _query_handler is not None:
+            df = _query_handler(query, params)
+        else:
+            with _connect() as conn:
+                if _capture_enabled(name):
+                    df, captured = _read_with_capture(conn, query, params)
+                elif scope is not None:
+                    df = _read_cancellable(conn, query, params, scope)
+                else:
+                    df = pd.read_sql(query, conn, params=params)
+    except Exception as exc:
+        if scope is not None and scope.cancelled:
+            SQL_CANCELLED.inc(name, "cancelled")
+            raise QueryCancelled(f"{name} cancelled after {time.perf_counter() - t0:.2f}s ({scope.key})") from exc
+        raise
+    elapsed = time.perf_counter() - t0
+    observe_sql(elapsed, len(df), name)
+
+    if captured is not None:
+        _write_record("capture", name, params, elapsed, len(df),
+                      slow=0 <= SQL_SLOW_MS <= elapsed * 1e3, **captured)
+    elif 0 <= SQL_SLOW_MS <= elapsed * 1e3:
+        _write_record("slow_query", name, params, elapsed, len(df), threshold_ms=SQL_SLOW_MS)
+    return df
+
+
+def sql_chunks(query: str, params: tuple | None = None, name: str | None = None,
+               chunk_rows: int = 5000) -> Iterator[pd.DataFrame]:
+    """Execute an SQL query and yield its rows in DataFrames of up to ``chunk_rows``.
+
+    Rows are fetched from the open cursor (``fetchmany``) as the chunks are
+    consumed, so a large result is never held whole; the connection stays
+    open until the generator is exhausted or closed. With a query handler
+    installed, the handler's frame is sliced instead. Metrics and the
+    slow-query log see the statement once, after its last chunk, with the
+    time it took to stream (which includes the consumer's time).
     """
-    with pyodbc.connect(CONNECTION) as conn:
-        return pd.read_sql(query, conn, params=params)
+    name = name or "adhoc"
+    rows = 0
+    t0 = time.perf_counter()
+    if _query_handler is not None:
+        df = _query_handler(query, params)
+        for i in range(0, len(df), chunk_rows):
+            rows += min(chunk_rows, len(df) - i)
+            yield df.iloc[i:i + chunk_rows].reset_index(drop=True)
+    else:
+        with _connect() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(query, params or ())
+                columns = [d[0] for d in cur.description]
+                while True:
+                    batch = cur.fetchmany(chunk_rows)
+                    if not batch:
+                        break
+                    rows += len(batch)
+                    yield pd.DataFrame.from_records([tuple(r) for r in batch], columns=columns, coerce_float=True)
+            finally:
+                cur.close()
+    elapsed = time.perf_counter() - t0
+    observe_sql(elapsed, rows, name)
+    if 0 <= SQL_SLOW_MS <= elapsed * 1e3:
+        _write_record("slow_query", name, params, elapsed, rows, threshold_ms=SQL_SLOW_MS, streamed=True)
@@ -0,0 +1,150 @@
+"""Demand binning shared by the app and the batch report (``python cli.py demand-report``).
+
+A flight counts once, in the 20-minute interval holding its earliest
+trajectory StartTime; intervals are aligned to 00/20/40 from the window
+start, as in the app's bar chart.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from utils.time import floor_to_20
+
+BIN = timedelta(minutes=20)
+REPORT_DB_TIMEOUT_S = float(os.getenv("REPORT_DB_TIMEOUT_S", "600"))  # wait for a DB slot before giving up
+REPORT_TOL_DEG = 0.05  # counts ignore geometry; a coarse tolerance keeps result sets small
+
+
+def bin_starts(start: datetime, end: datetime) -> list[datetime]:
+    """Interval starts from ``floor_to_20(start)`` up to ``end`` (rounded up to a whole interval)."""
+    first = floor_to_20(start)
+    n = max(1, -(-int((end - first).total_seconds()) // int(BIN.total_seconds())))
+    return [first + i * BIN for i in range(n)]
+
+
+def bin_index(start_time: datetime, aligned_start: datetime) -> int:
+    return int((start_time - aligned_start).total_seconds() // BIN.total_seconds())
+
+
+def demand_table(trajectories: pd.DataFrame, start: datetime, end: datetime, airport: str | None = None) -> pd.DataFrame:
+    """Flights per interval of ``[start, end)`` from a trajectory frame.
+
+    With ``airport``, ``Departures`` and ``Arrivals`` split out the flights
+    leaving from / landing at that airport.
+    """
+    starts = bin_starts(start, end)
+    out = pd.DataFrame({"IntervalStart": starts, "Flights": 0})
+    if airport:
+        out["Departures"] = 0
+        out["Arrivals"] = 0
+    if trajectories.empty:
+        return out
+    flights = trajectories.groupby("FlightId", sort=False).agg(
+        StartTime=("StartTime", "min"), Dep=("AirportDeparture", "first"), Arr=("AirportArrival", "first"),
+    )
+    offset = (pd.to_datetime(flights["StartTime"]) - pd.Timestamp(starts[0])).dt.total_seconds().to_numpy()
+    idx = np.floor(offset / BIN.total_seconds())
+    ok = (offset >= 0) & (idx < len(starts))
+    idx = idx[ok].astype(np.int64)
+    out["Flights"] = np.bincount(idx, minlength=len(starts))
+    if airport:
+        out["Departures"] = np.bincount(idx[(flights["Dep"] == airport).to_numpy()[ok]], minlength=len(starts))
+        out["Arrivals"] = np.bincount(idx[(flights["Arr"] == airport).to_numpy()[ok]], minlength=len(starts))
+    return out
+
+
+class DemandCounter:
+    """:func:`demand_table` over trajectory chunks arriving in ``StartTime`` order.
+
+    In that order a flight's first row is its earliest, so each chunk only
+    adds the flights not seen before; memory is one id per flight.
+    """
+
+    def __init__(self, start: datetime, end: datetime, airport: str | None = None):
+        self.starts = bin_starts(start, end)
+        self.airport = airport
+        self.seen: set = set()
+        self.flights = np.zeros(len(self.starts), dtype=np.int64)
+        self.departures = np.zeros(len(self.starts), dtype=np.int64)
+        self.arrivals = np.zeros(len(self.starts), dtype=np.int64)
+
+    def add(self, trajectories: pd.DataFrame) -> None:
+        if trajectories.empty:
+            return
+        ids = trajectories["FlightId"]
+        first = trajectories[~ids.duplicated() & ~ids.isin(self.seen)]
+        self.seen.update(first["FlightId"].tolist())
+        offset = (pd.to_datetime(first["StartTime"]) - pd.Timestamp(self.starts[0])).dt.total_seconds().to_numpy()
+        idx = np.floor(offset / BIN.total_seconds())
+        ok = (offset >= 0) & (idx < len(self.starts))
+        idx = idx[ok].astype(np.int64)
+        n = len(self.starts)
+        self.flights += np.bincount(idx, minlength=n)
+        if self.airport:
+            self.departures += np.bincount(idx[(first["AirportDeparture"] == self.airport).to_numpy()[ok]], minlength=n)
+            self.arrivals += np.bincount(idx[(first["AirportArrival"] == self.airport).to_numpy()[ok]], minlength=n)
+
+    def table(self) -> pd.DataFrame:
+        out = pd.DataFrame({"IntervalStart": self.starts, "Flights": self.flights})
+        if self.airport:
+            out["Departures"] = self.departures
+            out["Arrivals"] = self.arrivals
+        return out
+
+
+# =============================
+# Batch report tasks (run in worker processes)
+# =============================
+_db_slots = None
+
+
+def init_worker(db_slots) -> None:
+    """Process-pool initializer: remember the semaphore that bounds DB concurrency."""
+    global _db_slots
+    _db_slots = db_slots
+
+
+def run_task(task: dict) -> tuple[pd.DataFrame, dict]:
+    """Demand table and timings of one area/window.
+
+    ``task`` holds ``kind`` (``sector`` or ``airport``), ``id``, ``name``,
+    ``start``, ``end`` and ``max_rows``. Only the query holds a DB slot.
+    """
+    from utils.datasource import get_datasource
+    from utils.places import area_trajectories, place_area, place_catalog
+
+    source = get_datasource()
+    source = getattr(source, "inner", source)  # results are too large and one-off for the shared cache
+    start, end = task["start"], task["end"]
+    t0 = time.perf_counter()
+    if _db_slots is not None and not _db_slots.acquire(timeout=REPORT_DB_TIMEOUT_S):
+        raise TimeoutError(f"No DB slot within {REPORT_DB_TIMEOUT_S:.0f}s for {task['name']}")
+    t1 = time.perf_counter()
+    try:
+        if task["kind"] == "airport":
+            area = place_area(place_catalog().get("airport", task["id"]))
+            df = area_trajectories(source, area, start, end, max_rows=task["max_rows"], tol_deg=REPORT_TOL_DEG)
+        else:
+            df = source.trajectories(int(task["id"]), start, end, max_rows=task["max_rows"], tol_deg=REPORT_TOL_DEG)
+    finally:
+        if _db_slots is not None:
+            _db_slots.release()
+    t2 = time.perf_counter()
+    table = demand_table(df, start, end, airport=task["id"] if task["kind"] == "airport" else None)
+    t3 = time.perf_counter()
+    table.insert(0, "AreaType", task["kind"])
+    table.insert(1, "AreaId", str(task["id"]))
+    table.insert(2, "AreaName", task["name"])
+    table.insert(3, "WindowStart", start)
+    timing = {
+        "AreaType": task["kind"], "AreaId": str(task["id"]), "AreaName": task["name"], "WindowStart": start,
+        "Trajectories": len(df), "Flights": int(table["Flights"].sum()),
+        "WaitS": t1 - t0, "QueryS": t2 - t1, "BinS": t3 - t2, "Pid": os.getpid(),
+    }
+    return table, timing
@@ -0,0 +1,199 @@
+"""Streaming exports of a sector and window: trajectories, flight lists and demand.
+
+``GET {API_PREFIX}/sectors/<id>/export/<kind>.<fmt>`` takes the API's
+``start``/``end``/``fl_min``/``fl_max`` parameters:
+
+``trajectories.geojsonl|csv``   one row per trajectory (``tol_deg`` simplifies)
+``flights.csv|parquet``         one row per flight, from its first trajectory
+``demand.csv|parquet``          flights per 20-minute interval
+
+Rows come from :meth:`DataSource.iter_trajectories` (a server-side cursor on
+SQL Server) in chunks of ``EXPORT_CHUNK_ROWS`` and each chunk is encoded and
+sent before the next is read, so a multi-day export holds one chunk at a
+time, plus one id per flight for flight lists and demand. ``geojsonl`` is
+newline-delimited GeoJSON, one Feature per line. Parquet needs ``pyarrow``;
+every chunk becomes a row group.
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import io
+import json
+import os
+import re
+
+import pandas as pd
+
+from utils.api import FEATURE_PROPERTIES, ApiError, _float, _fl_range, _sector, _window, features
+from utils.datasource import get_datasource
+from utils.demand import REPORT_TOL_DEG, DemandCounter
+from utils.metrics import API_REQUESTS
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+EXPORT_MAX_DAYS = float(os.getenv("EXPORT_MAX_DAYS", "31"))
+
+TRAJECTORY_COLUMNS = FEATURE_PROPERTIES + ["WKT"]
+FLIGHT_COLUMNS = [
+    "FlightId", "Callsign", "AirportDeparture", "AirportArrival", "AircraftType", "WakeTurbulanceCategory",
+    "FlightRule", "FlightType", "REG", "EOBT", "ETOT", "ELDT", "ATOT", "ALDT", "FirstSeen",
+]
+DEMAND_COLUMNS = ["IntervalStart", "Flights"]
+# Parquet column types (pyarrow aliases); columns not listed are strings
+ARROW_TYPES = {
+    "FlightId": "int64", "Flights": "int64",
+    **{c: "timestamp[ms]" for c in ("EOBT", "ETOT", "ELDT", "ATOT", "ALDT", "FirstSeen", "IntervalStart")},
+}
+
+FORMATS = {
+    "trajectories": ("geojsonl", "csv"),
+    "flights": ("csv", "parquet"),
+    "demand": ("csv", "parquet"),
+}
+MIMETYPES = {"geojsonl": "application/geo+json-seq", "csv": "text/csv", "parquet": "application/vnd.apache.parquet"}
+
+
+# =============================
+# Rows
+# =============================
+def flight_rows(chunks):
+    """``FLIGHT_COLUMNS`` frames, one row per flight, from trajectory chunks in ``StartTime`` order."""
+    seen: set = set()
+    for df in chunks:
+        ids = df["FlightId"]
+        first = df[~ids.duplicated() & ~ids.isin(seen)]
+        seen.update(first["FlightId"].tolist())
+        yield first.rename(columns={"StartTime": "FirstSeen"}).reindex(columns=FLIGHT_COLUMNS)
+
+
+def demand_rows(chunks, start, end):
+    """The demand table of the whole stream, once the last chunk is counted."""
+    counter = DemandCounter(start, end)
+    for df in chunks:
+        counter.add(df)
+    yield counter.table()
+
+
+# =============================
+# Encoders
+# =============================
+def encode_geojsonl(chunks):
+    for df in chunks:
+        lines = "\n".join(features(df))
+        if lines:
+            yield lines + "\n"
+
+
+def encode_csv(frames, columns: list[str]):
+    header = True
+    for df in frames:
+        if df.empty:
+            continue
+        yield df.to_csv(index=False, header=header, date_format="%Y-%m-%dT%H:%M:%S")
+        header = False
+    if header:
+        yield ",".join(columns) + "\n"
+
+
+class _Pipe(io.RawIOBase):
+    """Write-only file whose bytes are taken out as they arrive; ``tell`` counts all of them."""
+
+    def __init__(self):
+        super().__init__()
+        self._parts: list[bytes] = []
+        self._pos = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def take(self) -> bytes:
+        out, self._parts = b"".join(self._parts), []
+        return out
+
+
+def _arrow_ready(df: pd.DataFrame, columns: list[str]) -> pd.DataFrame:
+    """``df`` coerced to the :data:`ARROW_TYPES` of ``columns``, whatever the driver returned."""
+    out = {}
+    for c in columns:
+        kind = ARROW_TYPES.get(c, "string")
+        if kind.startswith("timestamp"):
+            out[c] = pd.to_datetime(df[c], errors="coerce").astype("datetime64[ms]")
+        elif kind == "int64":
+            out[c] = pd.to_numeric(df[c], errors="coerce").astype("Int64")
+        else:
+            out[c] = df[c].astype("string")
+    return pd.DataFrame(out, columns=columns)
+
+
+def encode_parquet(frames, columns: list[str]):
+    """Parquet with the declared schema, so a chunk of NULLs cannot fix a column's type."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    schema = pa.schema([(c, pa.type_for_alias(ARROW_TYPES.get(c, "string"))) for c in columns])
+    pipe = _Pipe()
+    writer = pq.ParquetWriter(pa.PythonFile(pipe, mode="w"), schema)
+    empty = True
+    for df in frames:
+        if df.empty:
+            continue
+        writer.write_table(pa.Table.from_pandas(_arrow_ready(df, columns), schema=schema, preserve_index=False))
+        empty = False
+        yield pipe.take()
+    if empty:
+        writer.write_table(schema.empty_table())
+    writer.close()
+    yield pipe.take()
+
+
+def export_stream(kind: str, fmt: str, chunks, start, end):
+    """Encoded body chunks of one export over trajectory ``chunks``."""
+    if kind == "trajectories":
+        if fmt == "geojsonl":
+            return encode_geojsonl(chunks)
+        return encode_csv((df.reindex(columns=TRAJECTORY_COLUMNS) for df in chunks), TRAJECTORY_COLUMNS)
+    if kind == "flights":
+        frames, columns = flight_rows(chunks), FLIGHT_COLUMNS
+    else:
+        frames, columns = demand_rows(chunks, start, end), DEMAND_COLUMNS
+    return encode_csv(frames, columns) if fmt == "csv" else encode_parquet(frames, columns)
+
+
+# =============================
+# Route
+# =============================
+def sector_export(sector_id: int, kind: str, fmt: str):
+    from flask import Response, request, stream_with_context
+
+    try:
+        if fmt not in FORMATS.get(kind, ()):
+            raise ApiError(f"unknown export {kind}.{fmt}", 404)
+        if fmt == "parquet" and importlib.util.find_spec("pyarrow") is None:
+            raise ApiError("parquet export needs pyarrow on the server; use csv", 501)
+        source = get_datasource()
+        sector = _sector(source, sector_id)["sector"]
+        start, end = _window(request.args)
+        if (end - start).total_seconds() > EXPORT_MAX_DAYS * 86400:
+            raise ApiError(f"export windows are limited to {EXPORT_MAX_DAYS:g} days")
+        fl_range = _fl_range(request.args)
+        tol_deg = _float(request.args, "tol_deg", 0.0) if kind == "trajectories" else REPORT_TOL_DEG
+    except ApiError as exc:
+        API_REQUESTS.inc("sector_export", str(exc.status))
+        return Response(json.dumps({"error": str(exc)}), status=exc.status, mimetype="application/json")
+
+    chunks = source.iter_trajectories(sector_id, start, end, fl_range=fl_range, tol_deg=tol_deg,
+                                      chunk_rows=EXPORT_CHUNK_ROWS)
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", sector["name"]).strip("_") or f"sector{sector_id}"
+    filename = f"{name}_{start:%Y%m%dT%H%M}_{end:%Y%m%dT%H%M}_{kind}.{fmt}"
+    API_REQUESTS.inc("sector_export", "200")
+    return Response(stream_with_context(export_stream(kind, fmt, chunks, start, end)), mimetype=MIMETYPES[fmt],
+                    headers={"Content-Disposition": f'attachment; filename="{filename}"', "Cache-Control": "no-store",
+                             "X-Accel-Buffering": "no"})  # let nginx pass chunks through
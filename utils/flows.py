@@ -0,0 +1,153 @@
+"""Sector-to-sector traffic flows over the loaded trajectories.
+
+Trajectories are resampled onto a common clock (``FLOW_STEP_S``, see
+:func:`utils.conflicts.resample`) so every flight has time-ordered positions
+with altitude, however coarsely its geometry was simplified. Each sample is
+assigned to the ``StaticAirspace`` volume holding it: samples are sorted by
+longitude once, so each sector only tests the slice inside its bounding box,
+with a prepared ``contains_xy`` and its altitude band. Runs of samples in one
+sector are the flight's visits; consecutive visits give its transitions
+(previous -> next sector), which are counted per 20-minute interval.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from utils.conflicts import resample
+from utils.demand import BIN, bin_starts
+
+FLOW_STEP_S = float(os.getenv("FLOW_STEP_S", "30"))
+FLOW_MIN_SAMPLES = int(os.getenv("FLOW_MIN_SAMPLES", "2"))  # shorter visits are corner clips, not handovers
+
+VISIT_COLUMNS = ["FlightId", "Sector", "Entry", "Exit"]
+TRANSITION_COLUMNS = ["FlightId", "FromId", "ToId", "Time"]
+FLOW_COLUMNS = ["IntervalStart", "FromId", "From", "ToId", "To", "Flights"]
+
+
+class SectorIndex:
+    """Point-in-volume lookup over a ``StaticAirspace`` frame (:data:`SECTOR_COLUMNS`)."""
+
+    def __init__(self, sectors: pd.DataFrame):
+        geoms = shapely.from_wkt(sectors["WKT"].to_numpy(), on_invalid="ignore")
+        ok = ~shapely.is_missing(geoms) & ~shapely.is_empty(geoms)
+        # Overlapping volumes: larger ones first, so the most specific is assigned last
+        order = np.argsort(-shapely.area(geoms[ok]), kind="stable")
+        self.ids = sectors["Id"].to_numpy(dtype=np.int64)[ok][order]
+        self.names = sectors["Name"].astype(str).to_numpy()[ok][order]
+        self.lower = sectors["LowerLimitFt"].to_numpy(dtype=np.float64)[ok][order]
+        self.upper = sectors["UpperLimitFt"].to_numpy(dtype=np.float64)[ok][order]
+        self.geoms = geoms[ok][order]
+        self.bounds = shapely.bounds(self.geoms)
+        shapely.prepare(self.geoms)
+
+    def locate(self, lon: np.ndarray, lat: np.ndarray, alt: np.ndarray) -> np.ndarray:
+        """Sector Id holding each point (``-1`` outside every volume)."""
+        out = np.full(len(lon), -1, dtype=np.int64)
+        order = np.argsort(lon, kind="stable")
+        slon = lon[order]
+        for sid, geom, (x0, y0, x1, y1), lo, hi in zip(self.ids, self.geoms, self.bounds, self.lower, self.upper):
+            idx = order[np.searchsorted(slon, x0, side="left"):np.searchsorted(slon, x1, side="right")]
+            idx = idx[(lat[idx] >= y0) & (lat[idx] <= y1) & (alt[idx] >= lo) & (alt[idx] < hi)]
+            out[idx[shapely.contains_xy(geom, lon[idx], lat[idx])]] = sid
+        return out
+
+
+_index: tuple | None = None
+_lock = threading.Lock()
+
+
+def sector_index(sectors: pd.DataFrame) -> SectorIndex:
+    """:class:`SectorIndex` of ``sectors``, rebuilt only when the sector list changes."""
+    global _index
+    key = hash(tuple(zip(sectors["Id"], sectors["LowerLimitFt"], sectors["UpperLimitFt"], sectors["WKT"])))
+    with _lock:
+        if _index is not None and _index[0] == key:
+            return _index[1]
+    index = SectorIndex(sectors)
+    with _lock:
+        _index = (key, index)
+    return index
+
+
+def _runs(*keys: np.ndarray) -> np.ndarray:
+    """Start positions of runs of equal consecutive ``keys`` tuples."""
+    change = np.zeros(len(keys[0]), dtype=bool)
+    if len(change):
+        change[0] = True
+        for k in keys:
+            change[1:] |= k[1:] != k[:-1]
+    return np.flatnonzero(change)
+
+
+def sector_visits(records: list[dict], index: SectorIndex, step_s: float = FLOW_STEP_S,
+                  min_samples: int = FLOW_MIN_SAMPLES) -> pd.DataFrame:
+    """Ordered sector sequence of every flight: one row per visit, by flight and ``Entry``.
+
+    ``Entry``/``Exit`` are the first and last sample times in the sector.
+    Visits shorter than ``min_samples`` samples are dropped and the visits
+    either side of them joined, so clipping a corner is not a handover.
+    """
+    s = resample(records, step_s)
+    sector = index.locate(s["lon"], s["lat"], s["alt"])
+    inside = sector >= 0
+    k, fid, sector = s["k"][inside], s["fid"][inside], sector[inside]
+    order = np.lexsort((k, fid))
+    k, fid, sector = k[order], fid[order], sector[order]
+
+    starts = _runs(fid, sector)
+    ends = np.append(starts[1:], len(k)) - 1
+    keep = (ends - starts + 1) >= min_samples
+    starts, ends = starts[keep], ends[keep]
+    if not len(starts):
+        return pd.DataFrame(columns=VISIT_COLUMNS)
+    # Rejoin visits split by a dropped one
+    first = _runs(fid[starts], sector[starts])
+    last = np.append(first[1:], len(starts)) - 1
+    return pd.DataFrame({
+        "FlightId": fid[starts[first]],
+        "Sector": sector[starts[first]],
+        "Entry": pd.to_datetime(k[starts[first]] * step_s, unit="s"),
+        "Exit": pd.to_datetime(k[ends[last]] * step_s, unit="s"),
+    }, columns=VISIT_COLUMNS)
+
+
+def sector_transitions(visits: pd.DataFrame) -> pd.DataFrame:
+    """Previous -> next sector of every handover, timed at entry into the next sector."""
+    fid = visits["FlightId"].to_numpy()
+    same = fid[1:] == fid[:-1]
+    return pd.DataFrame({
+        "FlightId": fid[1:][same],
+        "FromId": visits["Sector"].to_numpy()[:-1][same],
+        "ToId": visits["Sector"].to_numpy()[1:][same],
+        "Time": visits["Entry"].to_numpy()[1:][same],
+    }, columns=TRANSITION_COLUMNS)
+
+
+def flow_matrix(records: list[dict], sectors: pd.DataFrame, start, end, step_s: float = FLOW_STEP_S) -> pd.DataFrame:
+    """Origin -> destination sector flows per interval of ``[start, end)``.
+
+    One row per interval and sector pair with at least one handover;
+    ``Flights`` counts the distinct flights making it in that interval.
+    """
+    index = sector_index(sectors)
+    moves = sector_transitions(sector_visits(records, index, step_s))
+    starts = bin_starts(start, end)
+    offset = (pd.to_datetime(moves["Time"]) - pd.Timestamp(starts[0])).dt.total_seconds().to_numpy()
+    idx = np.floor(offset / BIN.total_seconds())
+    ok = (offset >= 0) & (idx < len(starts))
+    moves = moves[ok].assign(Bin=idx[ok])
+    if moves.empty:
+        return pd.DataFrame(columns=FLOW_COLUMNS)
+    out = (moves.groupby(["Bin", "FromId", "ToId"], sort=True)["FlightId"].nunique()
+           .rename("Flights").reset_index())
+    names = dict(zip(index.ids.tolist(), index.names.tolist()))
+    out["IntervalStart"] = [starts[int(b)] for b in out["Bin"]]
+    out["From"] = out["FromId"].map(names)
+    out["To"] = out["ToId"].map(names)
+    return out[FLOW_COLUMNS]
@@ -2,8 +2,11 @@
 
 from __future__ import annotations
 
-from typing import Iterable
+import heapq
+import os
+from typing import Iterable, Sequence
 
+import numpy as np
 from shapely import wkt as shapely_wkt
 from shapely.geometry import LineString, MultiLineString, Polygon, MultiPolygon, Point
 
@@ -66,6 +69,167 @@ def decimate_points(points: Iterable[tuple[float, float]], n: int) -> list[tuple
     return list(points)[::n]
 
 
+# =============================
+# Budgeted simplification
+# =============================
+SIMPLIFY_METHOD = os.getenv("SIMPLIFY_METHOD", "dp").lower()  # dp (Douglas-Peucker) | vw (Visvalingam-Whyatt)
+
+
+def _flatten(paths: Sequence, ref_lat: float | None = None) -> tuple[np.ndarray, np.ndarray, np.ndarray, float]:
+    """``(lat, lon)`` point lists -> planar x/y, offsets and the reference latitude.
+
+    Longitudes are scaled by cos(``ref_lat``), by default the mean latitude
+    of the points; pass the one a cutoff was computed with to reuse it.
+    """
+    sizes = np.fromiter((len(p) for p in paths), dtype=np.int64, count=len(paths))
+    offsets = np.concatenate([[0], np.cumsum(sizes)])
+    if offsets[-1] == 0:
+        return np.empty(0), np.empty(0), offsets, (0.0 if ref_lat is None else ref_lat)
+    latlon = np.concatenate([np.asarray(p, dtype=np.float64).reshape(-1, 2) for p in paths if len(p)])
+    y, lon = latlon[:, 0], latlon[:, 1]
+    if ref_lat is None:
+        ref_lat = float(np.nanmean(y))
+    return lon * np.cos(np.radians(ref_lat)), y, offsets, ref_lat
+
+
+def _ranges(starts: np.ndarray, stops: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Concatenated ``arange(start, stop)`` for each pair, plus the owning pair index."""
+    lengths = stops - starts
+    owner = np.repeat(np.arange(len(starts)), lengths)
+    idx = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + starts[owner]
+    return idx, owner
+
+
+def dp_significance(x: np.ndarray, y: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Douglas-Peucker significance of every vertex of every path at once.
+
+    A vertex's value is the tolerance below which DP keeps it (its split
+    distance, capped by its parent's), so ``sig >= tol`` reproduces DP at
+    any tolerance. All segments of one recursion depth, across all paths,
+    are processed in a single vectorized step. Endpoints are ``inf``.
+    """
+    sig = np.zeros(len(x))
+    starts, stops = offsets[:-1], offsets[1:]
+    nonempty = stops > starts
+    sig[starts[nonempty]] = np.inf
+    sig[stops[nonempty] - 1] = np.inf
+    a, b = starts[stops - starts >= 3], stops[stops - starts >= 3] - 1
+    parent = np.full(len(a), np.inf)
+    while len(a):
+        idx, seg = _ranges(a + 1, b)
+        # Per-segment terms first, then one gather per vertex
+        xa, ya = x[a], y[a]
+        dx, dy = x[b] - xa, y[b] - ya
+        norm2 = dx * dx + dy * dy
+        norm2[norm2 == 0] = np.inf  # loop back to the start: t = 0, distance to that point
+        px, py = x[idx] - xa[seg], y[idx] - ya[seg]
+        # Distance to the segment, not its line: a turnaround beyond an end is measured to that end
+        t = np.clip((px * dx[seg] + py * dy[seg]) / norm2[seg], 0.0, 1.0)
+        dist = np.hypot(px - t * dx[seg], py - t * dy[seg])
+        # First farthest interior vertex of each segment (segments are contiguous in idx)
+        heads = np.r_[0, np.cumsum(b - a - 1)[:-1]]
+        dmax = np.maximum.reduceat(dist, heads)
+        pos = np.where(dist == dmax[seg], np.arange(len(idx)), len(idx))
+        split = idx[np.minimum.reduceat(pos, heads)]
+        value = np.minimum(dmax, parent)
+        sig[split] = value
+        na, nb, np_ = np.r_[a, split], np.r_[split, b], np.r_[value, value]
+        keep = nb - na >= 2
+        a, b, parent = na[keep], nb[keep], np_[keep]
+    return sig
+
+
+def vw_significance(x: np.ndarray, y: np.ndarray, offsets: np.ndarray) -> np.ndarray:
+    """Visvalingam-Whyatt effective area of every vertex of every path.
+
+    Vertices are removed one at a time, smallest effective area first, from
+    a heap shared by all paths (paths never interact). Each removal
+    recomputes the triangles of its two neighbours, raised to the removed
+    area so effective areas stay monotone as in the original algorithm.
+    Ties go to the lower index. Endpoints are ``inf``. The removal loop is
+    sequential Python, about ten times slower than :func:`dp_significance`.
+    """
+    n = len(x)
+    sig = np.zeros(n)
+    starts, stops = offsets[:-1], offsets[1:]
+    nonempty = stops > starts
+    sig[starts[nonempty]] = np.inf
+    sig[stops[nonempty] - 1] = np.inf
+    interior = np.flatnonzero(sig == 0)
+    if not len(interior):
+        return sig
+    xs, ys = x.tolist(), y.tolist()
+    prev, nxt = list(range(-1, n - 1)), list(range(1, n + 1))
+    p, q = interior - 1, interior + 1
+    area = 0.5 * np.abs((x[p] - x[interior]) * (y[q] - y[interior]) - (x[q] - x[interior]) * (y[p] - y[interior]))
+    current = [0.0] * n
+    for i, a in zip(interior.tolist(), area.tolist()):
+        current[i] = a
+    heap = list(zip(area.tolist(), interior.tolist()))
+    heapq.heapify(heap)
+    fixed = (sig != 0).tolist()  # endpoints, then every removed vertex
+    out = sig.tolist()
+    pop, push = heapq.heappop, heapq.heappush
+    while heap:
+        a, i = pop(heap)
+        if fixed[i] or a != current[i]:
+            continue  # removed, or superseded by a later push
+        fixed[i], out[i] = True, a
+        pi, qi = prev[i], nxt[i]
+        nxt[pi] = qi
+        prev[qi] = pi
+        if not fixed[pi]:
+            pj = prev[pi]
+            tri = 0.5 * abs((xs[pj] - xs[pi]) * (ys[qi] - ys[pi]) - (xs[qi] - xs[pi]) * (ys[pj] - ys[pi]))
+            current[pi] = tri = tri if tri > a else a
+            push(heap, (tri, pi))
+        if not fixed[qi]:
+            qj = nxt[qi]
+            tri = 0.5 * abs((xs[pi] - xs[qi]) * (ys[qj] - ys[qi]) - (xs[qj] - xs[qi]) * (ys[pi] - ys[qi]))
+            current[qi] = tri = tri if tri > a else a
+            push(heap, (tri, qi))
+    return np.array(out)
+
+
+_SIGNIFICANCE = {"dp": dp_significance, "vw": vw_significance}
+
+
+def path_significance(paths: Sequence, method: str = SIMPLIFY_METHOD,
+                      ref_lat: float | None = None) -> tuple[np.ndarray, np.ndarray, float]:
+    """Per-vertex significance for ``(lat, lon)`` paths; returns ``(sig, offsets, ref_lat)``."""
+    x, y, offsets, ref_lat = _flatten(paths, ref_lat)
+    return _SIGNIFICANCE[method](x, y, offsets), offsets, ref_lat
+
+
+def simplify_paths(paths: Sequence, budget: int, method: str = SIMPLIFY_METHOD) -> tuple[list[np.ndarray], float]:
+    """Simplify many paths to about ``budget`` vertices in total.
+
+    The budget goes to the globally most significant vertices, so straight
+    legs collapse to their endpoints while turns and holds keep detail.
+    Every path keeps its endpoints. Returns the kept indices of each path
+    and the cutoff, ``(significance, reference latitude)``, for
+    :func:`simplify_path` on later paths.
+    """
+    sig, offsets, ref_lat = path_significance(paths, method)
+    if len(sig) <= budget:
+        value = -np.inf
+    else:
+        value = float(np.partition(sig, len(sig) - budget)[len(sig) - budget])
+    keep = sig >= value
+    return [np.flatnonzero(keep[offsets[i]:offsets[i + 1]]) for i in range(len(paths))], (value, ref_lat)
+
+
+def simplify_path(points: Sequence, cutoff: tuple[float, float], method: str = SIMPLIFY_METHOD) -> np.ndarray:
+    """Kept indices of one path at a cutoff returned by :func:`simplify_paths`.
+
+    The path is projected with the cutoff's reference latitude, so the same
+    cutoff means the same tolerance as in the original call.
+    """
+    value, ref_lat = cutoff
+    sig, _offsets, _ref = path_significance([points], method, ref_lat)
+    return np.flatnonzero(sig >= value)
+
+
 def polygon_wkt_to_geojson_feature(name: str, wkt: str, props: dict | None = None) -> dict:
     """Convert WKT polygon or multipolygon to a GeoJSON Feature."""
     geom = shapely_wkt.loads(wkt)
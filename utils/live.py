@@ -0,0 +1,235 @@
+"""Server-side state for live mode: a sliding window refreshed by deltas.
+
+A :class:`LiveWindow` holds the trajectory records of the current window
+plus the order in which the browser holds them (``store-flights``, the
+Flights map trace, the interval bins and the animation samples). Each
+refresh evicts what left the window, merges rows fetched since the
+high-water mark and turns the difference into ``dash.Patch`` operations, so
+the cost of a tick follows the size of the change, not of the window.
+
+Windows are persisted incrementally so any worker can serve the next tick:
+a tick writes only its delta (evicted and upserted rows, the high-water
+mark and the small client-side layouts) under ``live:<key>:<seq>``, and
+the full window is rewritten under ``live:<key>`` every
+``LIVE_COMPACT_TICKS`` ticks. The worker that served the last tick keeps
+the window in memory (``LIVE_LOCAL_WINDOWS`` per process) and only reads
+the deltas other workers wrote since.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from utils.cache import shared_cache
+
+LIVE_REFRESH_S = float(os.getenv("LIVE_REFRESH_S", "30"))
+LIVE_TTL_S = float(os.getenv("LIVE_TTL_S", "900"))
+LIVE_COMPACT_TICKS = int(os.getenv("LIVE_COMPACT_TICKS", "10"))  # ticks between full rewrites
+LIVE_LOCAL_WINDOWS = int(os.getenv("LIVE_LOCAL_WINDOWS", "16"))  # windows kept in memory per process
+
+
+class Segments:
+    """Keys of a client-side list, each owning ``size`` consecutive entries.
+
+    Mirrors e.g. the Flights trace, where one flight is a run of vertices
+    plus a ``None`` separator, and translates removals into index deletes.
+    """
+
+    def __init__(self, items=()):
+        self.keys: list = []
+        self.sizes: list[int] = []
+        for key, size in items:
+            self.add(key, size)
+
+    def __contains__(self, key) -> bool:
+        return key in self.keys
+
+    def __len__(self) -> int:
+        return len(self.keys)
+
+    @property
+    def total(self) -> int:
+        return sum(self.sizes)
+
+    def add(self, key, size: int = 1) -> None:
+        self.keys.append(key)
+        self.sizes.append(int(size))
+
+    def offset(self, key) -> int:
+        i = self.keys.index(key)
+        return sum(self.sizes[:i])
+
+    def remove(self, keys, *targets) -> int:
+        """Drop ``keys``; emit ``del target[i]`` on every Patch location in ``targets``.
+
+        Indices are deleted from the back so earlier ones stay valid while
+        the browser applies the operations in order. Returns entries removed.
+        """
+        drop = set(keys)
+        indices, keep_keys, keep_sizes, pos = [], [], [], 0
+        for key, size in zip(self.keys, self.sizes):
+            if key in drop:
+                indices.extend(range(pos, pos + size))
+            else:
+                keep_keys.append(key)
+                keep_sizes.append(size)
+            pos += size
+        for target in targets:
+            for i in reversed(indices):
+                del target[i]
+        self.keys, self.sizes = keep_keys, keep_sizes
+        return len(indices)
+
+
+@dataclass
+class LiveWindow:
+    """Records of one sector/window in ``store-flights`` order, keyed by TrajectoryId."""
+
+    sector_id: int
+    data_source: str
+    fl_range: tuple[int, int] | None
+    start: datetime
+    end: datetime
+    rows: dict[int, dict] = field(default_factory=dict)
+    hwm: str | None = None
+    key: str = field(default_factory=lambda: uuid.uuid4().hex)
+    # Client-side layouts, filled by the app on the first tick that needs them.
+    paths: Segments | None = None
+    paths_decim: int | None = None
+    paths_cutoff: tuple[float, float] | None = None
+    bins: Segments | None = None
+    bins_anchor: datetime | None = None
+    series: Segments | None = None
+    # Ticks applied so far, the last one in the full copy (-1: none yet) and the
+    # rows changed by the current tick (not yet persisted)
+    seq: int = 0
+    base_seq: int = -1
+    evicted: list = field(default_factory=list, repr=False)
+    upserted: list = field(default_factory=list, repr=False)
+
+    @classmethod
+    def seed(cls, sector_id, data_source, fl_range, start, end, records, marks=None) -> "LiveWindow":
+        """Window over ``records`` as just sent by ``fetch_data``."""
+        window = cls(int(sector_id), data_source or "", tuple(fl_range) if fl_range else None, start, end)
+        for r in records:
+            window.rows[int(r["TrajectoryId"])] = dict(r)
+        window.hwm = max((m for m in (marks if marks is not None else
+                                      (r.get("StartTime") for r in records)) if m), default=None)
+        return window
+
+    @property
+    def width(self):
+        return self.end - self.start
+
+    def fids(self, tids) -> set:
+        return {self.rows[t]["FlightId"] for t in tids if t in self.rows}
+
+    def by_fid(self, fids) -> dict:
+        """Rows of the given flights, in window order."""
+        out: dict = {fid: [] for fid in fids}
+        for r in self.rows.values():
+            if r["FlightId"] in out:
+                out[r["FlightId"]].append(r)
+        return out
+
+    def expired(self, start: datetime) -> list[int]:
+        """TrajectoryIds that ended before ``start``."""
+        cutoff = start.isoformat()
+        return [t for t, r in self.rows.items() if r.get("EndTime") and r["EndTime"] < cutoff]
+
+    def apply(self, patch, evicted, records, marks=()) -> tuple[list[int], list[int]]:
+        """Evict and upsert rows, recording the matching ``store-flights`` Patch ops.
+
+        Returns ``(added, updated)`` TrajectoryIds; added rows are appended
+        after the survivors, updated ones are replaced in place and unchanged
+        ones are skipped.
+        """
+        order = Segments((t, 1) for t in self.rows)
+        order.remove(evicted, patch)
+        for t in evicted:
+            self.rows.pop(t, None)
+        added, updated = [], []
+        for r in records:
+            tid = int(r["TrajectoryId"])
+            if self.rows.get(tid) == r:
+                continue  # re-read at the high-water mark, unchanged
+            if tid in self.rows:
+                patch[order.offset(tid)] = r
+                updated.append(tid)
+            else:
+                patch.append(r)
+                order.add(tid)
+                added.append(tid)
+            self.rows[tid] = r
+        self.hwm = max([m for m in marks if m] + ([self.hwm] if self.hwm else []), default=None)
+        self.evicted += list(evicted)
+        self.upserted += added + updated
+        return added, updated
+
+    def delta(self) -> dict:
+        """What the current tick changed: rows, high-water mark, bounds and layouts."""
+        return {
+            "evicted": self.evicted, "rows": [self.rows[t] for t in dict.fromkeys(self.upserted) if t in self.rows],
+            "hwm": self.hwm, "start": self.start, "end": self.end,
+            "layouts": {name: getattr(self, name) for name in _LAYOUTS},
+        }
+
+    def replay(self, delta: dict) -> None:
+        """Apply a :meth:`delta` written by another worker."""
+        for t in delta["evicted"]:
+            self.rows.pop(t, None)
+        for r in delta["rows"]:
+            self.rows[int(r["TrajectoryId"])] = r
+        self.hwm, self.start, self.end = delta["hwm"], delta["start"], delta["end"]
+        for name, value in delta["layouts"].items():
+            setattr(self, name, value)
+        self.seq += 1
+
+
+_LAYOUTS = ("paths", "paths_decim", "paths_cutoff", "bins", "bins_anchor", "series")
+
+_windows: OrderedDict[str, LiveWindow] = OrderedDict()
+_lock = threading.Lock()
+
+
+def save_window(window: LiveWindow) -> None:
+    """Persist a new window, or the tick just applied to one from :func:`load_window`."""
+    cache = shared_cache()
+    if window.base_seq >= 0:
+        window.seq += 1
+        cache.set(f"live:{window.key}:{window.seq}", window.delta(), LIVE_TTL_S, local=False)
+    window.evicted, window.upserted = [], []
+    if window.base_seq < 0 or window.seq - window.base_seq >= LIVE_COMPACT_TICKS:
+        window.base_seq = window.seq
+        cache.set(f"live:{window.key}", window, LIVE_TTL_S, local=False)
+    with _lock:
+        _windows[window.key] = window
+        _windows.move_to_end(window.key)
+        while len(_windows) > LIVE_LOCAL_WINDOWS:
+            _windows.popitem(last=False)
+
+
+def load_window(key: str | None) -> LiveWindow | None:
+    """The window ``key`` up to its latest tick, or ``None`` once it has expired.
+
+    The caller owns the returned window until :func:`save_window`; it is
+    taken out of the process-local copies meanwhile, so a tick that fails
+    half-way is reloaded from the shared cache next time.
+    """
+    if not key:
+        return None
+    cache = shared_cache()
+    with _lock:
+        window = _windows.pop(key, None)
+    if window is None:
+        window = cache.get(f"live:{key}", local=False)
+        if window is None:
+            return None
+    while (delta := cache.get(f"live:{key}:{window.seq + 1}", local=False)) is not None:
+        window.replay(delta)
+    return window
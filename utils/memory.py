@@ -0,0 +1,244 @@
+"""Memory accounting and budgets for datasets, animation samples and figures.
+
+Every browser tab holds its own ``store-flights``, ``store-sampled`` and map
+figure (and ships them back with the callbacks that read them), while each
+worker keeps recently used datasets decoded in the tier-1 LRU of
+:mod:`utils.cache`. This module puts a size on both:
+
+* :func:`estimate_bytes` approximates what a dataset, frame, array, figure or
+  JSON-like value holds (long lists are sampled);
+* :data:`ledger` keeps the estimate per session (``store-session``) and kind
+  (``flights``, ``sampled``, ``figure``), updated by the callbacks producing
+  them; sessions idle for ``MEM_SESSION_IDLE_S`` are forgotten;
+* :func:`fit_to_budget` coarsens a dataset's geometry when it would take its
+  session past ``MEM_SESSION_MB``;
+* ``MEM_GLOBAL_MB`` bounds the decoded cache entries per process, least
+  recently used out first (see :class:`utils.cache.SharedCache`).
+
+With ``MEMORY_ROUTE_ENABLED`` (off by default: a debugging aid),
+``MEMORY_ROUTE`` serves the report as JSON; with ``MEMORY_TRACEMALLOC`` it
+adds the top allocation sites of a ``tracemalloc`` snapshot (``?compare=1``:
+growth since the previous request).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+MEM_SESSION_MB = float(os.getenv("MEM_SESSION_MB", "96"))    # per browser tab (0 = no budget)
+MEM_GLOBAL_MB = float(os.getenv("MEM_GLOBAL_MB", "512"))     # decoded cache entries per process (0 = no budget)
+MEM_SESSION_IDLE_S = float(os.getenv("MEM_SESSION_IDLE_S", "1800"))
+MEM_MAX_TOL_DEG = float(os.getenv("MEM_MAX_TOL_DEG", "0.02"))  # coarsest geometry a budget may force
+MEMORY_ROUTE_ENABLED = os.getenv("MEMORY_ROUTE_ENABLED", "False").lower() == "true"
+MEMORY_ROUTE = os.getenv("MEMORY_ROUTE", "/debug/memory")
+MEMORY_TRACEMALLOC = os.getenv("MEMORY_TRACEMALLOC", "False").lower() == "true"
+MEMORY_TRACEMALLOC_FRAMES = int(os.getenv("MEMORY_TRACEMALLOC_FRAMES", "1"))
+
+log = logging.getLogger("atfas.memory")
+
+# A session's flights reappear as animation samples and as the map figure
+DEFAULT_EXPANSION = 3.0
+_SAMPLE = 64
+_MAX_DEPTH = 12
+
+
+# =============================
+# Estimates
+# =============================
+def estimate_bytes(obj, _depth: int = 0) -> int:
+    """Approximate bytes held by ``obj`` and what it references.
+
+    Arrays, frames and :class:`~utils.dataset.TrajectoryDataset` report their
+    buffers; containers are walked (lists longer than 64 items through an
+    evenly spaced sample); figures through ``to_plotly_json()``.
+    """
+    if obj is None or isinstance(obj, (bool, int, float, str, bytes, bytearray)) or _depth > _MAX_DEPTH:
+        return sys.getsizeof(obj)
+    if isinstance(obj, np.ndarray):
+        if obj.dtype == object:
+            return obj.nbytes + _items_bytes(obj.ravel(), _depth)
+        return obj.nbytes
+    if isinstance(obj, (pd.DataFrame, pd.Series)):
+        return int(np.sum(obj.memory_usage(deep=True)))
+    if isinstance(obj, dict):
+        return sys.getsizeof(obj) + _items_bytes(list(obj.keys()), _depth) + _items_bytes(list(obj.values()), _depth)
+    if isinstance(obj, (list, tuple)):
+        return sys.getsizeof(obj) + _items_bytes(obj, _depth)
+    if isinstance(obj, (set, frozenset)):
+        return sys.getsizeof(obj) + _items_bytes(list(obj), _depth)
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, (int, np.integer)):
+        return int(nbytes) + sys.getsizeof(obj)
+    if hasattr(obj, "to_plotly_json"):
+        return estimate_bytes(obj.to_plotly_json(), _depth + 1)
+    attrs = getattr(obj, "__dict__", None)
+    if attrs is None:
+        attrs = {k: getattr(obj, k) for k in getattr(type(obj), "__slots__", ()) if hasattr(obj, k)}
+    return sys.getsizeof(obj) + (estimate_bytes(attrs, _depth + 1) if attrs else 0)
+
+
+def _items_bytes(items, depth: int) -> int:
+    n = len(items)
+    if n <= _SAMPLE:
+        return sum(estimate_bytes(v, depth + 1) for v in items)
+    step = n / _SAMPLE
+    sampled = sum(estimate_bytes(items[int(i * step)], depth + 1) for i in range(_SAMPLE))
+    return int(sampled * n / _SAMPLE)
+
+
+def process_rss() -> int | None:
+    """Resident set size of this process in bytes (``None`` where it cannot be read)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# =============================
+# Per-session ledger
+# =============================
+class MemoryLedger:
+    """Estimated bytes per session and kind, least recently touched session first."""
+
+    def __init__(self, idle_s: float = MEM_SESSION_IDLE_S):
+        self.idle_s = idle_s
+        self._sessions: OrderedDict[str, tuple[float, dict[str, int]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def record(self, session: str | None, kind: str, nbytes: int) -> None:
+        if not session:
+            return
+        now = time.time()
+        with self._lock:
+            _touched, kinds = self._sessions.pop(session, (now, {}))
+            kinds[kind] = int(nbytes)
+            self._sessions[session] = (now, kinds)
+            while self._sessions:
+                oldest, (touched, _kinds) = next(iter(self._sessions.items()))
+                if now - touched <= self.idle_s:
+                    break
+                del self._sessions[oldest]
+
+    def usage(self, session: str | None) -> dict[str, int]:
+        with self._lock:
+            return dict(self._sessions.get(session, (0.0, {}))[1]) if session else {}
+
+    def expansion(self, session: str | None) -> float:
+        """Session bytes per byte of flights, as last measured (``DEFAULT_EXPANSION`` before that)."""
+        usage = self.usage(session)
+        if usage.get("flights") and {"sampled", "figure"} <= usage.keys():
+            return max(1.0, sum(usage.values()) / usage["flights"])
+        return DEFAULT_EXPANSION
+
+    def report(self, top: int = 10) -> dict:
+        with self._lock:
+            sessions = [(s, touched, dict(kinds)) for s, (touched, kinds) in self._sessions.items()]
+        by_kind: dict[str, int] = {}
+        for _s, _touched, kinds in sessions:
+            for kind, n in kinds.items():
+                by_kind[kind] = by_kind.get(kind, 0) + n
+        sessions.sort(key=lambda item: sum(item[2].values()), reverse=True)
+        now = time.time()
+        return {
+            "sessions": len(sessions),
+            "bytes": sum(by_kind.values()),
+            "by_kind": by_kind,
+            "top": [{"session": s[:8], "bytes": sum(kinds.values()), "by_kind": kinds,
+                     "idle_s": round(now - touched, 1)} for s, touched, kinds in sessions[:top]],
+        }
+
+
+ledger = MemoryLedger()
+
+
+def fit_to_budget(ds, session: str | None = None, tol_deg: float = 0.0, budget_mb: float = MEM_SESSION_MB,
+                  max_tol_deg: float = MEM_MAX_TOL_DEG):
+    """``(dataset, tolerance)`` whose estimated session footprint fits ``budget_mb``.
+
+    The footprint is ``ds.nbytes`` times the session's measured expansion into
+    samples and figure. Over budget, the geometry is simplified with a
+    tolerance doubling from ``tol_deg``, capped at ``max_tol_deg`` (which is
+    always tried); if even that does not fit, the coarsest dataset is
+    returned and a warning logged. The tolerance is ``None`` when ``ds`` is
+    returned unchanged.
+    """
+    budget = budget_mb * 2**20
+    factor = ledger.expansion(session)
+    if budget <= 0 or ds.nbytes * factor <= budget:
+        return ds, None
+    out, tol, used = ds, max(tol_deg, 1e-4), None
+    while tol < max_tol_deg:
+        tol = min(tol * 2, max_tol_deg)
+        out, used = ds.simplified(tol), tol
+        if out.nbytes * factor <= budget:
+            return out, used
+    log.warning("session %s: %.1f MiB still over its %g MiB budget at MEM_MAX_TOL_DEG=%g°",
+                session, out.nbytes * factor / 2**20, budget_mb, max_tol_deg)
+    return out, used
+
+
+# =============================
+# Report and tracemalloc route
+# =============================
+_last_snapshot: tracemalloc.Snapshot | None = None
+
+
+def start_tracing(frames: int = MEMORY_TRACEMALLOC_FRAMES) -> None:
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def allocation_sites(top: int = 25, compare: bool = False) -> dict | None:
+    """Largest allocation sites of a ``tracemalloc`` snapshot (``None`` when not tracing)."""
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        return None
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ))
+    key = "traceback" if tracemalloc.get_traceback_limit() > 1 else "lineno"
+    if compare and _last_snapshot is not None:
+        stats = snapshot.compare_to(_last_snapshot, key)
+        sites = [{"where": stat.traceback.format(), "kib": round(stat.size / 1024, 1),
+                  "kib_diff": round(stat.size_diff / 1024, 1), "count": stat.count} for stat in stats[:top]]
+    else:
+        sites = [{"where": stat.traceback.format(), "kib": round(stat.size / 1024, 1), "count": stat.count}
+                 for stat in snapshot.statistics(key)[:top]]
+    _last_snapshot = snapshot
+    current, peak = tracemalloc.get_traced_memory()
+    return {"traced_mib": round(current / 2**20, 1), "peak_mib": round(peak / 2**20, 1), "sites": sites}
+
+
+def memory_report(top: int = 25, compare: bool = False) -> dict:
+    from utils.cache import shared_cache
+
+    rss = process_rss()
+    return {
+        "pid": os.getpid(),
+        "rss_mib": round(rss / 2**20, 1) if rss is not None else None,
+        "budgets_mib": {"session": MEM_SESSION_MB, "global": MEM_GLOBAL_MB},
+        "cache": shared_cache().local_usage(),
+        "sessions": ledger.report(top),
+        "tracemalloc": allocation_sites(top, compare),
+    }
+
+
+def register_memory_route(server, route: str = MEMORY_ROUTE) -> None:
+    from flask import Response, request
+
+    @server.route(route)
+    def _memory():
+        report = memory_report(int(request.args.get("top", 25)), request.args.get("compare") == "1")
+        return Response(json.dumps(report), mimetype="application/json")
@@ -0,0 +1,289 @@
+"""Callback and SQL instrumentation with a Prometheus text endpoint."""
+
+from __future__ import annotations
+
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() == "true"
+METRICS_ROUTE = os.getenv("METRICS_ROUTE", "/metrics")
+REQUEST_LOG = os.getenv("REQUEST_LOG", "False").lower() == "true"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(10))  # 1 KiB .. 256 MiB
+ROWS_BUCKETS = (0, 1, 10, 100, 500, 1000, 2000, 5000, 10000, 50000)
+
+request_log = logging.getLogger("atfas.requests")
+
+
+class Histogram:
+    """Cumulative-bucket histogram keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...], buckets: tuple):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(float(b) for b in buckets)
+        self._series: dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        with self._lock:
+            s = self._series.setdefault(label_values, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    s[0][i] += 1
+            s[1] += value
+            s[2] += 1
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for values, (counts, total, n) in sorted(self._series.items()):
+                base = _labels(self.labels, values)
+                sep = "," if base else ""
+                for bound, c in zip(self.buckets, counts):
+                    lines.append(f'{self.name}_bucket{{{base}{sep}le="{_fmt(bound)}"}} {c}')
+                lines.append(f'{self.name}_bucket{{{base}{sep}le="+Inf"}} {n}')
+                suffix = f"{{{base}}}" if base else ""
+                lines.append(f"{self.name}_sum{suffix} {_fmt(total)}")
+                lines.append(f"{self.name}_count{suffix} {n}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter keyed by a tuple of label values."""
+
+    def __init__(self, name: str, help_text: str, labels: tuple[str, ...]):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._series: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, v in sorted(self._series.items()):
+                lines.append(f"{self.name}{{{_labels(self.labels, values)}}} {_fmt(v)}")
+        return lines
+
+
+def _fmt(v: float) -> str:
+    return repr(float(v)) if not float(v).is_integer() else str(int(v))
+
+
+def _labels(names: tuple[str, ...], values: tuple) -> str:
+    def esc(v) -> str:
+        return str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return ",".join(f'{k}="{esc(v)}"' for k, v in zip(names, values))
+
+
+CALLBACK_SECONDS = Histogram("atfas_callback_duration_seconds", "Wall time of Dash callbacks.",
+                             ("callback",), LATENCY_BUCKETS)
+CALLBACK_SQL_SECONDS = Histogram("atfas_callback_sql_seconds", "SQL time spent inside a callback.",
+                                 ("callback",), LATENCY_BUCKETS)
+CALLBACK_ROWS = Histogram("atfas_callback_rows", "Rows returned by SQL inside a callback.",
+                          ("callback",), ROWS_BUCKETS)
+CALLBACK_INPUT_BYTES = Histogram("atfas_callback_input_bytes", "Callback request payload size.",
+                                 ("callback",), BYTES_BUCKETS)
+CALLBACK_OUTPUT_BYTES = Histogram("atfas_callback_output_bytes", "Callback response payload size.",
+                                  ("callback",), BYTES_BUCKETS)
+CALLBACK_EXCEPTIONS = Counter("atfas_callback_exceptions_total", "Exceptions raised by callbacks.",
+                              ("callback", "exception"))
+SQL_SECONDS = Histogram("atfas_sql_query_seconds", "Duration of sql_query calls.",
+                        ("statement",), LATENCY_BUCKETS)
+SQL_ROWS = Histogram("atfas_sql_query_rows", "Rows returned by sql_query calls.",
+                     ("statement",), ROWS_BUCKETS)
+SQL_CANCELLED = Counter("atfas_sql_cancelled_total", "Statements cancelled or skipped because a newer request "
+                        "from the same session superseded them.", ("statement", "stage"))
+CACHE_REQUESTS = Counter("atfas_cache_requests_total", "Shared cache lookups by namespace and outcome.",
+                         ("namespace", "result"))
+CACHE_LOCAL_EVICTIONS = Counter("atfas_cache_local_evictions_total", "Decoded entries dropped from a worker's LRU "
+                                "by namespace and the limit that forced it.", ("namespace", "limit"))
+SESSION_COARSENED = Counter("atfas_session_coarsened_total", "Datasets sent with coarser geometry to fit "
+                            "MEM_SESSION_MB.", ("callback",))
+API_REQUESTS = Counter("atfas_api_requests_total", "REST API responses by endpoint and status.",
+                       ("endpoint", "status"))
+PREFETCH_TASKS = Counter("atfas_prefetch_tasks_total", "Prefetch plans by kind (window|sector) and outcome "
+                         "(warmed|cached|busy|dropped|failed).", ("kind", "outcome"))
+PREFETCH_HITS = Counter("atfas_prefetch_hits_total", "Foreground fetches served by a prefetched dataset; "
+                        "hit rate = hits / warmed.", ("kind",))
+
+REGISTRY: list[Histogram | Counter] = [
+    CALLBACK_SECONDS, CALLBACK_SQL_SECONDS, CALLBACK_ROWS, CALLBACK_INPUT_BYTES,
+    CALLBACK_OUTPUT_BYTES, CALLBACK_EXCEPTIONS, SQL_SECONDS, SQL_ROWS, SQL_CANCELLED, CACHE_REQUESTS,
+    CACHE_LOCAL_EVICTIONS, SESSION_COARSENED, API_REQUESTS, PREFETCH_TASKS, PREFETCH_HITS,
+]
+
+
+def render_prometheus() -> str:
+    """Return every registered metric in Prometheus text exposition format."""
+    lines: list[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+@dataclass
+class CallbackStats:
+    """Per-invocation accumulator shared between a callback and ``sql_query``."""
+
+    callback: str
+    correlation_id: str
+    wall_s: float = 0.0
+    sql_s: float = 0.0
+    sql_calls: int = 0
+    rows: int = 0
+    exception: str | None = None
+    extra: dict = field(default_factory=dict)
+
+
+_current: contextvars.ContextVar[CallbackStats | None] = contextvars.ContextVar("atfas_callback", default=None)
+
+
+def current_stats() -> CallbackStats | None:
+    """Stats of the callback running in this context, if any."""
+    return _current.get()
+
+
+def current_correlation_id() -> str | None:
+    stats = _current.get()
+    return stats.correlation_id if stats else None
+
+
+def observe_sql(seconds: float, rows: int, statement: str = "adhoc") -> None:
+    """Record one ``sql_query`` round-trip (called from :mod:`utils.db`)."""
+    if not METRICS_ENABLED:
+        return
+    SQL_SECONDS.observe(seconds, statement)
+    SQL_ROWS.observe(rows, statement)
+    stats = _current.get()
+    if stats is not None:
+        stats.sql_s += seconds
+        stats.sql_calls += 1
+        stats.rows += rows
+
+
+def _request_correlation_id() -> str:
+    try:
+        from flask import g, has_request_context, request
+    except ImportError:  # pragma: no cover - flask ships with dash
+        return uuid.uuid4().hex
+    if not has_request_context():
+        return uuid.uuid4().hex
+    if "atfas_correlation_id" not in g:
+        g.atfas_correlation_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    return g.atfas_correlation_id
+
+
+def instrument_callback(func):
+    """Wrap a callback so each call feeds the callback histograms."""
+    name = func.__name__
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        stats = CallbackStats(callback=name, correlation_id=_request_correlation_id())
+        token = _current.set(stats)
+        t0 = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        except Exception as exc:
+            # PreventUpdate is control flow, not a failure.
+            if type(exc).__name__ != "PreventUpdate":
+                stats.exception = type(exc).__name__
+                CALLBACK_EXCEPTIONS.inc(name, stats.exception)
+            raise
+        finally:
+            stats.wall_s = time.perf_counter() - t0
+            _current.reset(token)
+            CALLBACK_SECONDS.observe(stats.wall_s, name)
+            CALLBACK_SQL_SECONDS.observe(stats.sql_s, name)
+            if stats.sql_calls:
+                CALLBACK_ROWS.observe(stats.rows, name)
+            _attach_to_request(stats)
+
+    return wrapper
+
+
+def instrument_callbacks(register):
+    """Wrap a callback decorator factory (``app.callback``, ``dash.callback``) to instrument each callback."""
+    if not METRICS_ENABLED:
+        return register
+
+    @functools.wraps(register)
+    def callback(*args, **kwargs):
+        decorator = register(*args, **kwargs)
+        return lambda func: decorator(instrument_callback(func))
+
+    return callback
+
+
+def _attach_to_request(stats: CallbackStats) -> None:
+    try:
+        from flask import g, has_request_context
+    except ImportError:  # pragma: no cover
+        return
+    if has_request_context():
+        g.atfas_callback_stats = stats
+
+
+def instrument_app(app) -> None:
+    """Instrument every ``@app.callback`` declared after this call.
+
+    Also registers the metrics route on ``app.server`` and request hooks that
+    record payload sizes, propagate ``X-Request-ID`` and optionally write one
+    structured JSON log line per callback request.
+    """
+    if not METRICS_ENABLED:
+        return
+    app.callback = instrument_callbacks(app.callback)
+
+    if REQUEST_LOG and not request_log.handlers:
+        request_log.addHandler(logging.StreamHandler())
+        request_log.setLevel(logging.INFO)
+
+    from flask import Response, g, request
+
+    server = app.server
+
+    @server.route(METRICS_ROUTE)
+    def _metrics():
+        return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+    @server.after_request
+    def _record_payload(response):
+        stats = g.pop("atfas_callback_stats", None)
+        if stats is None:
+            return response
+        in_bytes = request.content_length or 0
+        out_bytes = response.calculate_content_length() or 0
+        CALLBACK_INPUT_BYTES.observe(in_bytes, stats.callback)
+        CALLBACK_OUTPUT_BYTES.observe(out_bytes, stats.callback)
+        response.headers["X-Request-ID"] = stats.correlation_id
+        if REQUEST_LOG:
+            request_log.info(json.dumps({
+                "correlation_id": stats.correlation_id,
+                "callback": stats.callback,
+                "wall_ms": round(stats.wall_s * 1e3, 2),
+                "sql_ms": round(stats.sql_s * 1e3, 2),
+                "sql_calls": stats.sql_calls,
+                "rows": stats.rows,
+                "input_bytes": in_bytes,
+                "output_bytes": out_bytes,
+                "status": response.status_code,
+                "exception": stats.exception,
+                **stats.extra,
+            }))
+        return response
@@ -0,0 +1,282 @@
+"""Airport and waypoint areas and the proximity engine behind them.
+
+:class:`PlaceCatalog` holds airport/waypoint coordinates read from
+``PLACES_PATH`` (CSV with ``Kind, Code, Name, Lat, Lon``). An :class:`Area`
+is a cylinder around one place: a radius in NM and an altitude band.
+
+Area queries run on a :class:`TrackIndex`: the trajectories of an
+hour-aligned window crossing a ``TRACK_TILE_DEG`` block of tiles around the
+area, parsed once into flat vertex arrays and bucketed on a lat/lon grid. A
+query is then a few grid-row lookups and a vectorized haversine over the
+candidate vertices; the index lives in :func:`utils.cache.shared_cache` for
+``TRACK_INDEX_TTL_S`` so every worker, and every nearby place, reuses it.
+"""
+
+from __future__ import annotations
+
+import os
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from utils.cache import CACHE_ENABLED, make_key, shared_cache
+from utils.columnar import _parse_profile, _ranges
+from utils.datasource import TRAJ_COLUMNS, DataSource
+
+PLACES_PATH = os.getenv("PLACES_PATH", "places.csv")
+AIRPORT_RADIUS_NM = float(os.getenv("AIRPORT_RADIUS_NM", "30"))
+AIRPORT_CEILING_FT = int(os.getenv("AIRPORT_CEILING_FT", "10000"))
+WAYPOINT_RADIUS_NM = float(os.getenv("WAYPOINT_RADIUS_NM", "10"))
+TRACK_GRID_DEG = float(os.getenv("TRACK_GRID_DEG", "0.25"))  # grid cell size of the vertex index
+TRACK_TILE_DEG = float(os.getenv("TRACK_TILE_DEG", "2"))  # an index covers whole tiles around the area
+TRACK_INDEX_TTL_S = float(os.getenv("TRACK_INDEX_TTL_S", "900"))
+
+PLACE_KINDS = ("airport", "waypoint")
+EARTH_RADIUS_NM = 3440.065
+
+
+def haversine_nm(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distance in NM; arguments broadcast like NumPy arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(v, dtype=np.float64)) for v in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_NM * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+
+# =============================
+# Catalog
+# =============================
+@dataclass(frozen=True)
+class Place:
+    kind: str
+    code: str
+    name: str
+    lat: float
+    lon: float
+
+
+@dataclass(frozen=True)
+class Area:
+    """Cylinder of ``radius_nm`` around ``place`` between ``min_ft`` and ``max_ft``."""
+
+    place: Place
+    radius_nm: float
+    min_ft: int = 0
+    max_ft: int = 99999
+
+    def bounds(self) -> tuple[float, float, float, float]:
+        """``(min_lon, min_lat, max_lon, max_lat)`` enclosing the footprint."""
+        lat, lon = self.place.lat, self.place.lon
+        dlat = self.radius_nm / 60.0
+        dlon = dlat / max(np.cos(np.radians(min(abs(lat) + dlat, 89.0))), 1e-6)
+        return lon - dlon, lat - dlat, lon + dlon, lat + dlat
+
+    @property
+    def label(self) -> str:
+        low = "SFC" if self.min_ft <= 0 else f"FL{self.min_ft // 100}"
+        high = "UNL" if self.max_ft >= 99999 else f"FL{self.max_ft // 100}"
+        return f"{self.place.code} {self.radius_nm:g} NM {low}–{high}"
+
+    def feature(self, n: int = 72) -> dict:
+        """GeoJSON polygon of the area's footprint (a geodesic circle)."""
+        lat0, lon0 = np.radians(self.place.lat), np.radians(self.place.lon)
+        d = self.radius_nm / EARTH_RADIUS_NM
+        brg = np.linspace(0.0, 2 * np.pi, n + 1)
+        lat = np.arcsin(np.sin(lat0) * np.cos(d) + np.cos(lat0) * np.sin(d) * np.cos(brg))
+        lon = lon0 + np.arctan2(np.sin(brg) * np.sin(d) * np.cos(lat0), np.cos(d) - np.sin(lat0) * np.sin(lat))
+        ring = np.column_stack([np.degrees(lon), np.degrees(lat)]).round(6).tolist()
+        return {
+            "type": "Feature",
+            "id": 0,
+            "properties": {"name": self.label, "kind": self.place.kind.capitalize(), "code": self.place.code},
+            "geometry": {"type": "Polygon", "coordinates": [ring]},
+        }
+
+
+class PlaceCatalog:
+    """Airports and waypoints by ``(kind, code)``."""
+
+    def __init__(self, frame: pd.DataFrame):
+        df = frame.rename(columns=str.capitalize)
+        df["Kind"] = df["Kind"].str.strip().str.lower()
+        df["Code"] = df["Code"].str.strip().str.upper()
+        df = df[df["Kind"].isin(PLACE_KINDS)].drop_duplicates(["Kind", "Code"], keep="last")
+        self.places: dict[tuple[str, str], Place] = {
+            (r.Kind, r.Code): Place(r.Kind, r.Code, str(r.Name if pd.notna(r.Name) else r.Code), float(r.Lat), float(r.Lon))
+            for r in df.sort_values("Code").itertuples(index=False)
+        }
+
+    @classmethod
+    def from_csv(cls, path: str | os.PathLike) -> "PlaceCatalog":
+        if not os.path.isfile(path):
+            return cls(pd.DataFrame(columns=["Kind", "Code", "Name", "Lat", "Lon"]))
+        return cls(pd.read_csv(path, comment="#", skipinitialspace=True, dtype={"Code": str, "Name": str}))
+
+    def get(self, kind: str, code: str | None) -> Place | None:
+        return self.places.get((kind, str(code).upper())) if code else None
+
+    def options(self, kind: str) -> list[dict]:
+        """Dropdown options for one kind, ordered by code."""
+        return [{"label": f"{p.code} — {p.name}", "value": p.code} for (k, _c), p in self.places.items() if k == kind]
+
+
+_catalog: PlaceCatalog | None = None
+
+
+def place_catalog() -> PlaceCatalog:
+    """Process-wide :class:`PlaceCatalog` read from ``PLACES_PATH``."""
+    global _catalog
+    if _catalog is None:
+        _catalog = PlaceCatalog.from_csv(PLACES_PATH)
+    return _catalog
+
+
+def place_area(place: Place, radius_nm: float | None = None, fl_range: tuple[int, int] | None = None) -> Area:
+    """Default area of a place: surface to ``AIRPORT_CEILING_FT`` for airports, any level for waypoints.
+
+    ``fl_range`` narrows the band (airports) or sets it (waypoints).
+    """
+    if place.kind == "airport":
+        radius = radius_nm or AIRPORT_RADIUS_NM
+        low, high = 0, AIRPORT_CEILING_FT
+        if fl_range:
+            low, high = max(low, int(fl_range[0])), min(high, int(fl_range[1]))
+    else:
+        radius = radius_nm or WAYPOINT_RADIUS_NM
+        low, high = (int(fl_range[0]), int(fl_range[1])) if fl_range else (0, 99999)
+    return Area(place, float(radius), low, high)
+
+
+# =============================
+# Trajectory index
+# =============================
+class TrackIndex:
+    """Trajectories of one window as flat vertex arrays plus a lat/lon grid.
+
+    Vertices are sorted by grid cell (row-major), so the cells of one grid
+    row covering an area are a single contiguous run found with two binary
+    searches. Membership is tested on vertices, which at full resolution are
+    a few seconds of flight apart.
+    """
+
+    def __init__(self, trajectories: pd.DataFrame, grid_deg: float = TRACK_GRID_DEG):
+        df = trajectories.reset_index(drop=True)
+        self.grid_deg = float(grid_deg)
+        geoms = shapely.from_wkt(df["WKT"].to_numpy(), on_invalid="ignore")
+        coords, owner = shapely.get_coordinates(geoms, return_index=True)
+        counts = np.bincount(owner, minlength=len(df)).astype(np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.lon = coords[:, 0].copy()
+        self.lat = coords[:, 1].copy()
+        self.row = owner.astype(np.int32)
+
+        # Per-vertex altitude where the profile lines up with the geometry, NaN elsewhere
+        values, alt_offsets = _parse_profile(df["AltitudeFt"] if "AltitudeFt" in df else pd.Series([None] * len(df)))
+        alt_counts = np.diff(alt_offsets)
+        self.alt = np.full(len(coords), np.nan, dtype=np.float32)
+        ok = alt_counts == counts
+        src = values[_ranges(alt_offsets[:-1][ok], counts[ok])].astype(np.float32)
+        src[src == np.iinfo(np.int32).min] = np.nan
+        self.alt[_ranges(self.offsets[:-1][ok], counts[ok])] = src
+
+        self.start = pd.to_datetime(df["StartTime"]).to_numpy(dtype="datetime64[ms]")
+        self.end = pd.to_datetime(df["EndTime"]).to_numpy(dtype="datetime64[ms]")
+        self.attrs = df.drop(columns=["WKT"])
+
+        keys = self._cell(self.lat, self.lon)
+        self._order = np.argsort(keys, kind="stable")
+        self._keys = keys[self._order]
+
+    def __len__(self) -> int:
+        return len(self.attrs)
+
+    def _cell(self, lat, lon) -> np.ndarray:
+        cy = np.floor(np.asarray(lat) / self.grid_deg).astype(np.int64)
+        cx = np.floor(np.asarray(lon) / self.grid_deg).astype(np.int64)
+        return (cy << 32) + cx
+
+    def _candidates(self, area: Area) -> np.ndarray:
+        """Vertex indices in the grid cells overlapping the area's bounding box."""
+        x0, y0, x1, y1 = area.bounds()
+        g = self.grid_deg
+        cy0, cy1 = int(np.floor(y0 / g)), int(np.floor(y1 / g))
+        cx0, cx1 = int(np.floor(x0 / g)), int(np.floor(x1 / g))
+        rows = np.arange(cy0, cy1 + 1, dtype=np.int64) << 32
+        lo = np.searchsorted(self._keys, rows + cx0, side="left")
+        hi = np.searchsorted(self._keys, rows + cx1, side="right")
+        return self._order[_ranges(lo, hi - lo)]
+
+    def query(self, area: Area, start: datetime, end: datetime) -> np.ndarray:
+        """Rows with a vertex inside ``area`` that overlap ``[start, end)``, ordered by StartTime."""
+        cand = self._candidates(area)
+        dist = haversine_nm(area.place.lat, area.place.lon, self.lat[cand], self.lon[cand])
+        alt = self.alt[cand]
+        inside = (dist <= area.radius_nm) & (np.isnan(alt) | ((alt >= area.min_ft) & (alt <= area.max_ft)))
+        rows = np.unique(self.row[cand[inside]])
+        t0 = np.datetime64(pd.Timestamp(start).to_datetime64(), "ms")
+        t1 = np.datetime64(pd.Timestamp(end).to_datetime64(), "ms")
+        rows = rows[(self.start[rows] < t1) & (self.end[rows] >= t0)]
+        return rows[np.argsort(self.start[rows], kind="stable")]
+
+    def frame(self, rows: np.ndarray, tol_deg: float = 0.0) -> pd.DataFrame:
+        """Rows as a :data:`TRAJ_COLUMNS` frame with geometry rebuilt from the vertex arrays."""
+        starts = self.offsets[rows]
+        lengths = self.offsets[rows + 1] - starts
+        pos = _ranges(starts, lengths)
+        xy = np.column_stack([self.lon[pos], self.lat[pos]])
+        owner = np.repeat(np.arange(len(rows)), lengths)
+        geoms = np.empty(len(rows), dtype=object)
+        lines = lengths >= 2
+        if lines.any():
+            mask = lines[owner]
+            geoms[lines] = shapely.linestrings(xy[mask], indices=(np.cumsum(lines) - 1)[owner[mask]])
+        if (lengths == 1).any():
+            geoms[lengths == 1] = shapely.points(xy[(lengths == 1)[owner]])
+        if tol_deg and len(geoms):
+            geoms = shapely.simplify(geoms, float(tol_deg), preserve_topology=False)
+        out = self.attrs.iloc[rows].reset_index(drop=True)
+        out["WKT"] = shapely.to_wkt(geoms, rounding_precision=6) if len(geoms) else []
+        return out[[c for c in TRAJ_COLUMNS if c in out]]
+
+
+def _index_window(start: datetime, end: datetime) -> tuple[datetime, datetime]:
+    """Whole hours around ``[start, end)`` so nearby windows share one index."""
+    t0 = start.replace(minute=0, second=0, microsecond=0)
+    t1 = end.replace(minute=0, second=0, microsecond=0)
+    return t0, (t1 if t1 == end else t1 + timedelta(hours=1))
+
+
+def _index_box(area: Area, tile_deg: float = TRACK_TILE_DEG) -> tuple[float, float, float, float]:
+    """Whole tiles around the area's footprint so nearby places share one index."""
+    pad = 0.05  # geodesic box edges bow slightly poleward of their corners
+    x0, y0, x1, y1 = area.bounds()
+    return (float(np.floor((x0 - pad) / tile_deg) * tile_deg), float(np.floor((y0 - pad) / tile_deg) * tile_deg),
+            float(np.ceil((x1 + pad) / tile_deg) * tile_deg), float(np.ceil((y1 + pad) / tile_deg) * tile_deg))
+
+
+def track_index(source: DataSource, start: datetime, end: datetime, name: str | None = None,
+                box: tuple[float, float, float, float] | None = None) -> TrackIndex:
+    """:class:`TrackIndex` of the trajectories overlapping the hours around ``[start, end)``.
+
+    ``box`` (``min_lon, min_lat, max_lon, max_lat``) limits it to the
+    trajectories crossing that rectangle; ``name`` identifies the source in
+    the cache key (defaults to ``source.name``).
+    """
+    t0, t1 = _index_window(start, end)
+
+    def build():
+        return TrackIndex(source.window_trajectories(t0, t1, bbox=box))
+
+    if CACHE_ENABLED:
+        return shared_cache().get_or_compute(make_key("tracks", name or source.name, t0, t1, box, TRACK_GRID_DEG),
+                                             build, TRACK_INDEX_TTL_S)
+    return build()
+
+
+def area_trajectories(source: DataSource, area: Area, start: datetime, end: datetime, max_rows: int = 2000,
+                      tol_deg: float = 0.0, name: str | None = None) -> pd.DataFrame:
+    """Trajectories passing through ``area`` within ``[start, end)``, like :meth:`DataSource.trajectories`."""
+    index = track_index(source, start, end, name, box=_index_box(area))
+    return index.frame(index.query(area, start, end)[: int(max_rows)], tol_deg=tol_deg)
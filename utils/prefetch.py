@@ -0,0 +1,206 @@
+"""Predictive prefetch of the datasets a user is likely to load next.
+
+Users mostly step the window by an hour or move to a neighbouring sector.
+After ``fetch_data`` serves a sector and window, the app schedules the same
+sector ``PREFETCH_STEP_H`` later and earlier, then up to
+``PREFETCH_MAX_SECTORS`` sectors sharing a border with it
+(:func:`adjacent_sectors`, precomputed from the ``StaticAirspace``
+geometry) over the same window. A :class:`Prefetcher` thread per process
+loads them into the shared cache under the key ``fetch_data`` uses, so the
+next step is a cache hit in whichever worker serves it.
+
+Prefetching never competes with foreground work:
+
+* the queue holds ``PREFETCH_QUEUE`` plans; a new request drops the oldest,
+  which a newer view has made stale;
+* a plan starts only once this process has had no ``fetch_data`` in flight
+  for ``PREFETCH_IDLE_S``;
+* at most ``PREFETCH_CONCURRENCY`` prefetch queries run on the host at a
+  time (leases in the shared cache), and a key another process is already
+  computing is skipped.
+
+``atfas_prefetch_tasks_total`` counts plans by outcome and
+``atfas_prefetch_hits_total`` the foreground fetches a prefetched dataset
+served (first use only), so ``hits / warmed`` is the payoff.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable
+
+import numpy as np
+import pandas as pd
+import shapely
+
+from utils.cache import CACHE_TTL_S, shared_cache
+from utils.metrics import PREFETCH_HITS, PREFETCH_TASKS
+
+PREFETCH_ENABLED = os.getenv("PREFETCH_ENABLED", "True").lower() == "true"
+PREFETCH_STEP_H = float(os.getenv("PREFETCH_STEP_H", "1"))
+PREFETCH_MAX_SECTORS = int(os.getenv("PREFETCH_MAX_SECTORS", "4"))
+PREFETCH_QUEUE = int(os.getenv("PREFETCH_QUEUE", "8"))
+PREFETCH_IDLE_S = float(os.getenv("PREFETCH_IDLE_S", "1.0"))
+PREFETCH_CONCURRENCY = int(os.getenv("PREFETCH_CONCURRENCY", "1"))  # prefetch queries per host
+PREFETCH_ADJ_TOL_DEG = float(os.getenv("PREFETCH_ADJ_TOL_DEG", "0.01"))  # gap still counted as a shared border
+
+log = logging.getLogger("atfas.prefetch")
+
+_MARK = "prefetched:"  # prefix of the marker stored next to each warmed key
+
+
+# =============================
+# Sector adjacency
+# =============================
+def sector_adjacency(sectors: pd.DataFrame, tol_deg: float = PREFETCH_ADJ_TOL_DEG) -> dict[int, list[int]]:
+    """Sector Id -> Ids of the sectors sharing a border with it, longest border first.
+
+    Two sectors are neighbours when their polygons come within ``tol_deg``
+    of each other along more than a corner and their altitude bands overlap,
+    so a stacked sector directly above or below is not one (it shares no
+    border, only a face).
+    """
+    geoms = shapely.from_wkt(sectors["WKT"].to_numpy(), on_invalid="ignore")
+    ids = sectors["Id"].to_numpy(dtype=np.int64)
+    lower = sectors["LowerLimitFt"].to_numpy(dtype=np.float64)
+    upper = sectors["UpperLimitFt"].to_numpy(dtype=np.float64)
+    ok = np.flatnonzero(~shapely.is_missing(geoms) & ~shapely.is_empty(geoms))
+    i, j = shapely.STRtree(geoms[ok]).query(geoms[ok], predicate="dwithin", distance=tol_deg)
+    i, j = ok[i], ok[j]
+    keep = (i != j) & (lower[i] < upper[j]) & (lower[j] < upper[i])
+    i, j = i[keep], j[keep]
+    border = shapely.length(shapely.intersection(shapely.boundary(geoms[i]), shapely.buffer(geoms[j], tol_deg)))
+    out: dict[int, list[int]] = {int(sid): [] for sid in ids}
+    for a, b, length in sorted(zip(i, j, border), key=lambda t: (t[0], -t[2])):
+        if length > 4 * tol_deg:  # touching corners overlap by about 2 * tol_deg
+            out[int(ids[a])].append(int(ids[b]))
+    return out
+
+
+_adjacency: tuple | None = None
+_adjacency_lock = threading.Lock()
+
+
+def adjacent_sectors(sectors: pd.DataFrame) -> dict[int, list[int]]:
+    """:func:`sector_adjacency` of ``sectors``, recomputed only when the sector list changes."""
+    global _adjacency
+    key = hash(tuple(zip(sectors["Id"], sectors["LowerLimitFt"], sectors["UpperLimitFt"], sectors["WKT"])))
+    with _adjacency_lock:
+        if _adjacency is not None and _adjacency[0] == key:
+            return _adjacency[1]
+    adjacency = sector_adjacency(sectors)
+    with _adjacency_lock:
+        _adjacency = (key, adjacency)
+    return adjacency
+
+
+# =============================
+# Background loader
+# =============================
+class Prefetcher:
+    """Bounded queue of ``(kind, key, load)`` plans run by one daemon thread when the process is idle."""
+
+    def __init__(self, ttl: float, max_queue: int = PREFETCH_QUEUE, idle_s: float = PREFETCH_IDLE_S,
+                 slots: int = PREFETCH_CONCURRENCY):
+        self.ttl = ttl
+        self.max_queue = max_queue
+        self.idle_s = idle_s
+        self.slots = max(slots, 1)
+        self._queue: deque[tuple[str, str, Callable[[], Any]]] = deque()
+        self._cv = threading.Condition()
+        self._busy = 0
+        self._last_foreground = 0.0
+        self._thread: threading.Thread | None = None
+
+    @contextmanager
+    def foreground(self):
+        """Mark a foreground fetch; plans wait until none has run for ``idle_s``."""
+        with self._cv:
+            self._busy += 1
+        try:
+            yield
+        finally:
+            with self._cv:
+                self._busy -= 1
+                self._last_foreground = time.monotonic()
+                self._cv.notify_all()
+
+    def schedule(self, plans) -> None:
+        """Queue ``(kind, key, load)`` plans, in priority order, after those already waiting."""
+        with self._cv:
+            queued = {key for _kind, key, _load in self._queue}
+            for kind, key, load in plans:
+                if key in queued:
+                    continue
+                if len(self._queue) >= self.max_queue:
+                    PREFETCH_TASKS.inc(self._queue.popleft()[0], "dropped")
+                self._queue.append((kind, key, load))
+                queued.add(key)
+            self._cv.notify_all()
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._loop, name="prefetch", daemon=True)
+                self._thread.start()
+
+    def hit(self, key: str) -> None:
+        """Count a foreground fetch of ``key`` if it was prefetched (first use only)."""
+        kind = shared_cache().pop(_MARK + key)
+        if kind is not None:
+            PREFETCH_HITS.inc(kind)
+
+    def _next(self):
+        with self._cv:
+            while True:
+                if not self._queue or self._busy:
+                    self._cv.wait()
+                    continue
+                idle = self._last_foreground + self.idle_s - time.monotonic()
+                if idle > 0:
+                    self._cv.wait(idle)
+                    continue
+                return self._queue.popleft()
+
+    def _loop(self) -> None:
+        while True:
+            kind, key, load = self._next()
+            try:
+                PREFETCH_TASKS.inc(kind, self._warm(kind, key, load))
+            except Exception:
+                PREFETCH_TASKS.inc(kind, "failed")
+                log.exception("prefetch: %s %s failed", kind, key)
+
+    def _warm(self, kind: str, key: str, load: Callable[[], Any]) -> str:
+        cache = shared_cache()
+        if cache.contains(key):
+            return "cached"
+        slot = next((f"prefetch-slot:{n}" for n in range(self.slots) if cache.try_lease(f"prefetch-slot:{n}", 600)),
+                    None)
+        if slot is None:
+            return "busy"
+        try:
+            # Taking the key's lease makes a foreground miss wait for this load instead of repeating it
+            if not cache.try_lease(key, 120):
+                return "busy"
+            try:
+                cache.set(key, load(), self.ttl, local=False)
+                cache.set(_MARK + key, kind, self.ttl, local=False)
+            finally:
+                cache.release(key)
+        finally:
+            cache.release(slot)
+        return "warmed"
+
+
+_prefetcher: Prefetcher | None = None
+
+
+def prefetcher() -> Prefetcher:
+    """Process-wide :class:`Prefetcher`; warmed entries live as long as foreground ones."""
+    global _prefetcher
+    if _prefetcher is None:
+        _prefetcher = Prefetcher(CACHE_TTL_S)
+    return _prefetcher
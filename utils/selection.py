@@ -0,0 +1,86 @@
+"""Ad-hoc map regions: which loaded flights cross a box or lasso selection.
+
+:class:`FlightIndex` is an ``STRtree`` over the trajectories of one
+``store-flights`` result, so a selection is answered in memory, without a
+query. Parsing the WKT is the expensive part (the tree itself and each
+lookup take milliseconds), so :func:`flight_index` keeps the last
+``SELECTION_INDEXES`` indexes per process, keyed by session and a
+fingerprint of the rows (live ticks change rows without a new revision).
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import shapely
+
+SELECTION_INDEXES = int(os.getenv("SELECTION_INDEXES", "16"))  # indexes kept per process
+
+
+class FlightIndex:
+    """``STRtree`` over trajectory lines (lon/lat) with the FlightId of each."""
+
+    __slots__ = ("tree", "flight_ids")
+
+    def __init__(self, geoms: np.ndarray, flight_ids: np.ndarray):
+        self.tree = shapely.STRtree(geoms)
+        self.flight_ids = flight_ids
+
+    @classmethod
+    def from_records(cls, records: list[dict]) -> "FlightIndex":
+        wkt = np.array([r.get("WKT") or None for r in records], dtype=object)
+        fids = np.array([r.get("FlightId") for r in records], dtype=object)
+        return cls(shapely.from_wkt(wkt, on_invalid="ignore"), fids)
+
+    def flights_in(self, region) -> list:
+        """FlightIds with a trajectory intersecting ``region``, in first-row order."""
+        rows = np.sort(self.tree.query(region, predicate="intersects"))
+        return list(dict.fromkeys(f for f in self.flight_ids[rows] if f is not None))
+
+
+_indexes: OrderedDict[tuple, FlightIndex] = OrderedDict()
+_lock = threading.Lock()
+
+
+def flight_index(session: str | None, records: list[dict]) -> FlightIndex:
+    """:class:`FlightIndex` of ``records``, reused while the session's rows are unchanged."""
+    key = (session, hash(tuple((r.get("TrajectoryId"), len(r.get("WKT") or "")) for r in records)))
+    with _lock:
+        index = _indexes.get(key)
+        if index is not None:
+            _indexes.move_to_end(key)
+            return index
+    index = FlightIndex.from_records(records)
+    with _lock:
+        _indexes[key] = index
+        while len(_indexes) > SELECTION_INDEXES:
+            _indexes.popitem(last=False)
+    return index
+
+
+def selection_region(selected: dict | None):
+    """Polygon (lon/lat) of a map ``selectedData`` box or lasso, ``None`` without one."""
+    if not selected:
+        return None
+    box = next(iter((selected.get("range") or {}).values()), None)
+    if box:
+        (x0, y0), (x1, y1) = box
+        return shapely.box(min(x0, x1), min(y0, y1), max(x0, x1), max(y0, y1))
+    ring = next(iter((selected.get("lassoPoints") or {}).values()), None)
+    if ring and len(ring) >= 3:
+        return shapely.make_valid(shapely.Polygon(ring))
+    return None
+
+
+def region_outline(region) -> tuple[list, list]:
+    """``(lats, lons)`` of the region's outer rings, NaN between parts."""
+    lats, lons = [], []
+    for part in shapely.get_parts(region):
+        if isinstance(part, shapely.Polygon):
+            xy = shapely.get_coordinates(part.exterior)
+            lats += xy[:, 1].tolist() + [np.nan]
+            lons += xy[:, 0].tolist() + [np.nan]
+    return lats, lons
@@ -0,0 +1,123 @@
+"""Versioned snapshots of a loaded sector/window for instant reload.
+
+A snapshot is a :mod:`utils.columnar` dataset stored under
+``SNAPSHOT_DIR/<name>/<version>/``; exporting the same name again adds a new
+version instead of overwriting. Opening a snapshot memory-maps its arrays, so
+it is ready in milliseconds regardless of size.
+"""
+
+from __future__ import annotations
+
+import functools
+import json
+import os
+import re
+from datetime import datetime
+from pathlib import Path
+
+from utils.columnar import ColumnarDataSource, write_columnar
+from utils.datasource import DataSource
+
+SNAPSHOT_DIR = Path(os.getenv("SNAPSHOT_DIR", "snapshots"))
+
+_NAME_RE = re.compile(r"[^A-Za-z0-9_.-]+")
+_VERSION_RE = re.compile(r"\d{4}")
+
+
+def snapshot_name(sector_name: str, start: datetime) -> str:
+    """Default snapshot name, e.g. ``BKK_E_20240601T0000``."""
+    return safe_name(f"{sector_name}_{start:%Y%m%dT%H%M}")
+
+
+def safe_name(name: str) -> str:
+    return _NAME_RE.sub("_", name.strip()).strip("._") or "snapshot"
+
+
+def _versions(name: str) -> list[int]:
+    base = SNAPSHOT_DIR / name
+    if not base.is_dir():
+        return []
+    return sorted(int(p.name) for p in base.iterdir() if p.is_dir() and p.name.isdigit())
+
+
+def export_snapshot(
+    source: DataSource,
+    sector_id: int,
+    start: datetime,
+    end: datetime,
+    fl_range: tuple[int, int] | None = None,
+    max_rows: int = 2000,
+    name: str | None = None,
+) -> str:
+    """Write the sector/window dataset from ``source`` as a new snapshot version.
+
+    Geometry is exported at full resolution so the snapshot can be
+    re-simplified later. Returns the snapshot key ``"<name>/<version>"``.
+    """
+    sector = source.get_sector(int(sector_id))
+    if sector is None:
+        raise ValueError(f"Unknown sector {sector_id}")
+    name = safe_name(name) if name else snapshot_name(str(sector["Name"]), start)
+    version = (_versions(name) or [0])[-1] + 1
+    trajectories = source.trajectories(int(sector_id), start, end, fl_range=fl_range, max_rows=max_rows, tol_deg=0.0)
+    meta = {
+        "kind": "snapshot",
+        "name": name,
+        "source": source.name,
+        "sector_id": int(sector_id),
+        "sector_name": str(sector["Name"]),
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "fl_range": list(fl_range) if fl_range else None,
+        "max_rows": int(max_rows),
+    }
+    write_columnar(SNAPSHOT_DIR / name / f"{version:04d}", source.list_sectors(), trajectories, meta=meta)
+    return f"{name}/{version:04d}"
+
+
+def list_snapshots() -> list[dict]:
+    """Every snapshot version on disk, newest export first."""
+    out = []
+    if not SNAPSHOT_DIR.is_dir():
+        return out
+    for base in SNAPSHOT_DIR.iterdir():
+        for v in _versions(base.name):
+            manifest_path = base / f"{v:04d}" / "manifest.json"
+            if not manifest_path.is_file():
+                continue
+            manifest = json.loads(manifest_path.read_text())
+            out.append({
+                "key": f"{base.name}/{v:04d}",
+                "created_utc": manifest.get("created_utc"),
+                "n_trajectories": manifest.get("n_trajectories"),
+                **manifest.get("meta", {}),
+            })
+    return sorted(out, key=lambda s: s.get("created_utc") or "", reverse=True)
+
+
+def resolve(key: str) -> Path:
+    """Path of ``"<name>"`` (latest version) or ``"<name>/<version>"``."""
+    name, _, version = key.partition("/")
+    name = safe_name(name)
+    if not version:
+        versions = _versions(name)
+        if not versions:
+            raise FileNotFoundError(f"No snapshot named {name!r} in {SNAPSHOT_DIR}")
+        version = f"{versions[-1]:04d}"
+    elif not _VERSION_RE.fullmatch(version):
+        # The key comes from the browser: never let it walk out of SNAPSHOT_DIR
+        raise FileNotFoundError(f"Snapshot {key!r} not found in {SNAPSHOT_DIR}")
+    path = SNAPSHOT_DIR / name / version
+    if not (path / "manifest.json").is_file():
+        raise FileNotFoundError(f"Snapshot {key!r} not found in {SNAPSHOT_DIR}")
+    return path
+
+
+@functools.lru_cache(maxsize=8)
+def _open(path: str) -> ColumnarDataSource:
+    return ColumnarDataSource(path)
+
+
+def open_snapshot(key: str) -> ColumnarDataSource:
+    """Open (memory-map) a snapshot; repeated opens reuse the same instance."""
+    return _open(str(resolve(key)))
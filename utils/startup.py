@@ -0,0 +1,103 @@
+"""Startup timing: how long a process takes to become ready to serve.
+
+:data:`startup` records named phases (imports, ``create_app``, first layout)
+relative to the moment this module is first imported, which ``app.py`` does
+before anything else. The report is logged once (logger ``atfas.startup``)
+and served as JSON from ``STARTUP_ROUTE``.
+
+Per-import timings come from CPython's ``-X importtime``: :func:`import_profile`
+imports a module in a fresh interpreter and returns the parsed table
+(``python cli.py startup-profile`` prints it alongside the phases).
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+STARTUP_ROUTE = os.getenv("STARTUP_ROUTE", "/startup")
+
+log = logging.getLogger("atfas.startup")
+
+
+class StartupTimer:
+    """Phases as ``(name, start_s, seconds)`` measured from the timer's creation."""
+
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        self.phases: list[tuple[str, float, float]] = []
+        self._once: set[str] = set()
+        self._lock = threading.Lock()
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.t0
+
+    @contextmanager
+    def phase(self, name: str, once: bool = False):
+        """Time the block; with ``once`` only its first run is recorded (e.g. the first layout)."""
+        with self._lock:
+            skip = once and name in self._once
+            self._once.add(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            if not skip:
+                with self._lock:
+                    self.phases.append((name, start - self.t0, time.perf_counter() - start))
+
+    def mark(self, name: str, since: float | None = None) -> None:
+        """Record a phase that ran from ``since`` (default: timer start) until now."""
+        start = self.t0 if since is None else since
+        with self._lock:
+            self.phases.append((name, start - self.t0, time.perf_counter() - start))
+
+    def report(self) -> dict:
+        with self._lock:
+            phases = [{"phase": n, "start_ms": round(s * 1e3, 1), "ms": round(d * 1e3, 1)} for n, s, d in self.phases]
+        return {"pid": os.getpid(), "python": sys.version.split()[0], "elapsed_ms": round(self.elapsed() * 1e3, 1),
+                "phases": phases}
+
+    def log(self) -> None:
+        log.info(json.dumps(self.report()))
+
+
+startup = StartupTimer()
+
+
+def register_startup_route(server, route: str = STARTUP_ROUTE) -> None:
+    from flask import Response
+
+    @server.route(route)
+    def _startup():
+        return Response(json.dumps(startup.report()), mimetype="application/json")
+
+
+def import_profile(module: str = "app", code: str | None = None, env: dict | None = None) -> tuple[list[dict], str]:
+    """``-X importtime`` table of importing ``module`` (or running ``code``) in a fresh interpreter.
+
+    Returns ``(rows, stdout)``; each row holds ``module``, ``depth`` (0 =
+    imported directly by the code), ``self_ms`` and ``cumulative_ms``.
+    """
+    import subprocess
+
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code or f"import {module}"],
+        capture_output=True, text=True, env={**os.environ, **(env or {})}, check=False,
+    )
+    if proc.returncode:
+        raise RuntimeError(f"import failed:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        head, cum_us, name = line.split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        rows.append({"module": name.strip(), "depth": depth,
+                     "self_ms": int(head.split(":")[1]) / 1e3, "cumulative_ms": int(cum_us) / 1e3})
+    return rows, proc.stdout
@@ -9,3 +9,8 @@ def floor_to_20(dt: datetime) -> datetime:
     """Floor a ``datetime`` to the nearest 20-minute boundary."""
     dt = dt.replace(second=0, microsecond=0, tzinfo=None)
     return dt - timedelta(minutes=(dt.minute % 20))
+
+
+def parse_utc(value: str) -> datetime:
+    """Parse an ISO-8601 UTC string (optionally ``Z``-suffixed) to a naive ``datetime``."""
+    return datetime.fromisoformat(value.strip().replace("Z", ""))
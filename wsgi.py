@@ -0,0 +1,16 @@
+"""WSGI entry point for production servers.
+
+    gunicorn -c gunicorn.conf.py            # uses wsgi:create_server()
+    waitress-serve --call wsgi:create_server
+
+``python app.py`` still starts the Flask development server for local work.
+"""
+
+from __future__ import annotations
+
+
+def create_server():
+    """Build the Dash app (``app.create_app``, once per process) and return its Flask server."""
+    from app import app
+
+    return app.server